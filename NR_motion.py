@@ -16,16 +16,41 @@ except ImportError:
 
 # import general.utilities.io
 from sample import Sample
+from dry_run_session import current_session
 from instrument_constants import get_instrument_constants
+from bulk_read import read_concurrently
+from setpoint_cache import setpoint_cache
+from move_plan import MovePlan
+from oscillation import BlockOscillator, progress_getter
+from slit_calc import FIXED, gap_setpoints
+from statistics_count import StatisticsCounter, Q
+
+
+def sm_block_setpoints(smangle, smblock='SM2'):
+    """
+    Setpoints for a super mirror at an angle; in the beam only if the angle is not zero
+    :param smangle: super mirror angle
+    :param smblock: block prefix of the mirror
+    :return: ordered dictionary of block to setpoint
+    """
+    is_in_beam = "IN" if smangle > 0.0001 else "OUT"
+    setpoints = OrderedDict([("{}INBEAM".format(smblock), is_in_beam)])
+    if smangle > 0.0001:
+        setpoints["{}ANGLE".format(smblock)] = smangle
+    return setpoints
 
 
 class _Movement(object):
     """
-    Encapsulate instrument changes
+    Encapsulate instrument changes. Axis setpoints are collected in a move plan and sent together when waiting for the
+    move (or on flush_moves).
     """
 
     def __init__(self, dry_run):
         self.dry_run = dry_run
+        self.moves = MovePlan()
+        self.last_statistics = None
+        self.last_count = None
 
     def change_to_mode_if_not_none(self, mode):
         """
@@ -37,6 +62,9 @@ class _Movement(object):
             print("Change to mode: {}".format(mode))
             if not self.dry_run:
                 g.cset("MODE", mode)
+                # a mode change can move axes so cached setpoints may no longer be true
+                setpoint_cache.invalidate()
+                self.moves.require_full_wait()
         else:
             mode = self._get_block_value("MODE")
         return mode
@@ -64,7 +92,7 @@ class _Movement(object):
             print("{} set to: {}".format(axis, value))
             if not self.dry_run:
                 try:
-                    g.cset(axis, value)
+                    self._cset(axis, value)
                 except:
                     raise KeyError("Block {} does not exist".format(axis))
             else:
@@ -82,12 +110,20 @@ class _Movement(object):
         """
         v_or_h = "V" if vertical else "H"
         g_or_c = "C" if centres else "G"
-        gaps = {}
-        for slit_num in slitrange:
-            gap_pv = "S{}{}{}".format(slit_num, v_or_h, g_or_c)
-            gaps[gap_pv.lower()] = self._get_block_value(gap_pv)
+        gap_pvs = ["S{}{}{}".format(slit_num, v_or_h, g_or_c) for slit_num in slitrange]
+        values = self._get_block_values(gap_pvs)
+
+        return {gap_pv.lower(): values[gap_pv] for gap_pv in gap_pvs}
 
-        return gaps
+    def _get_block_values(self, pv_names):
+        """
+        Get several block values at once
+
+        :param pv_names: pv names
+        :return: dictionary of pv name to value
+        :raises KeyError: if a block doesn't exist
+        """
+        return read_concurrently(self._get_block_value, pv_names)
 
     def _get_block_value(self, pv_name):
         """
@@ -101,8 +137,25 @@ class _Movement(object):
         block_value = g.cget(pv_name)
         if block_value is None:
             raise KeyError("Block {} does not exist".format(pv_name))
+        setpoint_cache.check_readback(pv_name, block_value["value"])
         return block_value["value"]
 
+    def _cset(self, axis, value):
+        """
+        Add a block setpoint to the move plan. It is written, unless already at this setpoint, on the next
+        wait_for_move or flush_moves.
+        :param axis: block to set
+        :param value: value to set it to
+        """
+        self.moves.add(axis, value)
+
+    def flush_moves(self):
+        """
+        Send the outstanding setpoints without waiting for the move if not in dry run
+        """
+        if not self.dry_run:
+            self.moves.dispatch()
+
     def update_title(self, title, subtitle, theta, smangle=None, smblock='SM', add_current_gaps=False):
         """
         Update the current title with or without gaps if not in dry run
@@ -139,7 +192,7 @@ class _Movement(object):
         else:
             g.change_title(new_title)
 
-    def set_slit_vgaps(self, theta: float, constants, vgaps: dict, sample):
+    def set_slit_vgaps(self, theta: float, constants, vgaps: dict, sample, gap_mode=FIXED):
         """
         Set the vertical slit gaps either to user settings or calculated based on footprint and max slit size,
         if not in dry run
@@ -148,24 +201,43 @@ class _Movement(object):
             constants: machine constants
             vgaps: user defined gaps
             sample: sample parameters
+            gap_mode: how to calculate the gaps not given by the user, see slit_setpoints
+        """
+        calc_dict = self.slit_setpoints(theta, constants, vgaps, sample, gap_mode)
+
+        print("Slit gaps set to: {}".format(calc_dict))
+        for key, value in calc_dict.items():
+            if value < 0.0:
+                sys.stderr.write("Vertical slit gaps are being set to less than 0!\n")
+        self.set_axis_dict(calc_dict)
+
+    def slit_setpoints(self, theta: float, constants, vgaps: dict, sample, gap_mode=FIXED):
+        """
+        Calculate the vertical slit gaps from the user settings or based on footprint and max slit size
+        Args:
+            theta: angle theta is set to
+            constants: machine constants
+            vgaps: user defined gaps
+            sample: sample parameters
+            gap_mode: slit_calc.FIXED to fill the footprint and resolution exactly; slit_calc.FLUX for the gaps within
+                them which give the most flux
+        Returns: dictionary of vertical gap block to gap
         """
-        calc_dict = self.calculate_slit_gaps(theta, sample.footprint, sample.resolution, constants)
+        if gap_mode == FIXED:
+            calc_dict = self.calculate_slit_gaps(theta, sample.footprint, sample.resolution, constants)
 
-        factor = theta / constants.max_theta
-        s3 = constants.s3max * factor
-        calc_dict.update({'S3VG': s3})
+            factor = theta / constants.max_theta
+            s3 = constants.s3max * factor
+            calc_dict.update({'S3VG': s3})
+        else:
+            calc_dict = gap_setpoints(theta, sample.footprint, sample.resolution, constants, gap_mode)
 
         if vgaps is None:
             vgaps = {}
         ## Look at inputs. Might not need to deal with None...?
         for key, value in vgaps.items():
             calc_dict.update({} if value is None else {key.upper(): value})
-
-        print("Slit gaps set to: {}".format(calc_dict))
-        for key, value in calc_dict.items():
-            if value < 0.0:
-                sys.stderr.write("Vertical slit gaps are being set to less than 0!\n")
-        self.set_axis_dict(calc_dict)
+        return calc_dict
 
     def set_axis_dict(self, axes_to_set: dict):
         """
@@ -179,7 +251,7 @@ class _Movement(object):
         for gap in axes_to_set.keys():
             if not self.dry_run:
                 try:
-                    g.cset(gap, axes_to_set[gap])
+                    self._cset(gap, axes_to_set[gap])
                 except:
                     raise KeyError("Block {} does not exist".format(gap))
             else:
@@ -222,10 +294,10 @@ class _Movement(object):
 
     def wait_for_move(self):
         """
-        Wait for a move if not in dry run
+        Send the outstanding setpoints and wait for the axes that moved if not in dry run
         """
         if not self.dry_run:
-            g.waitfor_move()
+            self.moves.wait()
 
     def set_smangle_if_not_none(self, smangle, smblock='SM2'):
         """
@@ -237,12 +309,11 @@ class _Movement(object):
         TODO: Tie block options to instrument constants.
         """
         if smangle is not None:
-            is_in_beam = "IN" if smangle > 0.0001 else "OUT"
-            print("{} angle (in beam?): {} ({})".format(smblock, smangle, is_in_beam))
+            setpoints = sm_block_setpoints(smangle, smblock)
+            print("{} angle (in beam?): {} ({})".format(smblock, smangle, setpoints["{}INBEAM".format(smblock)]))
             if not self.dry_run:
-                g.cset("{}INBEAM".format(smblock), is_in_beam)
-                if smangle > 0.0001:
-                    g.cset("{}ANGLE".format(smblock), smangle)
+                for axis, value in setpoints.items():
+                    self._cset(axis, value)
 
     def wait_for_seconds(self, seconds):
         """
@@ -254,26 +325,47 @@ class _Movement(object):
         else:
             print("Wait for {} seconds".format(seconds))
 
-    def count_for(self, count_uamps, count_seconds, count_frames):
+    def count_for(self, count_uamps, count_seconds, count_frames, count_target=None, reduction=None):
         """
-        Count for one of uamps, seconds, frames if not None in that order
+        Count for one of a statistics target, uamps, seconds, frames if not None in that order
         :param count_uamps: number of uamps to count for; None count in a different way
         :param count_seconds: number of seconds to count for; None count in a different way
         :param count_frames: number of frames to count for; None count in a different way
+        :param count_target: statistics_count.StatisticsTarget to count to; None count in a different way
+        :param reduction: live_reduction.LiveReduction to update while counting uamps, seconds or frames; None to just
+            wait
         """
-        if count_uamps is not None:
+        if reduction is not None and count_target is None and not self.dry_run:
+            self._count_reduced(reduction, count_uamps, count_seconds, count_frames)
+            return
+
+        if count_target is not None:
+            print("Count to {:.0f} counts in {} {} (at most {} s)".format(
+                count_target.target_counts, count_target.units, count_target.window or "all", count_target.max_seconds))
+            if not self.dry_run:
+                theta = None
+                if count_target.units == Q and count_target.window is not None:
+                    theta = self._get_block_value("THETA")
+                counter = StatisticsCounter(count_target, theta)
+                g.begin()
+                self.last_statistics = counter.run()
+                print("Counted {} in {:.0f} s".format(self.last_statistics.summary(), self.last_statistics.seconds))
+                g.change_title("{} {}".format(g.get_title(), self.last_statistics.summary()))
+                self._end_run()
+
+        elif count_uamps is not None:
             print("Wait for {} uA".format(count_uamps))
             if not self.dry_run:
                 g.begin()
                 g.waitfor_uamps(count_uamps)
-                g.end()
+                self._end_run()
 
         elif count_seconds is not None:
             print("Measure for {} s".format(count_seconds))
             if not self.dry_run:
                 g.begin()
                 g.waitfor_time(seconds=count_seconds)
-                g.end()
+                self._end_run()
 
         elif count_frames is not None:
             print("Wait for {} frames count (i.e. count this number of frames from the current frame)".format(
@@ -282,18 +374,88 @@ class _Movement(object):
                 final_frame = count_frames + g.get_frames()
                 g.begin()
                 g.waitfor_frames(final_frame)
-                g.end()
+                self._end_run()
+
+    def _end_run(self):
+        """
+        End the run, keeping the current and seconds it counted in last_count
+        """
+        self.last_count = {"uamps": g.get_uamps(), "seconds": g.get_time_since_begin(False)}
+        g.end()
+
+    def _count_reduced(self, reduction, count_uamps, count_seconds, count_frames):
+        """
+        Count as count_for while updating a live reduction of the run
+        """
+        if count_uamps is None and count_seconds is None:
+            count_frames = count_frames + g.get_frames()
+        name, progress, target = progress_getter(count_uamps, count_seconds, count_frames)
+        print("Count to {} {} with live reduction".format(target, name))
+        reduction.start(self._get_block_value("THETA"))
+        g.begin()
+        reduction.follow(progress, target)
+        self._end_run()
+
+    def count_periods(self, slice_seconds: float, slices: int, on_start=None, advance_when=None, poll: float = 0.5,
+                      log_path: str = None):
+        """
+        Count in a single run, moving to the next software period every slice_seconds, or sooner if advance_when
+        returns True, so there is no begin/end overhead between slices. Number of periods should already be set to
+        slices (see setup_measurement).
+        Args:
+            slice_seconds: seconds to count in each period
+            slices: number of periods to count
+            on_start: function called once the run has begun, e.g. to start an injection; None for nothing
+            advance_when: function returning True to move to the next period early, e.g. when an injection finishes;
+                None to use fixed slices only. Only a change from False to True advances, so a condition which stays
+                True, like "injection finished", ends one period early rather than every period after it.
+            poll: seconds between checks of the time and advance_when
+            log_path: csv file to append the period log to; None to only print it
+        Returns: period log as a list of (period, seconds since begin, uamps) at the start of each period; in a dry
+            run the log the periods would give if none advanced early, at the expected current of the dry run session
+        """
+        print("Count {} periods of {} s".format(slices, slice_seconds))
+        if self.dry_run:
+            current = current_session().beam_model.current()
+            return [(period, float((period - 1) * slice_seconds), current * (period - 1) * slice_seconds / 3600)
+                    for period in range(1, slices + 1)]
+        log = []
+        g.begin()
+        if on_start is not None:
+            on_start()
+        was_true = False
+        for period in range(1, slices + 1):
+            if period > 1:
+                g.change_period(period)
+            period_start = g.get_time_since_begin(False)
+            log.append((period, period_start, g.get_uamps()))
+            print("Period {} started at {:.1f} s".format(period, period_start))
+            elapsed = 0.0
+            while elapsed < slice_seconds:
+                if advance_when is not None:
+                    is_true = bool(advance_when())
+                    advance, was_true = is_true and not was_true, is_true
+                    if advance:
+                        break
+                g.waitfor_time(seconds=min(poll, slice_seconds - elapsed))
+                elapsed = g.get_time_since_begin(False) - period_start
+        self._end_run()
+        if log_path is not None:
+            with open(log_path, "a") as log_file:
+                log_file.writelines("{},{},{}\n".format(*entry) for entry in log)
+        return log
 
     def count_osc_slit(self, slit_block: str, slit_gap: float = None, slit_extent: float = None,
                        count_uamps: float = None,
-                       count_seconds: float = None, count_frames: float = None):
+                       count_seconds: float = None, count_frames: float = None, dwell: float = 1.0,
+                       continuous: bool = False):
         """
         Starts and ends a measurement with a block oscillating during the measurement. Written as for slit but could be
         any block with minor adjustment. If the gap is not smaller than the extent of the oscillation then it runs a
         normal measurement.
         See osc_slit_setup for setup and defaults.
-        Run times will be slightly long as it completes a full oscillation before checking if the requested duration
-        has been met.
+        The count is checked while the slit moves so the run ends as soon as the requested duration has been met
+        (see oscillation.BlockOscillator).
         A maximum wait is included on the movement in case close to a limit but the maxwait value may need adjusting.
         At end of measurement, the slit centre is set back to its original centre point.
         TODO: Does the gap also need to be reset?
@@ -306,36 +468,29 @@ class _Movement(object):
             count_uamps: number of uamps to count for; None=count in a different way
             count_seconds: number of seconds to count for; None=count in a different way
             count_frames: number of frames to count for; None=count in a different way
+            dwell: seconds to wait at each end of the oscillation
+            continuous: True to turn round as soon as each end is reached with no dwell
         """
         c_block, c_prior, c_min, c_max = self.osc_slit_setup(slit_block, slit_gap, slit_extent)
         self.wait_for_move()
-        count_options = {'g.get_uamps()': count_uamps, 'g.get_time_since_begin(False)': count_seconds,
-                         'g.get_frames()': count_frames}
-        count_choice_idx = [i for i in count_options if count_options[i] is not None][0]
-        print(count_choice_idx)
+        count_name, progress, target = progress_getter(count_uamps, count_seconds, count_frames)
+        print("Oscillating until {} reaches {}".format(count_name, target))
         # Alternative way to get durations:
         # count_options = {'total_current': count_uamps,'run_time': count_seconds, 'good_frames_total': count_frames}
         # g.get_dashboard()['run_time']; #g.get_dashboard()['good_frames_total']; #g.get_dashboard()['total_current']
 
         if not self.dry_run:
+            # the centre is moved outside of the setpoint cache while oscillating
+            setpoint_cache.invalidate(c_block)
             if c_min < c_max:
                 g.begin()
-                current_counts = eval(count_choice_idx)
-                print(current_counts)
-                while current_counts < count_options[count_choice_idx]:
-                    g.cset(c_block, c_min)
-                    g.waitfor_block(c_block, c_min, maxwait=40)
-                    g.waitfor_time(seconds=1)  ##use sleep or remove?
-                    g.cset(c_block, c_max)
-                    g.waitfor_block(c_block, c_max, maxwait=40)
-                    g.waitfor_time(seconds=1)
-                    current_counts = eval(count_choice_idx)
-                    print("Continuing run, counts at {}={}".format(count_choice_idx, current_counts))
-                g.end()
+                BlockOscillator(c_block, c_min, c_max, progress, target, dwell=dwell, continuous=continuous).run()
+                self._end_run()
             else:
                 self.count_for(count_uamps=count_uamps, count_seconds=count_seconds, count_frames=count_frames)
 
-            g.cset(c_block, c_prior)
+            self._cset(c_block, c_prior)
+            self.flush_moves()
         else:
             print("Run with oscillating {} with gap of {} over a total width of {}.".format(slit_block, slit_gap,
                                                                                             slit_extent))
@@ -376,7 +531,7 @@ class _Movement(object):
         centre_max = prior_centre + (slit_extent / 2) - (slit_gap / 2)
 
         if not self.dry_run:
-            g.cset(slit_block, slit_gap)
+            self._cset(slit_block, slit_gap)
 
         return block_for_centre, prior_centre, centre_min, centre_max
 
@@ -428,22 +583,65 @@ class _Movement(object):
             smang: angle for supermirror, default to 0.0 to keep out of beam
             smblock: supermirror blocks to use, can be a list for multiple mirrors
         """
-        self.set_axis("TRANS", sample.translation, constants=inst_constants)
+        setpoints = self.sample_setpoints(sample, angle, inst_constants, mode, trans_offset)
+        self.set_axis("TRANS", setpoints.pop("TRANS"), constants=inst_constants)
         smblock_out, smang_out = self._SM_setup(angle, inst_constants, smang, smblock, mode)
-        self.set_axis("THETA", angle, constants=inst_constants)
+        for axis, value in setpoints.items():
+            self.set_axis(axis, value, constants=inst_constants)
+        return smblock_out, smang_out
+
+    def sample_setpoints(self, sample, angle, inst_constants, mode, trans_offset=0.0):
+        """
+        Calculate the sample axis setpoints for a measurement, not including supermirrors or slits.
+        Args:
+            sample: sample to setup
+            angle: angle for measurement, set zero for transmission
+            inst_constants: instrument constants for height check
+            mode: if LIQUID does not activate phi and psi
+            trans_offset: value subtracted from height position default 0.0. Required for transmission.
+        Returns: ordered dictionary of axis to setpoint
+        """
+        setpoints = OrderedDict([("TRANS", sample.translation), ("THETA", angle)])
         if mode.upper() != "LIQUID":
-            self.set_axis("PSI", sample.psi_offset, constants=inst_constants)
-            self.set_axis("PHI", sample.phi_offset + angle, constants=inst_constants)
+            setpoints["PSI"] = sample.psi_offset
+            setpoints["PHI"] = sample.phi_offset + angle
         if inst_constants.has_height2:
             if angle == 0 and trans_offset > 10:  # i.e. if transmission
-                self.set_axis("HEIGHT2", sample.height2_offset - trans_offset, constants=inst_constants)
-                self.set_axis("HEIGHT", sample.height_offset, constants=inst_constants)
+                setpoints["HEIGHT2"] = sample.height2_offset - trans_offset
+                setpoints["HEIGHT"] = sample.height_offset
             else:
-                self.set_axis("HEIGHT2", sample.height2_offset, constants=inst_constants)
-                self.set_axis("HEIGHT", sample.height_offset - trans_offset, constants=inst_constants)
+                setpoints["HEIGHT2"] = sample.height2_offset
+                setpoints["HEIGHT"] = sample.height_offset - trans_offset
         else:
-            self.set_axis("HEIGHT", sample.height_offset - trans_offset, constants=inst_constants)
-        return smblock_out, smang_out
+            setpoints["HEIGHT"] = sample.height_offset - trans_offset
+        return setpoints
+
+    def action_setpoints(self, sample, angle, inst_constants, mode, vgaps=None, hgaps=None, trans_offset=0.0,
+                         smang=0.0, smblock='SM2', slit_angle=None, gap_mode=FIXED):
+        """
+        Calculate all the setpoints for an action without setting anything: sample axes, supermirrors and slits.
+        Args:
+            sample: sample to setup
+            angle: angle for measurement, set zero for transmission
+            inst_constants: instrument constants
+            mode: mode of instrument e.g. Liquid, Solid, PNR
+            vgaps: user defined vertical gaps
+            hgaps: horizontal gaps; None for use the sample horizontal gaps
+            trans_offset: value subtracted from height position default 0.0. Required for transmission.
+            smang: angle for supermirror, default to 0.0 to keep out of beam
+            smblock: supermirror blocks to use, can be a list for multiple mirrors
+            slit_angle: angle to calculate the vertical gaps for; None for use angle
+            gap_mode: how to calculate the vertical gaps, see slit_setpoints
+        Returns: ordered dictionary of axis to setpoint
+        """
+        setpoints = self.sample_setpoints(sample, angle, inst_constants, mode, trans_offset)
+        sm_angles, _, _ = self.sm_angles(angle, inst_constants, smang, smblock, mode)
+        for mirror, mirror_angle in sm_angles.items():
+            setpoints.update(sm_block_setpoints(mirror_angle, mirror))
+        setpoints.update((key.upper(), value) for key, value in (sample.hgaps if hgaps is None else hgaps).items())
+        setpoints.update(self.slit_setpoints(angle if slit_angle is None else slit_angle, inst_constants, vgaps,
+                                             sample, gap_mode))
+        return setpoints
 
     def _SM_setup(self, angle, inst_constants, smangle=0.0, smblock='SM2', mode=None):
         """
@@ -455,6 +653,23 @@ class _Movement(object):
             smblock: axis for mirror, can be a list for multiple mirrors
             mode: flag for liquid mode where smangle is determined from angle instead
         """
+        SM_defaults, smblock, smang = self.sm_angles(angle, inst_constants, smangle, smblock, mode)
+        print('SM values to be set: {}'.format(SM_defaults))
+        for mir in SM_defaults.keys():
+            self.set_smangle_if_not_none(SM_defaults[mir], mir)
+        return smblock, smang
+
+    def sm_angles(self, angle, inst_constants, smangle=0.0, smblock='SM2', mode=None):
+        """
+        Calculate the angle of each mirror.
+        Args:
+            angle: theta value for calculation
+            inst_constants: instrument constants for natural beam angle
+            smangle: mirror angle to use, default to 0.0 to be out of beam (overwritten if liquid mode)
+            smblock: axis for mirror, can be a list for multiple mirrors
+            mode: flag for liquid mode where smangle is determined from angle instead
+        Returns: dictionary of mirror to angle, list of mirror blocks used, total mirror angle
+        """
         if mode.upper() == "LIQUID" and angle != 0.0:
             # In liquid the sample is tilted by the incoming beam angle so that it is level, this is accounted for by
             # adjusting the super mirror
@@ -470,14 +685,12 @@ class _Movement(object):
                 SM_defaults[mirrors.upper()] = smang / (len(smblock))
             except:
                 print('Incorrect SM block given: {}'.format(mirrors.upper()))
-        print('SM values to be set: {}'.format(SM_defaults))
-        for mir in SM_defaults.keys():
-            self.set_smangle_if_not_none(SM_defaults[mir], mir)
-        return smblock, smang
+        return SM_defaults, smblock, smang
 
     def start_measurement(self, count_uamps: float = None, count_seconds: float = None, count_frames: float = None,
                           osc_slit: bool = False, osc_block: str = 'S2HG', osc_gap: float = None, vgaps: dict = None,
-                          hgaps: dict = None):
+                          hgaps: dict = None, osc_dwell: float = 1.0, osc_continuous: bool = False,
+                          count_target=None, reduction=None):
         """
         Starts a measurement based on count inputs and oscillating inputs.
         Args:
@@ -489,9 +702,15 @@ class _Movement(object):
             osc_gap: gap of slit during oscillation. If None then takes defaults (see osc_slit_setup)
             vgaps: vertical gap dict to check for osc_extent
             hgaps: horizonal gap dict to check for osc_extent
+            osc_dwell: seconds to wait at each end of the oscillation
+            osc_continuous: True to oscillate continuously with no dwell
+            count_target: statistics_count.StatisticsTarget to count to instead of uamps, seconds or frames
+            reduction: live_reduction.LiveReduction to update while counting; None for no live reduction
         """
-        if count_seconds is None and count_uamps is None and count_frames is None:
+        if count_seconds is None and count_uamps is None and count_frames is None and count_target is None:
             print("Setup only - no measurement")
+        elif osc_slit and count_target is not None:
+            raise ValueError("Counting to a statistics target can not be used with an oscillating slit")
         elif osc_slit:
             # Tries to take the extent for oscillation from the equivalent param e.g. s2hg.
             # Otherwise carries None to osc input.
@@ -505,11 +724,12 @@ class _Movement(object):
             if osc_gap is None:
                 osc_gap = use_block
             print('Inputs: osc_block {}, osc_gap {},use_block {}'.format(osc_block, osc_gap, use_block))
-            self.count_osc_slit(osc_block, osc_gap, use_block, count_uamps, count_seconds, count_frames)
+            self.count_osc_slit(osc_block, osc_gap, use_block, count_uamps, count_seconds, count_frames, osc_dwell,
+                                osc_continuous)
             # TODO Add to title or leave?
         else:
             # Think this might be redundant but keep for safety.
-            self.count_for(count_uamps, count_seconds, count_frames)
+            self.count_for(count_uamps, count_seconds, count_frames, count_target, reduction)
 
     # THIS MAY BECOME REDUNDANT.
     def slit_check(theta, footprint, resolution):
@@ -0,0 +1,427 @@
+"""
+Plans of script actions: record the actions of a script without running them, compile them into setpoints and run
+them with an executor. A plan can be validated and estimated without touching the instrument and run again without
+re-running the script.
+"""
+from collections import namedtuple
+from copy import deepcopy
+from inspect import signature
+
+from contextlib2 import nullcontext
+
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+from NR_motion import _Movement
+from bulk_read import read_concurrently
+from instrument_constants import get_instrument_constants
+from journal import RunJournal
+from dry_run_session import DryRunSession, current_session
+from script_actions import TRANSMISSION_RESTORE_AXES, ScriptActions, count_minutes
+from setpoint_cache import setpoint_cache
+from slit_calc import FIXED
+
+# Kinds of compiled action
+MEASURE = "measure"  # move to setpoints, set title and count; run by the executor
+CALL = "call"  # anything else; run by calling the action function
+
+# Actions which run the HPLC pump into the cell on the valve of their sample
+PUMP_ACTIONS = ("contrast_change",)
+
+
+class Action(namedtuple("Action", "name func params")):
+    """
+    A recorded call of a script action. params are all the arguments of the call by name, with defaults filled in,
+    as a tuple of (name, value) pairs.
+    """
+    __slots__ = ()
+
+    def get(self, param, default=None):
+        """
+        Returns: value of the named argument of the action
+        """
+        return dict(self.params).get(param, default)
+
+    @property
+    def sample(self):
+        """
+        Returns: the sample the action is on; None if not a sample action
+        """
+        return self.get("sample")
+
+    def __repr__(self):
+        return "{}({})".format(self.name, ", ".join("{}={!r}".format(name, value) for name, value in self.params
+                                                    if name != "sample"))
+
+
+class Plan(namedtuple("Plan", "actions")):
+    """
+    Immutable list of the actions of a script, in order
+    """
+    __slots__ = ()
+
+
+class Title(namedtuple("Title", "title subtitle theta smangle smblock add_current_gaps")):
+    """
+    Arguments for _Movement.update_title, by name
+    """
+    __slots__ = ()
+
+
+class CompiledAction(namedtuple("CompiledAction", "action kind mode setpoints reset title count osc errors")):
+    """
+    An action resolved to what it will do on the instrument.
+        action: the recorded action
+        kind: MEASURE or CALL
+        mode: instrument mode the action runs in
+        setpoints: tuple of (axis, value) to move to before counting
+        reset: tuple of (axis, value) to move to afterwards, as well as putting TRANSMISSION_RESTORE_AXES back; None
+            if nothing is reset
+        title: Title to set; None for an action which is called
+        count: count_uamps, count_seconds, count_frames, count_target
+        osc: osc_slit, osc_block, osc_gap
+        errors: problems found when compiling; a plan with errors is not run
+    """
+    __slots__ = ()
+
+
+class CompiledPlan(namedtuple("CompiledPlan", "actions constants")):
+    """
+    Compiled actions of a plan, in order, and the instrument constants they were compiled with
+    """
+    __slots__ = ()
+
+    @property
+    def errors(self):
+        """
+        Returns: list of (action index, error) for all problems found when compiling
+        """
+        return [(index, error) for index, compiled in enumerate(self.actions) for error in compiled.errors]
+
+
+class PlanRecorder(object):
+    """
+    Collects the actions called while it is the recorder of the dry run session
+    """
+    def __init__(self):
+        self._actions = []
+
+    def record(self, func, args, kwargs):
+        """
+        Record a call of an action. Arguments are copied so later changes in the script, e.g. to a sample's subtitle,
+        do not change the recorded action.
+        Args:
+            func: action function
+            args: positional arguments of the call
+            kwargs: keyword arguments of the call
+        """
+        bound = signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = tuple((name, deepcopy(value)) for name, value in bound.arguments.items() if name != "dry_run")
+        self._actions.append(Action(func.__name__, func, params))
+
+    def plan(self):
+        """
+        Returns: plan of the actions recorded so far
+        """
+        return Plan(tuple(self._actions))
+
+
+def record_plan(script, *args, **kwargs):
+    """
+    Run a script with its actions recorded instead of run.
+    Args:
+        script: script function, e.g. runscript
+        args, kwargs: arguments for the script
+    Returns: plan of the actions in the script
+    """
+    recorder = PlanRecorder()
+    session = current_session()
+    previous, session.recorder = session.recorder, recorder
+    try:
+        script(*args, **kwargs)
+    finally:
+        session.recorder = previous
+    return recorder.plan()
+
+
+def compile_plan(plan, constants=None, mode=None, check_blocks=False):
+    """
+    Resolve the slit gaps, super mirror angles and axis setpoints of every action in a plan.
+    Args:
+        plan: plan to compile
+        constants: instrument constants; None for read them from the instrument
+        mode: mode of the instrument at the start of the plan; None for read it from the instrument
+        check_blocks: True to check that all the blocks set by the plan exist
+    Returns: compiled plan
+    """
+    if constants is None:
+        constants = get_instrument_constants()
+    if mode is None:
+        mode = _Movement(True)._get_block_value("MODE")
+    movement = _Movement(True)
+    compiled = []
+    for action in plan.actions:
+        compiler = _COMPILERS.get(action.name, _compile_call)
+        compiled_action = compiler(movement, action, constants, action.get("mode") or mode)
+        mode = compiled_action.mode
+        compiled.append(compiled_action)
+    compiled_plan = CompiledPlan(tuple(compiled), constants)
+    if check_blocks:
+        compiled_plan = _check_blocks(compiled_plan)
+    return compiled_plan
+
+
+def _compile_call(movement, action, constants, mode):
+    # pylint: disable=unused-argument
+    return CompiledAction(action, CALL, mode, (), None, None, (None, None, None, None), (False, None, None), ())
+
+
+def _compile_angle(movement, action, constants, mode):
+    """
+    Compile run_angle and run_angle_SM
+    """
+    if action.get("do_auto_height"):
+        return _compile_call(movement, action, constants, mode)
+    sample, angle = action.sample, action.get("angle")
+    setpoints, errors = _setpoints(movement, action, constants, mode, angle=angle, smang=action.get("smangle", 0.0),
+                                   smblock=action.get("smblock", "SM2"))
+    smblock, smangle = "SM", None
+    if action.name == "run_angle_SM":
+        _, smblock, smangle = movement.sm_angles(angle, constants, action.get("smangle"), action.get("smblock"), mode)
+    title = Title(sample.title, sample.subtitle, angle, smangle, smblock, action.get("include_gaps_in_title"))
+    return CompiledAction(action, MEASURE, mode, setpoints, None, title, _count(action), _osc(action), errors)
+
+
+def _compile_transmission(movement, action, constants, mode):
+    """
+    Compile transmission and transmission_SM
+    """
+    sample = action.sample
+    vgaps = dict(action.get("vgaps") or {})
+    if "s3vg" not in {key.casefold() for key in vgaps}:
+        vgaps["S3VG"] = constants.s3max
+    smang = action.get("smangle", 0.0)
+    setpoints, errors = _setpoints(movement, action, constants, mode, angle=0.0, vgaps=vgaps,
+                                   trans_offset=action.get("height_offset"), smang=smang,
+                                   smblock=action.get("smblock", "SM2"), slit_angle=action.get("at_angle"))
+    smblock, smangle = "SM", None
+    if action.name == "transmission_SM":
+        _, smblock, smangle = movement.sm_angles(0.0, constants, smang, action.get("smblock"), mode)
+    reset = [("HEIGHT", sample.height_offset)]
+    if constants.has_height2:
+        reset.append(("HEIGHT2", sample.height2_offset))
+    title = Title(action.get("title"), "", None, smangle, smblock, action.get("include_gaps_in_title"))
+    return CompiledAction(action, MEASURE, mode, setpoints, tuple(reset), title, _count(action), _osc(action), errors)
+
+
+def _setpoints(movement, action, constants, mode, angle, vgaps=None, trans_offset=0.0, smang=0.0, smblock="SM2",
+               slit_angle=None):
+    """
+    Returns: setpoints for the action as a tuple of (axis, value) and any errors in calculating them
+    """
+    if vgaps is None:
+        vgaps = action.get("vgaps")
+    try:
+        setpoints = movement.action_setpoints(action.sample, angle, constants, mode, vgaps, action.get("hgaps"),
+                                              trans_offset, smang, smblock, slit_angle, action.get("gap_mode", FIXED))
+    except ValueError as e:
+        return (), ("{}".format(e),)
+    errors = tuple("{} set to less than 0: {}".format(axis, value) for axis, value in setpoints.items()
+                   if axis.endswith("VG") and value < 0.0)
+    return tuple(setpoints.items()), errors
+
+
+def _count(action):
+    return (action.get("count_uamps"), action.get("count_seconds"), action.get("count_frames"),
+            action.get("count_target"))
+
+
+def _osc(action):
+    return action.get("osc_slit", False), action.get("osc_block", "S2HG"), action.get("osc_gap")
+
+
+def _check_blocks(compiled_plan):
+    """
+    Returns: the compiled plan with an error added to each action that sets a block which does not exist
+    """
+    axes = {axis for compiled in compiled_plan.actions for axis, _ in compiled.setpoints}
+
+    def _exists(axis):
+        return g.cget(axis) is not None
+
+    exists = read_concurrently(_exists, sorted(axes))
+    actions = tuple(compiled._replace(errors=compiled.errors + tuple(
+        "Block {} does not exist".format(axis) for axis, _ in compiled.setpoints if not exists[axis]))
+        for compiled in compiled_plan.actions)
+    return compiled_plan._replace(actions=actions)
+
+
+_COMPILERS = {"run_angle": _compile_angle, "run_angle_SM": _compile_angle, "transmission": _compile_transmission,
+              "transmission_SM": _compile_transmission}
+
+
+def estimate_plan(compiled_plan, motion_model=None):
+    """
+    Estimate the duration of each action in a compiled plan.
+    Args:
+        compiled_plan: plan to estimate
+        motion_model: model of the axis motion; None for count times only. The model's positions are moved through
+            the plan.
+    Returns: list of (count minutes, motion minutes) for each action
+    """
+    # actions which are called are estimated in a session of their own, so their rows and time do not go into the
+    # report of the current session, and with no recorder, so they are estimated even while a plan is being recorded
+    session = DryRunSession(dry_run=True)
+    session.recorder = None
+    estimates = []
+    for compiled in compiled_plan.actions:
+        if compiled.kind == CALL:
+            params = dict(compiled.action.params)
+            with session:
+                estimates.append((compiled.action.func(**params, dry_run=True) or 0, 0))
+            continue
+        seconds = 0.0
+        if motion_model is not None:
+            restore = {axis: motion_model.positions[axis] for axis in TRANSMISSION_RESTORE_AXES
+                       if axis in motion_model.positions} if compiled.reset is not None else {}
+            seconds = motion_model.move(dict(compiled.setpoints))
+            if compiled.reset is not None:
+                seconds += motion_model.move(dict(restore, **dict(compiled.reset)))
+        estimates.append((count_minutes(*compiled.count), seconds / 60))
+    return estimates
+
+
+class PlanExecutor(object):
+    """
+    Runs a compiled plan on the instrument
+    """
+    def __init__(self, compiled_plan, dry_run=False, overlap_pumps=False, journal=None, stitcher=None):
+        """
+        Initialiser.
+        Args:
+            compiled_plan: plan to run
+            dry_run: True to only print what would happen
+            overlap_pumps: True to start contrast changes that wait for completion in the background and only wait
+                for the pump when the next action needs it or the cell being pumped
+            journal: path of a journal to record the actions run in, see journal.resume_plan; None for no journal
+            stitcher: stitching.Stitcher to add the live reduction of each measurement to; None for no stitching
+        """
+        self.compiled_plan = compiled_plan
+        self.dry_run = dry_run
+        self.overlap_pumps = overlap_pumps
+        self.pumping_valve = None
+        self.journal = None if journal is None else RunJournal(journal)
+        self.stitcher = stitcher
+
+    def run(self, start=0):
+        """
+        Run the plan.
+        Args:
+            start: index of the action to start from
+        Raises: ValueError if the plan has errors
+        """
+        errors = self.compiled_plan.errors
+        if errors:
+            raise ValueError("Plan can not be run, errors found: {}".format(errors))
+        # axes may have been moved by hand since the last script
+        setpoint_cache.invalidate()
+        if self.journal is not None:
+            self.journal.open(self.compiled_plan)
+        try:
+            for index in range(start, len(self.compiled_plan.actions)):
+                self._execute_journalled(index)
+            self.wait_for_pump()
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+
+    def _execute_journalled(self, index):
+        """
+        Run an action, recording it in the journal if there is one
+        """
+        if self.journal is None:
+            self.execute(self.compiled_plan.actions[index])
+            return
+        self.journal.started(index)
+        try:
+            counted = self.execute(self.compiled_plan.actions[index])
+        except BaseException as e:
+            self.journal.failed(index, e)
+            raise
+        if counted:
+            self.journal.note(index, **counted)
+        self.journal.done(index)
+
+    def execute(self, compiled):
+        """
+        Run a single compiled action
+        Returns: dictionary of what the action counted, see _measure; None for calls
+        """
+        if self.pumping_valve is not None and self._needs_pump(compiled):
+            self.wait_for_pump()
+        if compiled.kind == CALL:
+            params = dict(compiled.action.params)
+            if self.overlap_pumps and compiled.action.name in PUMP_ACTIONS and params.get("wait"):
+                params["wait"] = False
+                self.pumping_valve = compiled.action.sample.valve
+                print("Pumping valve {} while measuring other samples".format(self.pumping_valve))
+            compiled.action.func(**params, dry_run=self.dry_run)
+            return None
+        return self._measure(compiled)
+
+    def _needs_pump(self, compiled):
+        """
+        Returns: True if an action uses the pump or the cell being pumped; actions which are not known to leave them
+            alone are assumed to use them
+        """
+        if compiled.kind == CALL:
+            return True
+        return getattr(compiled.action.sample, "valve", None) == self.pumping_valve
+
+    def wait_for_pump(self):
+        """
+        Wait for a contrast change running in the background to finish
+        """
+        if self.pumping_valve is not None:
+            print("Wait for pumping of valve {} to finish".format(self.pumping_valve))
+            if not self.dry_run:
+                g.waitfor_block("pump_is_on", "OFF")
+            self.pumping_valve = None
+
+    def _measure(self, compiled):
+        """
+        Move to the setpoints of an action, set the title and count
+        Returns: dictionary of the uamps and seconds counted, and the statistics reached if counting to a statistics
+            target; empty if nothing was counted
+        """
+        action = compiled.action
+        print("** {} {} **".format(action.name, compiled.title.title))
+        movement = _Movement(self.dry_run)
+        movement.dry_run_warning()
+        movement.change_to_soft_period_count(1)
+        movement.change_to_mode_if_not_none(action.get("mode"))
+
+        reset_context = nullcontext()
+        if compiled.reset is not None:
+            reset_context = ScriptActions.reset_hgaps_and_sample_height_new(movement, action.sample,
+                                                                            self.compiled_plan.constants)
+        with reset_context:
+            movement.set_axis_dict(dict(compiled.setpoints))
+            movement.wait_for_move()
+            movement.update_title(**compiled.title._asdict())
+            hgaps = {key.casefold(): value for key, value in compiled.setpoints if key.endswith("HG")}
+            vgaps = {key.casefold(): value for key, value in compiled.setpoints if key.endswith("VG")}
+            count_uamps, count_seconds, count_frames, count_target = compiled.count
+            movement.start_measurement(count_uamps, count_seconds, count_frames, *compiled.osc, vgaps, hgaps,
+                                       count_target=count_target, reduction=action.get("reduction"))
+        reduction = action.get("reduction")
+        if self.stitcher is not None and reduction is not None and reduction.updates:
+            self.stitcher.add_reduction(action.sample, reduction)
+        counted = dict(movement.last_count or {})
+        if movement.last_statistics is not None:
+            counted.update(movement.last_statistics._asdict())
+        return counted
@@ -0,0 +1,115 @@
+"""
+Estimate many variants of a script at once, e.g. different angles, counts, contrasts or sample orders, to compare how
+long each takes and what is wrong with it. Each variant is recorded, checked and run against the simulated backend in
+a pool of processes.
+"""
+import contextlib
+import io
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import sim_genie
+from action_plan import compile_plan, record_plan
+from dry_run_session import DryRunSession
+from setpoint_cache import setpoint_cache
+from simulation import simulate_plan
+
+NAN = float("nan")
+
+
+class VariantEstimate(namedtuple("VariantEstimate", "parameters total_minutes motion_minutes count_minutes warnings")):
+    """
+    Estimate of one variant of a script
+        parameters: dictionary of the arguments the script was called with
+        total_minutes: simulated minutes from the first action to the end of the last; nan if the script failed or
+            has errors which stop it running
+        motion_minutes: minutes of the total spent waiting for axes
+        count_minutes: minutes of the total spent counting
+        warnings: tuple of "action index: problem", e.g. negative slit gaps or blocks which do not exist
+    """
+    __slots__ = ()
+
+
+def parameter_grid(grid):
+    """
+    Args:
+        grid: dictionary of argument name to the values to try, or a list of dictionaries of arguments
+    Returns: list of dictionaries of arguments, one for each combination of the values
+    """
+    if not isinstance(grid, dict):
+        return [dict(parameters) for parameters in grid]
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def estimate_variant(script, parameters, simulated_options=None):
+    """
+    Record a script with some arguments and run it against a new simulated backend
+    Args:
+        script: script function, e.g. runscript; must be importable by name to run in another process
+        parameters: dictionary of arguments for the script
+        simulated_options: keyword arguments for sim_genie.SimulatedGenie, e.g. beam_current; None for the defaults
+    Returns: VariantEstimate
+    """
+    import mocks
+    simulated = sim_genie.SimulatedGenie(**dict({"pvs": mocks.PVS}, **(simulated_options or {})))
+    # the setpoints cached by the last variant are not on this backend
+    setpoint_cache.invalidate()
+    setpoint_cache.reset_counts()
+    try:
+        with sim_genie.simulated_genie(simulated), DryRunSession(), contextlib.redirect_stdout(io.StringIO()):
+            plan = record_plan(script, **parameters)
+            compiled_plan = compile_plan(plan, check_blocks=True)
+        warnings = tuple("{}: {}".format(index, problem) for index, compiled in enumerate(compiled_plan.actions)
+                         for problem in compiled.errors + _slit_warnings(compiled))
+        if any(compiled.errors for compiled in compiled_plan.actions):
+            return VariantEstimate(parameters, NAN, NAN, NAN, warnings)
+        timeline = simulate_plan(compiled_plan, simulated)
+    except Exception as e:  # pylint: disable=broad-except
+        return VariantEstimate(parameters, NAN, NAN, NAN, ("script failed: {}: {}".format(type(e).__name__, e),))
+    return VariantEstimate(parameters, timeline.total_seconds / 60, sum(entry.move for entry in timeline.entries) / 60,
+                           sum(entry.count for entry in timeline.entries) / 60, warnings)
+
+
+def _slit_warnings(compiled):
+    """
+    Returns: warnings about the vertical gaps an action sets, after any given in the script; negative gaps are
+        already errors of the compiled action
+    """
+    setpoints = dict(compiled.setpoints)
+    if setpoints.get("S2VG", 0.0) > setpoints.get("S1VG", float("inf")) and not compiled.errors:
+        return ("s2vg larger than s1vg",)
+    return ()
+
+
+def batch_estimate(script, grid, max_workers=None, simulated_options=None):
+    """
+    Estimate every variant of a script in a grid of arguments, in parallel processes
+    Args:
+        script: script function taking the arguments in the grid; must be defined at the top level of a module
+        grid: dictionary of argument name to the values to try, or a list of dictionaries of arguments
+        max_workers: number of processes; None for one per processor
+        simulated_options: see estimate_variant
+    Returns: list of VariantEstimate in the order of the grid
+    """
+    variants = parameter_grid(grid)
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(estimate_variant, itertools.repeat(script), variants,
+                                 itertools.repeat(simulated_options), chunksize=max(1, len(variants) // (4 * workers))))
+
+
+def report(estimates):
+    """
+    Returns: table of the estimates, one line per variant, with any warnings of a variant below it
+    """
+    lines = ["{:>4} {:>9} {:>9} {:>9} {:>8}  {}".format("#", "total/min", "motion", "count", "warnings",
+                                                         "parameters")]
+    for number, estimate in enumerate(estimates):
+        lines.append("{:>4} {:>9.1f} {:>9.1f} {:>9.1f} {:>8}  {}".format(
+            number, estimate.total_minutes, estimate.motion_minutes, estimate.count_minutes, len(estimate.warnings),
+            ", ".join("{}={}".format(name, value) for name, value in estimate.parameters.items())))
+        lines.extend("          {}".format(warning) for warning in estimate.warnings)
+    return "\n".join(lines)
@@ -0,0 +1,124 @@
+"""
+Model of the beam current, to turn a count in uamps into a duration
+"""
+import csv
+import os
+import socket
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from journal import RunJournal
+
+# average current in uA on each instrument's target station, needs instrument check
+NOMINAL_CURRENT = {"INTER": 40.0, "POLREF": 40.0, "OFFSPEC": 40.0, "SURF": 150.0, "CRISP": 150.0}
+DEFAULT_CURRENT = 40.0
+
+# percentile of the duration reported as the pessimistic estimate
+P90 = 90
+
+
+def instrument_name():
+    """
+    Returns: name of the instrument from the INSTRUMENT environment variable or an NDX<name> host name; None if
+        neither is set
+    """
+    name = os.environ.get("INSTRUMENT")
+    if name:
+        return name.upper()
+    host = socket.gethostname().upper()
+    return host[3:] if host.startswith("NDX") else None
+
+
+def load_schedule(path):
+    """
+    Load the beam off periods from a cycle schedule file: csv rows of start, end and an optional description, with
+    times in ISO format, e.g. 2026-10-20T08:00,2026-10-21T20:00,machine physics. Lines starting with # are ignored.
+    Returns: sorted list of (start, end) datetimes
+    """
+    periods = []
+    with open(path) as schedule_file:
+        for row in csv.reader(line for line in schedule_file if line.strip() and not line.startswith("#")):
+            periods.append((datetime.fromisoformat(row[0].strip()), datetime.fromisoformat(row[1].strip())))
+    return sorted(periods)
+
+
+class BeamCurrentModel(object):
+    """
+    Current delivered to the instrument. Without history it is the nominal current; given the average current of
+    recent runs it uses their mean, and their spread for the pessimistic estimate. Scheduled beam off periods add
+    their length to counts that run into them.
+    """
+    def __init__(self, nominal=DEFAULT_CURRENT, currents=(), beam_off=()):
+        """
+        Initialiser.
+        Args:
+            nominal: current in uA to use without history
+            currents: average current in uA (uamps per hour) observed in recent runs, including any beam trips
+            beam_off: list of (start, end) datetimes when there is no beam
+        """
+        self.nominal = nominal
+        self.currents = np.asarray(currents, dtype=float)
+        self.beam_off = sorted(beam_off)
+
+    @classmethod
+    def for_instrument(cls, instrument=None, journal=None, schedule=None):
+        """
+        Create a model for an instrument
+        Args:
+            instrument: instrument name; None for instrument_name()
+            journal: path of a run journal to learn the current from; None for the nominal current
+            schedule: path of a cycle schedule file; None for no beam off periods
+        Returns: beam current model
+        """
+        nominal = NOMINAL_CURRENT.get(instrument or instrument_name(), DEFAULT_CURRENT)
+        currents = [] if journal is None else currents_from_journal(journal)
+        beam_off = [] if schedule is None else load_schedule(schedule)
+        return cls(nominal, currents, beam_off)
+
+    def current(self, percentile=None):
+        """
+        Args:
+            percentile: percentile of the duration; None for the expected current
+        Returns: current in uA; for a percentile, the current slower than that fraction of runs
+        """
+        if len(self.currents) == 0:
+            return self.nominal
+        if percentile is None:
+            return float(np.mean(self.currents))
+        return float(np.percentile(self.currents, 100 - percentile))
+
+    def minutes(self, uamps, percentile=None, start=None):
+        """
+        Minutes to count a current
+        Args:
+            uamps: current to count
+            percentile: percentile of the duration; None for the expected duration
+            start: datetime the count starts, to add any beam off periods it runs into; None to ignore them
+        Returns: minutes
+        """
+        current = self.current(percentile)
+        if current <= 0:
+            return float("inf")
+        seconds = uamps / current * 3600
+        if start is None:
+            return seconds / 60
+        end = start + timedelta(seconds=seconds)
+        for off_start, off_end in self.beam_off:
+            if off_start >= end:
+                break
+            if off_end > start:
+                end += off_end - max(off_start, start)
+        return (end - start).total_seconds() / 60
+
+    def __repr__(self):
+        return "Beam current: nominal {} uA, expected {:.1f} uA, P90 {:.1f} uA from {} runs".format(
+            self.nominal, self.current(), self.current(P90), len(self.currents))
+
+
+def currents_from_journal(path):
+    """
+    Returns: average current in uA of each run noted in a run journal (see action_plan.PlanExecutor)
+    """
+    return [note["uamps"] / note["seconds"] * 3600 for note in RunJournal(path).notes()
+            if note.get("uamps") is not None and note.get("seconds")]
@@ -0,0 +1,246 @@
+"""
+Fit the count times of a compiled plan into the beamtime left, shortening and dropping the least important
+measurements first
+"""
+from datetime import datetime
+
+from action_plan import CALL, PlanExecutor, estimate_plan
+from beam_current import BeamCurrentModel
+from dry_run_session import current_session
+from motion_model import MotionModel, DEFAULT_PROFILE
+from setpoint_cache import setpoint_cache
+
+# Number of recent runs whose current is used when re-planning during a run
+RECENT_RUNS = 5
+
+# Measurements are not shortened below this fraction of their count unless a minimum is given
+MIN_FRACTION = 0.5
+DEFAULT_PRIORITY = 1
+
+
+class BudgetProposal(object):
+    """
+    Count scale factors and dropped actions which fit a plan into the time available. Nothing is changed until it is
+    applied.
+    """
+    def __init__(self, scales, dropped, minutes, available_minutes, start=0):
+        """
+        Initialiser.
+        Args:
+            scales: dictionary of action index to the fraction of its count to keep
+            dropped: indices of the actions to leave out
+            minutes: estimated minutes of the plan once applied
+            available_minutes: minutes available
+            start: index of the first action planned for; earlier actions are left as they are
+        """
+        self.scales = scales
+        self.dropped = tuple(sorted(dropped))
+        self.minutes = minutes
+        self.available_minutes = available_minutes
+        self.start = start
+
+    @property
+    def fits(self):
+        """
+        Returns: True if the plan fits in the time available
+        """
+        return self.minutes <= self.available_minutes
+
+    def apply(self, compiled_plan):
+        """
+        Args:
+            compiled_plan: the compiled plan the proposal was made for
+        Returns: the plan with the counts scaled and the dropped actions removed
+        """
+        actions = []
+        for index, compiled in enumerate(compiled_plan.actions):
+            if index in self.dropped:
+                continue
+            scale = self.scales.get(index, 1.0)
+            if scale != 1.0:
+                compiled = compiled._replace(count=_scaled_count(compiled.count, scale))
+            actions.append(compiled)
+        return compiled_plan._replace(actions=tuple(actions))
+
+    def report(self):
+        """
+        Print the counts shortened and the actions dropped
+        """
+        shortened = {index: scale for index, scale in self.scales.items() if scale < 1.0}
+        print("Estimated {:.1f} min of {:.1f} min available: {} counts shortened {}, {} actions dropped {}".format(
+            self.minutes, self.available_minutes, len(shortened),
+            {index: round(scale, 2) for index, scale in sorted(shortened.items())}, len(self.dropped),
+            list(self.dropped)))
+
+    def __repr__(self):
+        return "Budget proposal: {:.1f}/{:.1f} min, dropped={}".format(self.minutes, self.available_minutes,
+                                                                       self.dropped)
+
+
+def fit_to_budget(compiled_plan, deadline, priorities=None, minimums=None, motion_model=None, beam_model=None,
+                  start=0, estimates=None):
+    """
+    Find the count scales and actions to drop so a plan finishes by a deadline. Counts are shortened lowest priority
+    first, each priority down to its minimum before the next is touched; if that is not enough, measurements are
+    dropped lowest priority and longest first and the time freed is given back to the highest priorities. Calls,
+    e.g. contrast changes, are never shortened or dropped.
+    Args:
+        compiled_plan: plan to fit
+        deadline: datetime to finish by, or minutes available
+        priorities: dictionary of action index to priority, higher is more important; missing actions have
+            DEFAULT_PRIORITY
+        minimums: dictionary of action index to the smallest fraction of its count that is still worth measuring;
+            missing actions use MIN_FRACTION
+        motion_model: model of the axis motion; None for the default profile
+        beam_model: beam current model for counts in uamps; None for the dry run session's
+        start: index of the first action still to run, to re-plan part way through the plan
+        estimates: (count minutes, motion minutes) of each action, to save estimating them again when re-planning
+    Returns: BudgetProposal
+    """
+    available = deadline if not isinstance(deadline, datetime) else \
+        (deadline - datetime.now()).total_seconds() / 60
+    priorities = priorities or {}
+    minimums = minimums or {}
+    if estimates is None:
+        estimates = estimate_durations(compiled_plan, motion_model, beam_model)
+
+    fixed, counts, levels = 0.0, {}, {}
+    for index in range(start, len(compiled_plan.actions)):
+        count, motion = estimates[index]
+        if compiled_plan.actions[index].kind == CALL or count == 0:
+            fixed += count + motion
+            continue
+        fixed += motion
+        counts[index] = count
+        levels.setdefault(priorities.get(index, DEFAULT_PRIORITY), []).append(index)
+    scales = {index: 1.0 for index in counts}
+    lowest = {index: min(minimums.get(index, MIN_FRACTION), 1.0) for index in counts}
+    dropped = []
+
+    def total():
+        return fixed + sum(counts[index] * scale for index, scale in scales.items())
+
+    excess = total() - available
+    for level in sorted(levels):
+        if excess <= 0:
+            break
+        excess = _shorten(levels[level], scales, lowest, counts, excess)
+
+    if excess > 0:
+        candidates = sorted(counts, key=lambda i: (priorities.get(i, DEFAULT_PRIORITY), -counts[i] * lowest[i]))
+        for index in candidates:
+            if excess <= 0:
+                break
+            excess -= counts[index] * scales.pop(index) + estimates[index][1]
+            fixed -= estimates[index][1]
+            dropped.append(index)
+        for level in sorted(levels, reverse=True):
+            if excess >= 0:
+                break
+            excess = _lengthen([index for index in levels[level] if index in scales], scales, counts, excess)
+    return BudgetProposal(scales, dropped, total(), available, start)
+
+
+def estimate_durations(compiled_plan, motion_model=None, beam_model=None):
+    """
+    Returns: (count minutes, motion minutes) of each action of a compiled plan
+    """
+    motion_model = MotionModel.from_profile(DEFAULT_PROFILE) if motion_model is None else motion_model.copy()
+    beam_model = current_session().beam_model if beam_model is None else beam_model
+    estimates = estimate_plan(compiled_plan, motion_model)
+    return [(count if compiled.count[0] is None or compiled.count[3] is not None
+             else beam_model.minutes(compiled.count[0]), motion)
+            for compiled, (count, motion) in zip(compiled_plan.actions, estimates)]
+
+
+def _shorten(indices, scales, lowest, counts, excess):
+    """
+    Shorten the counts of actions towards their minimums, in proportion to how far each can go, to remove the excess
+    Returns: excess left
+    """
+    room = sum(counts[index] * (scales[index] - lowest[index]) for index in indices)
+    if room <= 0:
+        return excess
+    cut = min(excess / room, 1.0)
+    for index in indices:
+        scales[index] -= (scales[index] - lowest[index]) * cut
+    return excess - room * cut
+
+
+def _lengthen(indices, scales, counts, excess):
+    """
+    Lengthen the counts of actions back towards their full count to use up spare time (a negative excess)
+    Returns: excess left
+    """
+    room = sum(counts[index] * (1.0 - scales[index]) for index in indices)
+    if room <= 0:
+        return excess
+    grow = min(-excess / room, 1.0)
+    for index in indices:
+        scales[index] += (1.0 - scales[index]) * grow
+    return excess + room * grow
+
+
+def _scaled_count(count, scale):
+    """
+    Returns: count_uamps, count_seconds, count_frames, count_target with the count used scaled
+    """
+    count_uamps, count_seconds, count_frames, count_target = count
+    if count_target is not None:
+        return count_uamps, count_seconds, count_frames, count_target._replace(
+            max_seconds=count_target.max_seconds * scale)
+    if count_uamps is not None:
+        return count_uamps * scale, count_seconds, count_frames, count_target
+    if count_seconds is not None:
+        return count_uamps, count_seconds * scale, count_frames, count_target
+    return count_uamps, count_seconds, None if count_frames is None else count_frames * scale, count_target
+
+
+def run_to_deadline(compiled_plan, deadline, priorities=None, minimums=None, motion_model=None, beam_model=None,
+                    dry_run=False, overlap_pumps=False):
+    """
+    Run a plan, re-fitting what is left of it to the deadline after every action. The current of the most recent
+    runs is used for what is left, so a drop in the beam shortens the remaining counts rather than overrunning.
+    Args:
+        compiled_plan: plan to run
+        deadline: datetime to finish by
+        priorities, minimums, motion_model, beam_model: see fit_to_budget
+        dry_run, overlap_pumps: see action_plan.PlanExecutor
+    Returns: the BudgetProposal used for the last action
+    """
+    beam_model = current_session().beam_model if beam_model is None else beam_model
+    estimates = estimate_durations(compiled_plan, motion_model, beam_model)
+    executor = PlanExecutor(compiled_plan, dry_run=dry_run, overlap_pumps=overlap_pumps)
+    # axes may have been moved by hand since the last script
+    setpoint_cache.invalidate()
+    currents = list(beam_model.currents)
+    proposal = None
+    for index in range(len(compiled_plan.actions)):
+        proposal = fit_to_budget(compiled_plan, deadline, priorities, minimums, start=index, estimates=estimates)
+        if index in proposal.dropped:
+            print("Dropping action {} to finish by {}".format(index, deadline))
+            continue
+        compiled = compiled_plan.actions[index]
+        scale = proposal.scales.get(index, 1.0)
+        if scale != 1.0:
+            print("Counting {:.0%} of action {} to finish by {}".format(scale, index, deadline))
+            compiled = compiled._replace(count=_scaled_count(compiled.count, scale))
+        counted = executor.execute(compiled)
+        if counted and counted.get("seconds"):
+            currents.append(counted["uamps"] / counted["seconds"] * 3600)
+            recent = BeamCurrentModel(beam_model.nominal, currents[-RECENT_RUNS:], beam_model.beam_off)
+            estimates = _recount(compiled_plan, estimates, recent, index + 1)
+    executor.wait_for_pump()
+    return proposal
+
+
+def _recount(compiled_plan, estimates, beam_model, start):
+    """
+    Returns: estimates with the count minutes of uamps counts from start on re-estimated with a beam model
+    """
+    estimates = list(estimates)
+    for index in range(start, len(compiled_plan.actions)):
+        count_uamps, _, _, count_target = compiled_plan.actions[index].count
+        if count_uamps is not None and count_target is None:
+            estimates[index] = (beam_model.minutes(count_uamps), estimates[index][1])
+    return estimates
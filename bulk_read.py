@@ -0,0 +1,75 @@
+"""
+Read several PVs or blocks together instead of one after another
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of reads in flight at once
+MAX_WORKERS = 16
+
+# prefix of the names of the reading threads
+THREAD_PREFIX = "bulk_read"
+
+# Issue reads together; False to read one after another, e.g. if a genie_python version turns out not to be safe to
+# call from several threads at once (see set_concurrent)
+CONCURRENT = True
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _forget_executors():
+    """
+    Drop the executors in a forked process, e.g. a batch_estimate worker, as their threads are not copied into it
+    """
+    global _executors_lock
+    _executors.clear()
+    _executors_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_executors)
+
+
+def _executor(max_workers):
+    """
+    Returns: process wide executor with max_workers threads, created on first use and kept for later reads
+    """
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers,
+                                          thread_name_prefix="{}_{}".format(THREAD_PREFIX, max_workers))
+            _executors[max_workers] = executor
+        return executor
+
+
+def set_concurrent(concurrent):
+    """
+    Switch concurrent reads on or off for the whole process
+    Args:
+        concurrent: True to issue reads together; False to read one after another in the calling thread
+    """
+    global CONCURRENT
+    CONCURRENT = concurrent
+
+
+def read_concurrently(read, names, max_workers=MAX_WORKERS):
+    """
+    Issue a read for each name at the same time so that the total time is set by the slowest read rather than the sum
+    of all of them. Reads are made one after another when CONCURRENT is False.
+    Args:
+        read: function taking a name and returning its value, e.g. g.get_pv or a block getter
+        names: names to read
+        max_workers: maximum number of reads in flight at once
+    Returns: dictionary of name to value, in the order of names
+    Raises: the first exception raised by a read
+    """
+    names = list(names)
+    # a read which itself reads concurrently runs its reads in turn, so it can not wait on threads of its own pool
+    if not CONCURRENT or len(names) <= 1 or threading.current_thread().name.startswith(THREAD_PREFIX):
+        return {name: read(name) for name in names}
+    executor = _executor(max_workers)
+    futures = [executor.submit(read, name) for name in names]
+    return {name: future.result() for name, future in zip(names, futures)}
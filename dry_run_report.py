@@ -0,0 +1,145 @@
+"""
+Table of the actions of a dry run, collected as the script runs and printed or exported afterwards
+"""
+import csv
+import json
+
+import numpy as np
+
+# Rows printed at a time when streaming the table; None to only print it when asked
+CHUNK = 100
+
+# Text columns hold str objects so long titles and parameters reach the csv and json exports whole
+ROW = np.dtype([("number", "i4"), ("action", "O"), ("title", "O"), ("parameters", "O"), ("minutes", "f8"),
+                ("cumulative", "f8")])
+
+HEADER = "{:^5}|{:^19}|{:^54}|{:^41}|{:^10}|{:^10}".format("No", "Action", "Title", "Parameters", "Duration",
+                                                           "Total")
+
+
+def elide(text, width):
+    """
+    Returns: text cut to width characters at the last space that fits, ending in an ellipsis when it was longer
+    """
+    text = str(text)
+    if len(text) <= width:
+        return text
+    cut = text[:width - 1]
+    if text[width - 1] != " " and " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(", ") + "\u2026"
+
+
+def hours_minutes(minutes):
+    """
+    Returns: minutes formatted as hh:mm
+    """
+    return "{:02d}:{:02d}".format(int(minutes // 60), int(minutes % 60))
+
+
+class DryRunReport(object):
+    """
+    Rows of a dry run in a structured array, grown by doubling, so adding a row costs no formatting or printing.
+    The table is printed in chunks of rows as it fills, or all at once with render.
+    """
+    def __init__(self, capacity=256, chunk=CHUNK):
+        """
+        Initialiser.
+        Args:
+            capacity: number of rows to allocate to start with
+            chunk: print the table every this many rows; None to print only when render or flush are called
+        """
+        self._rows = np.zeros(capacity, dtype=ROW)
+        self.size = 0
+        self.chunk = chunk
+        self._printed = 0
+
+    @property
+    def rows(self):
+        """
+        Returns: the rows added so far, as a view of the table
+        """
+        return self._rows[:self.size]
+
+    @property
+    def total_minutes(self):
+        """
+        Returns: estimated minutes of all the rows
+        """
+        return float(self._rows[self.size - 1]["cumulative"]) if self.size else 0.0
+
+    def add(self, action, title, parameters, minutes):
+        """
+        Add a row
+        Args:
+            action: name of the action
+            title: sample title; "" if not a sample action
+            parameters: the other arguments of the action
+            minutes: estimated minutes of the action
+        """
+        if self.size == len(self._rows):
+            rows = np.zeros(2 * len(self._rows), dtype=ROW)
+            rows[:self.size] = self._rows
+            self._rows = rows
+        self._rows[self.size] = (self.size + 1, action, title, parameters, minutes, self.total_minutes + minutes)
+        self.size += 1
+        if self.chunk is not None and self.size - self._printed >= self.chunk:
+            self.flush()
+
+    def reset(self):
+        """
+        Remove all the rows
+        """
+        self.size = 0
+        self._printed = 0
+
+    def render(self, start=0, end=None):
+        """
+        Returns: the rows from start to end as a table
+        """
+        lines = [HEADER] if start == 0 else []
+        for row in self._rows[start:self.size if end is None else end]:
+            lines.append("{:>4}  {:<19} {:<54} {:<41} {:>10} {:>10}".format(
+                row["number"], elide(row["action"], 19), elide(row["title"], 54), elide(row["parameters"], 41),
+                hours_minutes(row["minutes"]), hours_minutes(row["cumulative"])))
+        return "\n".join(lines)
+
+    def flush(self):
+        """
+        Print the rows not printed yet
+        """
+        if self.size > self._printed:
+            print(self.render(self._printed))
+            self._printed = self.size
+
+    def gantt(self, width=60):
+        """
+        Returns: timeline of the rows as bars against the cumulative time, width characters for the whole run
+        """
+        total = self.total_minutes or 1.0
+        lines = []
+        for row in self.rows:
+            start = row["cumulative"] - row["minutes"]
+            offset = int(round(start / total * width))
+            length = max(int(round(row["cumulative"] / total * width)) - offset, 1 if row["minutes"] > 0 else 0)
+            lines.append("{:>4} {:<19} {:<20} {} |{}{}".format(
+                row["number"], elide(row["action"], 19), elide(row["title"], 20), hours_minutes(start), " " * offset,
+                "#" * length))
+        lines.append("{:>4} {:<19} {:<20} {} |".format("", "end", "", hours_minutes(self.total_minutes)))
+        return "\n".join(lines)
+
+    def to_csv(self, path):
+        """
+        Write the rows to a csv file
+        """
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(ROW.names)
+            writer.writerows(row.tolist() for row in self.rows)
+
+    def to_json(self, path):
+        """
+        Write the rows to a json file as a list of objects
+        """
+        with open(path, "w") as json_file:
+            json.dump([dict(zip(ROW.names, row.tolist())) for row in self.rows], json_file, indent=1)
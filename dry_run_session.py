@@ -0,0 +1,100 @@
+"""
+State of a dry run: whether actions are run, the time they are estimated to take and the models used to estimate it.
+
+The session in use is held in a context variable, so dry runs in different threads or asyncio tasks each add up
+their own estimate:
+    >>> with DryRunSession(dry_run=True) as session:
+    ...     runscript(dry_run=True)
+    >>> session.run_time
+Outside any session the default session is used; current_session() gives the session in use.
+"""
+from contextvars import ContextVar
+
+from beam_current import BeamCurrentModel
+from dry_run_report import DryRunReport
+from motion_model import MotionModel, DEFAULT_PROFILE
+
+
+class DryRunSession(object):
+    """
+    Estimate of one dry run and the models it is made with
+        dry_run: True to estimate actions instead of running them
+        counter: number of actions dry run
+        run_time: estimated minutes of the actions
+        motion_time: minutes of run_time spent moving axes
+        p90_margin: minutes to add to run_time for a duration which 90% of scripts will finish in
+        motion_model: simulated axis positions through the dry run
+        beam_model: current delivered while counting uamps
+        recorder: when set actions are recorded into it instead of being run, see action_plan.record_plan
+        report: table of the actions dry run so far
+    """
+    def __init__(self, dry_run=False, motion_model=None, beam_model=None, report=None, parent=None):
+        """
+        Initialiser.
+        Args:
+            dry_run: True to estimate actions instead of running them
+            motion_model: motion model to start from; None for a copy of the parent's
+            beam_model: beam current model; None for the parent's
+            report: report to add the actions to; None for a new one
+            parent: session to take the models and recorder from; None for the current session
+        Actions recorded in the parent, see action_plan.record_plan, are also recorded in this session.
+        """
+        parent = current_session() if parent is None else parent
+        self._setup(dry_run, parent.motion_model.copy() if motion_model is None else motion_model,
+                    parent.beam_model if beam_model is None else beam_model, parent.recorder, report)
+
+    def _setup(self, dry_run, motion_model, beam_model, recorder, report):
+        """
+        Set the models and start an empty estimate
+        """
+        self.dry_run = dry_run
+        self.motion_model = motion_model
+        self.beam_model = beam_model
+        self.recorder = recorder
+        self.report = DryRunReport() if report is None else report
+        self.counter = 0
+        self.run_time = 0
+        self.motion_time = 0
+        self.p90_margin = 0
+        self._tokens = []
+
+    def reset(self):
+        """
+        Start a new estimate, keeping the models
+        """
+        self.counter = 0
+        self.run_time = 0
+        self.motion_time = 0
+        self.p90_margin = 0
+        self.report.reset()
+
+    def __enter__(self):
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._tokens.pop())
+
+    def __repr__(self):
+        return "Dry run session: {} actions, {:.1f} min of which motion {:.1f} min".format(
+            self.counter, self.run_time, self.motion_time)
+
+
+def _default_session():
+    """
+    Returns: session with the default models, used outside any other session; unlike other sessions it has no parent
+    """
+    session = DryRunSession.__new__(DryRunSession)
+    session._setup(False, MotionModel.from_profile(DEFAULT_PROFILE), BeamCurrentModel.for_instrument(), None, None)
+    return session
+
+
+_current = ContextVar("dry_run_session")
+_default = _default_session()
+
+
+def current_session():
+    """
+    Returns: the session of the current thread or task; the default session outside any session
+    """
+    return _current.get(_default)
@@ -1,18 +1,24 @@
 """
 Instrument specific constants
 """
+import threading
+import time
+
 try:
     # pylint: disable=import-error
     from genie_python import genie as g
 except ImportError:
     from mocks import g
 
+from bulk_read import read_concurrently
+
 
 class InstrumentConstant(object):
     """
     Set of constants for a given instrument
     """
-    def __init__(self, s1s2, s2sa, max_theta, s4max, sm_sa, incoming_beam_angle, s3max=None, has_height2=True):
+    def __init__(self, s1s2, s2sa, max_theta, s4max, sm_sa, incoming_beam_angle, s3max=None, has_height2=True,
+                 s1max=None, s2max=None, flight_path=None, monitor_flight_path=None):
         """
         Instrument constants
         Args:
@@ -24,6 +30,10 @@ class InstrumentConstant(object):
             incoming_beam_angle: the incoming beam angle used to make the sample level
             s3max: slit 3 maximum vertical gap
             has_height2: has a height2 stage so height 2 tracks but height doesn't
+            s1max: slit 1 maximum vertical gap; None if not known
+            s2max: slit 2 maximum vertical gap; None if not known
+            flight_path: moderator to detector distance in m; None if not known
+            monitor_flight_path: moderator to monitor distance in m; None if not known
         """
         self.s1s2 = s1s2
         self.s2sa = s2sa
@@ -33,31 +43,205 @@ class InstrumentConstant(object):
         self.s3max = s4max if s3max is None else s3max
         self.has_height2 = has_height2
         self.incoming_beam_angle = incoming_beam_angle
+        self.s1max = s1max
+        self.s2max = s2max
+        self.flight_path = flight_path
+        self.monitor_flight_path = monitor_flight_path
+
+    def __repr__(self):
+        return "s1s2={}, s2sa={}, sm_sa={}, max_theta={}, s1max={}, s2max={}, s3max={}, s4max={}, has_height_2={}, " \
+               "natural_angle={}".format(self.s1s2, self.s2sa, self.sm_sa, self.max_theta, self.s1max, self.s2max,
+                                         self.s3max, self.s4max, self.has_height2, self.incoming_beam_angle)
+
+
+# Names of the constant values held on the REFL server, as REFL_01:CONST:<name>
+CONSTANT_NAMES = ("S1_Z", "S2_Z", "SM2_Z", "SAMPLE_Z", "S3_Z", "S4_Z", "PD_Z", "S3_MAX", "S4_MAX", "MAX_THETA",
+                  "NATURAL_ANGLE", "HAS_HEIGHT2")
+# Constants which not every refl server has; missing ones are left out of the values
+OPTIONAL_CONSTANT_NAMES = ("S1_MAX", "S2_MAX", "FLIGHT_PATH", "MONITOR_FLIGHT_PATH")
+
+
+class InstrumentConstantsCache(object):
+    """
+    Process wide cache of the instrument constants so that they are not read from the refl server for every action.
+    The cache is cleared by refresh/invalidate, when the optional time to live expires or when one of the constant PVs
+    on the refl server changes, including an optional constant being added (if monitors can be attached, see watch).
+    """
+    def __init__(self, ttl=None):
+        """
+        Initialiser.
+        Args:
+            ttl: time to live of the cached constants in seconds; None to keep them until invalidated
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._constants = None
+        self._values = {}
+        self._read_at = None
+        self._monitored = False
+        self._watch_attempted = False
+        self._lock = threading.RLock()
+        # monitors are attached under a lock of their own, as their callbacks take the cache lock
+        self._watch_lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns: the cached constants, reading them from the refl server if they are not cached or have expired
+        """
+        if not self._watch_attempted:
+            self.watch()
+        with self._lock:
+            if self._constants is not None and not self._expired():
+                self.hits += 1
+                return self._constants
+            self.misses += 1
+            values = read_reflectometry_values(CONSTANT_NAMES)
+            values.update(read_optional_values(OPTIONAL_CONSTANT_NAMES))
+            self._constants = _constants_from_values(values)
+            self._values = values
+            self._read_at = time.monotonic()
+            return self._constants
+
+    def refresh(self):
+        """
+        Re-read the constants from the refl server.
+        Returns: the new constants
+        """
+        self.invalidate()
+        return self.get()
+
+    def invalidate(self):
+        """
+        Clear the cached constants so that they are read again on next use.
+        """
+        with self._lock:
+            self._constants = None
+            self._values = {}
+            self._read_at = None
+
+    def _expired(self):
+        return self.ttl is not None and time.monotonic() - self._read_at > self.ttl
+
+    def constant_changed(self, value_name, value):
+        """
+        Invalidate the cache if a constant has changed from the value it was read with, or an optional constant which
+        was missing has been given a value. Used as monitor callback.
+        Args:
+            value_name: name of the constant, e.g. S1_Z
+            value: new value of the constant
+        """
+        with self._lock:
+            if value_name in self._values:
+                changed = not _same_value(self._values[value_name], value)
+            else:
+                changed = self._constants is not None and value is not None and value != ""
+            if changed:
+                print("Instrument constant {} changed to {}, constants will be re-read".format(value_name, value))
+                self.invalidate()
+
+    def watch(self):
+        """
+        Attach monitors to the constant PVs, the optional ones included, so that the cache is invalidated when they
+        change on the refl server. Monitors are only attempted once; the failure is printed the first time.
+        Returns: True if monitors are attached; False if not available (e.g. not on an instrument), then rely on ttl
+            or explicit refresh
+        """
+        with self._watch_lock:
+            if self._monitored or self._watch_attempted:
+                return self._monitored
+            self._watch_attempted = True
+            try:
+                # pylint: disable=import-error
+                from genie_python.genie_cachannel_wrapper import CaChannelWrapper
+                for value_name in CONSTANT_NAMES:
+                    CaChannelWrapper.add_monitor(g.prefix_pv_name(_constant_pv_name(value_name)),
+                                                 _monitor_callback(self, value_name))
+            except Exception as e:
+                print("Can not monitor instrument constants ({}); use ttl or refresh instead".format(e))
+                return False
+            for value_name in OPTIONAL_CONSTANT_NAMES:
+                try:
+                    CaChannelWrapper.add_monitor(g.prefix_pv_name(_constant_pv_name(value_name)),
+                                                 _monitor_callback(self, value_name))
+                except Exception:  # pylint: disable=broad-except
+                    pass  # not on this refl server; picked up on the next read after a refresh
+            self._monitored = True
+            return True
+
+    def stats(self):
+        """
+        Returns: dictionary of cache hits and misses
+        """
+        return {"hits": self.hits, "misses": self.misses}
 
     def __repr__(self):
-        return "s1s2={}, s2sa={}, sm_sa={}, max_theta={}, s3max={}, s4max={}, has_height_2={}, natural_angle={}".format(
-            self.s1s2, self.s2sa, self.sm_sa, self.max_theta, self.s3max, self.s4max, self.has_height2,
-            self.incoming_beam_angle
-        )
+        return "Instrument constants cache: hits={}, misses={}, ttl={}, cached={}".format(
+            self.hits, self.misses, self.ttl, self._constants is not None)
 
 
-def get_instrument_constants():
+def _same_value(old, new):
     """
+    Returns: True if a monitored value is the value a constant was read with; numbers are compared as floats, as
+        monitors and reads may give the same number as different types
+    """
+    try:
+        return float(old) == float(new)
+    except (TypeError, ValueError):
+        return old == new
+
+
+def _monitor_callback(cache, value_name):
+    """
+    Returns: monitor callback for a constant PV that informs the cache of the new value
+    """
+    def _callback(value, alarm_severity, alarm_status):
+        # pylint: disable=unused-argument
+        cache.constant_changed(value_name, value)
+    return _callback
+
+
+constants_cache = InstrumentConstantsCache()
+
+
+def get_instrument_constants(use_cache=True):
+    """
+    Args:
+        use_cache: True to use the process wide constants cache; False to read the PVs directly
     Returns: constants for the current instrument from PVs defined in the refl server
     """
+    if use_cache:
+        return constants_cache.get()
+    values = read_reflectometry_values(CONSTANT_NAMES)
+    values.update(read_optional_values(OPTIONAL_CONSTANT_NAMES))
+    return _constants_from_values(values)
+
+
+def refresh_instrument_constants():
+    """
+    Re-read the instrument constants from the refl server, e.g. after the constants have been changed.
+    Returns: the new constants
+    """
+    return constants_cache.refresh()
+
+
+def _constants_from_values(values):
+    """
+    Create the instrument constants from the values read from the refl server
+    Args:
+        values: dictionary of constant name to value
+    Returns: instrument constants
+    """
     try:
-        s1_z = get_reflectometry_value("S1_Z")
-        s2_z = get_reflectometry_value("S2_Z")
-        sm_z = get_reflectometry_value("SM2_Z") # set to SM2_Z for now, needs updating to include both.
-        sample_z = get_reflectometry_value("SAMPLE_Z")
-        s3_z = get_reflectometry_value("S3_Z")
-        s4_z = get_reflectometry_value("S4_Z")
-        pd_z = get_reflectometry_value("PD_Z")
-        s3_max = get_reflectometry_value("S3_MAX")
-        s4_max = get_reflectometry_value("S4_MAX")
-        max_theta = get_reflectometry_value("MAX_THETA")
-        natural_angle = get_reflectometry_value("NATURAL_ANGLE")
-        has_height2 = get_reflectometry_value("HAS_HEIGHT2") == "YES"
+        s1_z = values["S1_Z"]
+        s2_z = values["S2_Z"]
+        sm_z = values["SM2_Z"] # set to SM2_Z for now, needs updating to include both.
+        sample_z = values["SAMPLE_Z"]
+        s3_max = values["S3_MAX"]
+        s4_max = values["S4_MAX"]
+        max_theta = values["MAX_THETA"]
+        natural_angle = values["NATURAL_ANGLE"]
+        has_height2 = values["HAS_HEIGHT2"] == "YES"
 
         return InstrumentConstant(
             s1s2=s2_z - s1_z,
@@ -67,18 +251,53 @@ def get_instrument_constants():
             s3max=s3_max,  # max s4_vg at max Theta
             sm_sa=sample_z - sm_z,
             incoming_beam_angle=natural_angle,
-            has_height2=has_height2)
+            has_height2=has_height2,
+            s1max=values.get("S1_MAX"),
+            s2max=values.get("S2_MAX"),
+            flight_path=values.get("FLIGHT_PATH"),
+            monitor_flight_path=values.get("MONITOR_FLIGHT_PATH"))
+    except Exception as e:
+        raise ValueError("No instrument value pvs to calculated requested result: {}".format(e))
+
+
+def read_reflectometry_values(value_names):
+    """
+    :param value_names: names of the values
+    :return: dictionary of value name to the value stored in the pv on the REFL server
+    :raises ValueError: if a PV does not exist
+    """
+    try:
+        return read_concurrently(get_reflectometry_value, value_names)
     except Exception as e:
         raise ValueError("No instrument value pvs to calculated requested result: {}".format(e))
 
 
+def read_optional_values(value_names):
+    """
+    :param value_names: names of values which may not be on the REFL server
+    :return: dictionary of value name to value for those which are
+    """
+    def _read(value_name):
+        try:
+            return get_reflectometry_value(value_name)
+        except IOError:
+            return None
+
+    return {name: value for name, value in read_concurrently(_read, value_names).items()
+            if value is not None and value != ""}
+
+
+def _constant_pv_name(value_name):
+    return "REFL_01:CONST:{}".format(value_name)
+
+
 def get_reflectometry_value(value_name):
     """
     :param value_name: name of the value
     :return: value for the value_name stored in the pv on the REFL server
     :raises IOError: if PV does not exist
     """
-    pv_name = "REFL_01:CONST:{}".format(value_name)
+    pv_name = _constant_pv_name(value_name)
     value = g.get_pv(pv_name, is_local=True)
     if value is None:
         raise IOError("PV {} does not exist".format(pv_name))
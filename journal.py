@@ -0,0 +1,229 @@
+"""
+Append only journal of the actions run from a plan, so that a script which stops part way through can be resumed
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+# Journal file size above which it is rotated
+MAX_BYTES = 1024 * 1024
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+NOTE = "note"
+CHECKPOINT = "checkpoint"
+
+
+def plan_key(compiled_plan):
+    """
+    Returns: key identifying a plan by its actions, so a journal is only used to resume the plan it was written for
+    Raises: TypeError if an argument of an action can not be part of the key, see _stable
+    """
+    digest = hashlib.sha1()
+    for compiled in compiled_plan.actions:
+        key = (compiled.action.name, compiled.setpoints, compiled.title, compiled.count, compiled.osc,
+               compiled.action.params)
+        digest.update(json.dumps(_stable(key)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _qualified_name(value):
+    return "{}.{}".format(getattr(value, "__module__", None), getattr(value, "__qualname__", repr(value)))
+
+
+def _stable(value):
+    """
+    Returns: value as plain json data which is the same in every process. Functions and classes are given by their
+        qualified names, samples by their values and other objects, e.g. a live reduction, by the name of their type
+        and the settings given by their as_dict method, so no address of an object is part of the key.
+    Raises: TypeError for an object with no as_dict method, as plans differing only in it would have the same key
+    """
+    from sample import Sample, is_sample
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (tuple, list)):
+        return [_stable(item) for item in value]
+    if isinstance(value, dict):
+        return sorted([str(key), _stable(item)] for key, item in value.items())
+    if is_sample(value):
+        return [_qualified_name(Sample), _stable(value.as_dict() if hasattr(value, "as_dict") else vars(value))]
+    if isinstance(value, type) or callable(value) and hasattr(value, "__qualname__"):
+        return _qualified_name(value)
+    if hasattr(value, "as_dict"):
+        return [_qualified_name(type(value)), _stable(value.as_dict())]
+    raise TypeError("Can not journal a plan with a {} argument; give it an as_dict method returning its settings"
+                    .format(_qualified_name(type(value))))
+
+
+class RunJournal(object):
+    """
+    Journal of the actions of a plan. Each event is appended as a line of json and flushed to disk before the script
+    carries on. When the file grows past max_bytes it is moved to <path>.1 and a new file is started with a checkpoint
+    of the completed actions, so at most two files are kept however long the script.
+    """
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        """
+        Initialiser.
+        Args:
+            path: path of the journal file
+            max_bytes: size above which the journal is rotated
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.plan = None
+        self._done = set()
+        self._file = None
+
+    def open(self, compiled_plan):
+        """
+        Open the journal for a plan, reading what has already been done for it.
+        Args:
+            compiled_plan: plan being run
+        """
+        self.plan = plan_key(compiled_plan)
+        self._done = set(self.read()[0])
+        self._file = open(self.path, "a")
+
+    def close(self):
+        """
+        Close the journal file
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def started(self, index):
+        """
+        Record that an action has been started
+        """
+        self._append(STARTED, index)
+
+    def done(self, index):
+        """
+        Record that an action has finished
+        """
+        self._done.add(index)
+        self._append(DONE, index)
+
+    def failed(self, index, error):
+        """
+        Record that an action stopped with an error
+        """
+        self._append(FAILED, index, error=repr(error))
+
+    def note(self, index, **info):
+        """
+        Record information about an action, e.g. the statistics it achieved
+        """
+        self._append(NOTE, index, **info)
+
+    def read(self):
+        """
+        Read the journal for the open plan.
+        Returns: indices of completed actions, index of an action that was started and not finished (None if there
+            is not one)
+        """
+        done, interrupted = set(), None
+        for record in self._records():
+            if record.get("plan") != self.plan:
+                continue
+            event, index = record["event"], record.get("index")
+            if event == CHECKPOINT:
+                done.update(record["done"])
+            elif event == STARTED:
+                interrupted = index
+            elif event == DONE:
+                done.add(index)
+                interrupted = None if interrupted == index else interrupted
+        return sorted(done), interrupted
+
+    def next_index(self):
+        """
+        Returns: index of the first action of the open plan that has not been completed
+        """
+        index = 0
+        while index in self._done:
+            index += 1
+        return index
+
+    def notes(self):
+        """
+        Returns: information noted about actions, from all the plans in the journal
+        """
+        return [record for record in self._records() if record.get("event") == NOTE]
+
+    def _records(self):
+        for path in (self.path + ".1", self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path) as journal_file:
+                for line in journal_file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        pass  # line cut short by a crash
+
+    def _append(self, event, index, **info):
+        record = dict(info, time=time.time(), plan=self.plan, event=event, index=index)
+        self._write(record)
+        if self._file.tell() > self.max_bytes:
+            self._rotate()
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _rotate(self):
+        """
+        Move the journal to <path>.1 and start a new one holding a checkpoint of the completed actions
+        """
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._file = open(self.path, "a")
+        self._write({"time": time.time(), "plan": self.plan, "event": CHECKPOINT, "index": None,
+                     "done": sorted(self._done)})
+
+    def __repr__(self):
+        return "Run journal: {}, {} actions done".format(self.path, len(self._done))
+
+
+def resume_plan(compiled_plan, journal_path, **executor_kwargs):
+    """
+    Run a plan, skipping the actions its journal records as completed. An action that was interrupted is run again
+    from the start; if the DAE was left running by it then that run is ended first.
+    Args:
+        compiled_plan: plan to run
+        journal_path: path of the journal written when the plan was run before
+        executor_kwargs: other arguments for PlanExecutor
+    """
+    from action_plan import PlanExecutor
+
+    journal = RunJournal(journal_path)
+    journal.open(compiled_plan)
+    done, interrupted = journal.read()
+    start = journal.next_index()
+    journal.close()
+    print("Resuming plan at action {} of {}, {} actions already done".format(start, len(compiled_plan.actions),
+                                                                             len(done)))
+    if interrupted is not None:
+        print("Action {} was interrupted and will be run again".format(interrupted))
+        if not executor_kwargs.get("dry_run") and g.get_runstate() != "SETUP":
+            print("Ending run left by the interrupted action")
+            g.end()
+    PlanExecutor(compiled_plan, journal=journal_path, **executor_kwargs).run(start)
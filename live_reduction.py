@@ -0,0 +1,287 @@
+"""
+Reduce the detector spectrum to reflectivity against Q while a run counts
+"""
+import numpy as np
+
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+from instrument_constants import get_instrument_constants
+from statistics_count import FLIGHT_PATH, tof_to_q, tof_to_wavelength
+
+# moderator to monitor distance in m, used when the refl server has no MONITOR_FLIGHT_PATH constant
+MONITOR_FLIGHT_PATH = 8.0
+
+# curve of a reduction with no spectrum read yet
+_EMPTY = np.zeros(0)
+
+# shortest seconds to wait between checks of the count while following a run
+MIN_WAIT = 0.5
+
+
+class LiveReduction(object):
+    """
+    Running reflectivity curve of the current run. Each update reads the detector and monitor spectra, which hold the
+    counts since the run began, rebins the monitor onto the wavelength of the detector bins (the monitor is on a
+    shorter flight path, so the same time of flight is a longer wavelength), divides them bin by bin and, if a Q grid
+    is given, rebins onto it. The Q of each time of flight bin only depends on theta, so it is calculated once per run
+    and all the per-bin work is done in buffers allocated when the first spectrum arrives.
+    Flight paths not given are read from the instrument constants at the start of each run, falling back to
+    statistics_count.FLIGHT_PATH and MONITOR_FLIGHT_PATH, with a warning, when the refl server does not have them.
+    """
+    def __init__(self, detector=3, monitor=1, period=1, q_bins=None, flight_path=None, interval=10.0,
+                 stop_when=None, source=None, monitor_flight_path=None):
+        """
+        Initialiser.
+        Args:
+            detector: detector spectrum number
+            monitor: monitor spectrum number
+            period: period to read the spectra from
+            q_bins: edges of the Q bins to rebin onto; None for the Q of each time of flight bin
+            flight_path: moderator to detector distance in m; None for the instrument constants
+            interval: seconds between updates while following a run
+            stop_when: function of this reduction returning True to end the count early, e.g. when the curve is
+                good enough; None to count to the end
+            source: function to read spectra from with the arguments of g.get_spectrum, e.g. the get_spectrum of a
+                spectrum_archive.RunSpectra to replay a stored run; None for the instrument
+            monitor_flight_path: moderator to monitor distance in m; None for the instrument constants
+        """
+        self.detector = detector
+        self.monitor = monitor
+        self.period = period
+        self.q_bins = None if q_bins is None else np.asarray(q_bins, dtype=float)
+        self.flight_path = flight_path
+        self.monitor_flight_path = monitor_flight_path
+        self.interval = interval
+        self.stop_when = stop_when
+        self.source = source
+        self.theta = None
+        self.updates = 0
+        self._flight_path = flight_path
+        self._monitor_flight_path = monitor_flight_path
+        self._bins = 0
+        self._q = None
+        self._curve_q = None
+        self._counts = None
+        self._monitor = None
+        self._binned_counts = None
+        self._binned_monitor = None
+        self._has_monitor = None
+        self._ratio = None
+        self._error = None
+        self._bin_index = None
+        self._wavelength_edges = None
+        self._monitor_bins = 0
+        self._monitor_signal = None
+        self._cumulative = None
+        self._low = None
+        self._high = None
+        self._fraction = None
+        self._at_edges = None
+        self._step = None
+
+    def as_dict(self):
+        """
+        Returns: dictionary of the settings of the reduction, e.g. to tell plans using different reductions apart
+        """
+        return {"detector": self.detector, "monitor": self.monitor, "period": self.period, "q_bins": self.q_bins,
+                "flight_path": self.flight_path, "monitor_flight_path": self.monitor_flight_path,
+                "interval": self.interval, "stop_when": self.stop_when, "source": self.source}
+
+    def __deepcopy__(self, memo):
+        # a reduction is a handle on the live data, so recorded plans share it rather than copy it
+        return self
+
+    def start(self, theta):
+        """
+        Start following a new run
+        Args:
+            theta: angle of reflection for the run
+        """
+        self.theta = theta
+        self.updates = 0
+        self._bins = 0
+        self._flight_path, self._monitor_flight_path = self.flight_paths()
+
+    def flight_paths(self):
+        """
+        Returns: moderator to detector and moderator to monitor distances in m, those not given to the initialiser
+            from the instrument constants
+        """
+        flight_path, monitor_flight_path = self.flight_path, self.monitor_flight_path
+        if flight_path is None or monitor_flight_path is None:
+            try:
+                constants = get_instrument_constants()
+            except ValueError:
+                constants = None
+            if flight_path is None:
+                flight_path = _constant_or_default(constants, "flight_path", "FLIGHT_PATH", FLIGHT_PATH)
+            if monitor_flight_path is None:
+                monitor_flight_path = _constant_or_default(constants, "monitor_flight_path", "MONITOR_FLIGHT_PATH",
+                                                           MONITOR_FLIGHT_PATH)
+        return float(flight_path), float(monitor_flight_path)
+
+    def _allocate(self, time, bins):
+        """
+        Allocate the buffers and calculate the Q of each bin for the current theta
+        """
+        self._bins = bins
+        self._monitor_bins = 0
+        self._wavelength_edges = None
+        if time is None:
+            time = np.arange(bins, dtype=float)
+        else:
+            self._wavelength_edges = tof_to_wavelength(_edges(time, bins), self._flight_path)
+            if len(time) == bins + 1:
+                time = (time[:-1] + time[1:]) / 2
+        self._q = tof_to_q(time, self.theta, self._flight_path)
+        self._curve_q = self._q
+        self._counts = np.zeros(bins)
+        self._monitor = np.zeros(bins)
+        self._at_edges = np.zeros(bins + 1)
+        self._step = np.zeros(bins + 1)
+        if self.q_bins is not None:
+            # bins outside the grid go into an extra bin which is dropped
+            self._bin_index = np.digitize(self._q, self.q_bins) - 1
+            self._bin_index[(self._bin_index < 0) | (self._bin_index >= len(self.q_bins) - 1)] = len(self.q_bins) - 1
+            self._curve_q = (self.q_bins[:-1] + self.q_bins[1:]) / 2
+            self._binned_counts = np.zeros(len(self.q_bins))
+            self._binned_monitor = np.zeros(len(self.q_bins))
+        self._has_monitor = np.zeros(len(self._curve_q), dtype=bool)
+        self._ratio = np.zeros(len(self._curve_q))
+        self._error = np.zeros(len(self._curve_q))
+
+    def update(self):
+        """
+        Read the spectra and recalculate the reflectivity
+        Returns: q, reflectivity, error; see curve
+        """
+        if self.theta is None:
+            raise ValueError("Call start with the angle of the run before updating")
+        get_spectrum = g.get_spectrum if self.source is None else self.source
+        detector = get_spectrum(self.detector, self.period, dist=False)
+        monitor = get_spectrum(self.monitor, self.period, dist=False)
+        signal = detector["signal"]
+        if len(signal) != self._bins:
+            time = detector.get("time")
+            self._allocate(None if time is None else np.asarray(time, dtype=float), len(signal))
+        self._counts[:] = signal
+        self._monitor_on_detector_bins(monitor)
+        self.updates += 1
+        return self.curve()
+
+    def _monitor_on_detector_bins(self, monitor):
+        """
+        Put the monitor counts in the wavelength range of each detector bin into the monitor buffer; the monitor as it
+        is if either spectrum has no times of flight
+        """
+        signal = monitor["signal"]
+        time = monitor.get("time")
+        if self._wavelength_edges is None or time is None:
+            self._monitor[:] = signal
+            return
+        if len(signal) != self._monitor_bins:
+            self._allocate_monitor(np.asarray(time, dtype=float), len(signal))
+        # counts are spread evenly across each monitor bin, so the cumulative counts interpolate linearly between the
+        # edges, at the positions of the detector edges worked out in _allocate_monitor
+        self._monitor_signal[:] = signal
+        np.cumsum(self._monitor_signal, out=self._cumulative[1:])
+        np.take(self._cumulative, self._low, out=self._at_edges)
+        np.take(self._cumulative, self._high, out=self._step)
+        self._step -= self._at_edges
+        self._step *= self._fraction
+        self._at_edges += self._step
+        np.subtract(self._at_edges[1:], self._at_edges[:-1], out=self._monitor)
+
+    def _allocate_monitor(self, time, bins):
+        """
+        Allocate the monitor buffers and find where each detector wavelength edge falls between the monitor edges
+        """
+        self._monitor_bins = bins
+        self._monitor_signal = np.zeros(bins)
+        self._cumulative = np.zeros(bins + 1)
+        edges = tof_to_wavelength(_edges(time, bins), self._monitor_flight_path)
+        # edges beyond the monitor take the counts at its first or last edge, as np.interp would
+        self._low = np.clip(np.searchsorted(edges, self._wavelength_edges, side="right") - 1, 0, bins)
+        self._high = np.minimum(self._low + 1, bins)
+        width = edges[self._high] - edges[self._low]
+        fraction = np.divide(self._wavelength_edges - edges[self._low], width, out=np.zeros(len(width)),
+                             where=width > 0)
+        self._fraction = np.clip(fraction, 0.0, 1.0)
+
+    def curve(self):
+        """
+        Returns: q, reflectivity (detector / monitor counts) and its Poisson error, on the Q grid if one was given;
+            bins with no monitor counts are 0. The arrays are reused by the next update, so copy them to keep them.
+        """
+        if self._bins == 0:
+            return _EMPTY, _EMPTY, _EMPTY
+        counts, monitor = self._counts, self._monitor
+        if self.q_bins is not None:
+            self._binned_counts.fill(0)
+            self._binned_monitor.fill(0)
+            np.add.at(self._binned_counts, self._bin_index, counts)
+            np.add.at(self._binned_monitor, self._bin_index, monitor)
+            counts, monitor = self._binned_counts[:-1], self._binned_monitor[:-1]
+        q, ratio, error, has_monitor = self._curve_q, self._ratio, self._error, self._has_monitor
+        np.greater(monitor, 0, out=has_monitor)
+        ratio.fill(0)
+        np.divide(counts, monitor, out=ratio, where=has_monitor)
+        # relative errors add in quadrature: dR = R * sqrt(1 / counts + 1 / monitor) = sqrt(R * (R + 1) / monitor)
+        # R is 0 where there is no monitor, so the error is 0 there too
+        np.add(ratio, 1, out=error)
+        error *= ratio
+        np.divide(error, monitor, out=error, where=has_monitor)
+        np.sqrt(error, out=error)
+        return q, ratio, error
+
+    def follow(self, progress, target):
+        """
+        Update every interval until a count is reached, or until stop_when returns True. Near the end the wait is cut
+        to the time the count is expected to take at its rate so far, so the count does not run on past the target.
+        The run should already have begun.
+        Args:
+            progress: function returning the current count, see oscillation.progress_getter
+            target: count to reach
+        Returns: True if the count was reached; False if stopped early by stop_when
+        """
+        while True:
+            counted = progress()
+            if counted >= target:
+                break
+            seconds = float(g.get_time_since_begin(False))
+            wait = self.interval
+            if counted > 0 and seconds > 0:
+                wait = min(wait, max((target - counted) / (counted / seconds), MIN_WAIT))
+            g.waitfor_time(seconds=wait)
+            self.update()
+            if self.stop_when is not None and self.stop_when(self):
+                print("Count stopped early after {} updates of the live reduction".format(self.updates))
+                return False
+        self.update()
+        return True
+
+
+def _constant_or_default(constants, attribute, name, default):
+    """
+    Returns: value of an instrument constant; the default, with a warning, if the refl server does not have it
+    """
+    value = getattr(constants, attribute, None)
+    if value is None:
+        print("Warning: no {} instrument constant, using {} m; Q and the monitor rebinning may be wrong".format(
+            name, default))
+        return default
+    return value
+
+
+def _edges(time, bins):
+    """
+    Returns: edges of the time of flight bins, given either their edges or their centres
+    """
+    if len(time) == bins + 1:
+        return time
+    middles = (time[:-1] + time[1:]) / 2
+    return np.concatenate(([2 * time[0] - middles[0]], middles, [2 * time[-1] - middles[-1]]))
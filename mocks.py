@@ -4,6 +4,8 @@ This module creates mocks to handle classes that may not be available
 on development or testing machines.
 """
 
+import time
+
 from mock import Mock
 import numpy as np
 
@@ -40,7 +42,23 @@ g._genie_api.pv_exists.side_effect = pv_exists
 
 
 PVS = {"PV:THETA.EGU": "deg", "PV:TWO_THETA.EGU": "deg",
-       "CS:SB:Theta.RDBD": 1.5}
+       "CS:SB:Theta.RDBD": 1.5,
+       "REFL_01:CONST:S1_Z": 0.0, "REFL_01:CONST:S2_Z": 2596.0, "REFL_01:CONST:SM2_Z": 3009.0,
+       "REFL_01:CONST:SAMPLE_Z": 3108.0, "REFL_01:CONST:S3_Z": 3355.0, "REFL_01:CONST:S4_Z": 5660.0,
+       "REFL_01:CONST:PD_Z": 5826.0, "REFL_01:CONST:S3_MAX": 10.0, "REFL_01:CONST:S4_MAX": 10.0,
+       "REFL_01:CONST:S1_MAX": 20.0, "REFL_01:CONST:S2_MAX": 10.0,
+       "REFL_01:CONST:MAX_THETA": 2.3, "REFL_01:CONST:NATURAL_ANGLE": 2.3, "REFL_01:CONST:HAS_HEIGHT2": "YES"}
+
+# Simulated time taken by each get_pv/cget call in seconds
+LATENCY = 0.0
+
+
+def set_latency(seconds):
+    """
+    Set the simulated time taken by each get_pv and cget call, e.g. to measure the effect of reading PVs together
+    """
+    global LATENCY
+    LATENCY = seconds
 
 
 def set_pv(pv_name, value, **kwargs):
@@ -57,6 +75,7 @@ def get_pv(pv_name, **kwargs):
     """
     # pylint: disable=unused-argument
     # return PVS.get(pv_name, 0)
+    time.sleep(LATENCY)
     return PVS.get(pv_name, "")
 
 
@@ -66,6 +85,7 @@ g.get_pv = get_pv
 
 def cget(block):
     """Fake cget for the fake genie_python"""
+    time.sleep(LATENCY)
     if block in instrument:
         return {"value": instrument[block]}
     return None
@@ -82,12 +102,12 @@ g.cget.side_effect = cget
 g.cset.side_effect = cset
 
 
-instrument = {"Theta": 0, "Two_Theta": 0}
+instrument = {"Theta": 0, "Two_Theta": 0, "MODE": "SOLID"}
 
 g.get_blocks.side_effect = instrument.keys
 
 
-def fake_spectrum(channel, period):  # pragma: no cover
+def fake_spectrum(channel, period, dist=False):  # pragma: no cover
     """Create a fake intensity spectrum."""
     if channel == 1:
         return {"signal": np.zeros(1000) + 1}
@@ -113,6 +133,29 @@ def fake_spectrum(channel, period):  # pragma: no cover
 
 g.get_spectrum.side_effect = fake_spectrum
 
+# seconds counted in the current run; waits add to it instead of sleeping
+run_time = {"seconds": 0.0}
+
+
+def begin(*args, **kwargs):
+    """Begin a run"""
+    run_time["seconds"] = 0.0
+
+
+def waitfor_time(seconds=None, minutes=None, hours=None, **kwargs):
+    """Wait for a time, adding it to the run time"""
+    run_time["seconds"] += (seconds or 0) + 60 * (minutes or 0) + 3600 * (hours or 0)
+
+
+def get_time_since_begin(get_timedelta=False):
+    """Get the seconds counted in the run"""
+    return run_time["seconds"]
+
+
+g.begin.side_effect = begin
+g.waitfor_time.side_effect = waitfor_time
+g.get_time_since_begin.side_effect = get_time_since_begin
+
 RUNSTATE = "SETUP"
 
 
@@ -0,0 +1,199 @@
+"""
+Model of the time taken to move the instrument axes, used to estimate run times in a dry run
+"""
+import json
+from math import sqrt
+
+import numpy as np
+
+# Kinematics for each axis: speed (units/s), acceleration (units/s^2) and settle time (s) after a move. Axes with no
+# speed are switches (e.g. super mirror in/out of beam) that take their settle time to change state. THETA includes
+# the time for the detector and slits 3 and 4 to follow. initial is the assumed position at the start of a script.
+DEFAULT_PROFILE = {
+    "TRANS": {"speed": 5.0, "acceleration": 10.0, "settle": 1.0, "initial": 0.0},
+    "THETA": {"speed": 0.1, "acceleration": 0.2, "settle": 2.0, "initial": 0.0},
+    "PHI": {"speed": 0.1, "acceleration": 0.2, "settle": 1.0, "initial": 0.0},
+    "PSI": {"speed": 0.1, "acceleration": 0.2, "settle": 1.0, "initial": 0.0},
+    "HEIGHT": {"speed": 0.5, "acceleration": 1.0, "settle": 1.0, "initial": 0.0},
+    "HEIGHT2": {"speed": 0.5, "acceleration": 1.0, "settle": 1.0, "initial": 0.0},
+    "SM1ANGLE": {"speed": 0.05, "acceleration": 0.1, "settle": 1.0, "initial": 0.0},
+    "SM2ANGLE": {"speed": 0.05, "acceleration": 0.1, "settle": 1.0, "initial": 0.0},
+    "SM1INBEAM": {"settle": 10.0, "initial": "OUT"},
+    "SM2INBEAM": {"settle": 10.0, "initial": "OUT"},
+    "S1VG": {"speed": 0.2, "acceleration": 1.0, "settle": 0.5, "initial": 0.0},
+    "S2VG": {"speed": 0.2, "acceleration": 1.0, "settle": 0.5, "initial": 0.0},
+    "S3VG": {"speed": 0.2, "acceleration": 1.0, "settle": 0.5, "initial": 0.0},
+    "S4VG": {"speed": 0.2, "acceleration": 1.0, "settle": 0.5, "initial": 0.0},
+    "S1HG": {"speed": 1.0, "acceleration": 2.0, "settle": 0.5, "initial": 0.0},
+    "S2HG": {"speed": 1.0, "acceleration": 2.0, "settle": 0.5, "initial": 0.0},
+    "S3HG": {"speed": 1.0, "acceleration": 2.0, "settle": 0.5, "initial": 0.0},
+    "S4HG": {"speed": 1.0, "acceleration": 2.0, "settle": 0.5, "initial": 0.0},
+}
+
+
+class AxisKinematics(object):
+    """
+    Trapezoidal velocity profile of an axis
+    """
+    def __init__(self, speed=None, acceleration=None, settle=0.0):
+        """
+        Initialiser.
+        Args:
+            speed: maximum speed in units per second; None for a switch which takes the settle time to change
+            acceleration: acceleration in units per second squared; None for instant acceleration
+            settle: time taken to settle after a move in seconds
+        """
+        self.speed = speed
+        self.acceleration = acceleration
+        self.settle = settle
+
+    def move_time(self, start, end):
+        """
+        Args:
+            start: start position; None if unknown
+            end: end position
+        Returns: time in seconds to move from start to end, 0 if it does not move
+        """
+        if start == end:
+            return 0.0
+        if self.speed is None:
+            return self.settle
+        try:
+            distance = abs(float(end) - float(start))
+        except (TypeError, ValueError):
+            return self.settle
+        if self.acceleration is None:
+            return distance / self.speed + self.settle
+        ramp_distance = self.speed * self.speed / self.acceleration
+        if distance < ramp_distance:
+            # never reaches full speed
+            return 2 * sqrt(distance / self.acceleration) + self.settle
+        return distance / self.speed + self.speed / self.acceleration + self.settle
+
+    def move_times(self, start, end):
+        """
+        Vectorised move_time for numeric positions, e.g. the columns of a sample.SampleTable
+        Args:
+            start: array of start positions
+            end: array of end positions
+        Returns: array of times in seconds to move from each start to each end, 0 where it does not move
+        """
+        distance = np.abs(np.asarray(end, dtype=float) - np.asarray(start, dtype=float))
+        if self.speed is None:
+            seconds = np.full(distance.shape, float(self.settle))
+        elif self.acceleration is None:
+            seconds = distance / self.speed + self.settle
+        else:
+            seconds = np.where(distance < self.speed * self.speed / self.acceleration,
+                               2 * np.sqrt(distance / self.acceleration),
+                               distance / self.speed + self.speed / self.acceleration) + self.settle
+        return np.where(distance == 0, 0.0, seconds)
+
+    def __repr__(self):
+        return "speed={}, acceleration={}, settle={}".format(self.speed, self.acceleration, self.settle)
+
+
+class MotionModel(object):
+    """
+    Simulated positions of the instrument axes through a script and the time taken to move them. Axes in a move are
+    moved together so a move takes as long as its slowest axis.
+    """
+    def __init__(self, axes, positions=None):
+        """
+        Initialiser.
+        Args:
+            axes: dictionary of axis name to its AxisKinematics
+            positions: dictionary of axis name to position at the start; axes not included are assumed at 0
+        """
+        self.axes = {axis.upper(): kinematics for axis, kinematics in axes.items()}
+        self.initial_positions = {axis.upper(): value for axis, value in (positions or {}).items()}
+        self.positions = dict(self.initial_positions)
+        self.total_time = 0.0
+
+    @classmethod
+    def from_profile(cls, profile):
+        """
+        Create a model from an instrument profile
+        Args:
+            profile: dictionary of axis name to dictionary of speed, acceleration, settle and initial position
+        Returns: motion model
+        """
+        axes = {axis: AxisKinematics(spec.get("speed"), spec.get("acceleration"), spec.get("settle", 0.0))
+                for axis, spec in profile.items()}
+        positions = {axis: spec["initial"] for axis, spec in profile.items() if "initial" in spec}
+        return cls(axes, positions)
+
+    def move_time(self, setpoints):
+        """
+        Args:
+            setpoints: dictionary of axis to setpoint
+        Returns: time in seconds to move to the setpoints from the current simulated positions without moving
+        """
+        return self.transition_time(self.positions, setpoints)
+
+    def transition_time(self, positions, setpoints):
+        """
+        Args:
+            positions: dictionary of axis to position to start from
+            setpoints: dictionary of axis to setpoint
+        Returns: time in seconds to move from the positions to the setpoints
+        """
+        times = [self.axes[axis.upper()].move_time(positions.get(axis.upper(), 0.0), value)
+                 for axis, value in setpoints.items() if axis.upper() in self.axes]
+        return max(times, default=0.0)
+
+    def transition_times(self, positions, setpoints):
+        """
+        Vectorised transition_time for numeric axes, e.g. to move between every pair of samples in a table at once
+        Args:
+            positions: dictionary of axis to array of positions to start from; missing axes are at their current
+                simulated position
+            setpoints: dictionary of axis to array of setpoints
+        Returns: array of times in seconds to move from each set of positions to the corresponding setpoints
+        """
+        start = dict(self.positions, **{axis.upper(): value for axis, value in positions.items()})
+        times = [self.axes[axis.upper()].move_times(start.get(axis.upper(), 0.0), value)
+                 for axis, value in setpoints.items() if axis.upper() in self.axes]
+        return np.max(np.broadcast_arrays(*times), axis=0) if times else np.zeros(0)
+
+    def copy(self):
+        """
+        Returns: a model with the same axes and current positions that can be moved independently of this one
+        """
+        model = MotionModel(self.axes, self.initial_positions)
+        model.positions = dict(self.positions)
+        model.total_time = self.total_time
+        return model
+
+    def move(self, setpoints):
+        """
+        Move the simulated axes to the setpoints
+        Args:
+            setpoints: dictionary of axis to setpoint
+        Returns: time in seconds the move takes
+        """
+        seconds = self.move_time(setpoints)
+        self.positions.update((axis.upper(), value) for axis, value in setpoints.items())
+        self.total_time += seconds
+        return seconds
+
+    def reset(self):
+        """
+        Put the axes back to their positions at the start of the script
+        """
+        self.positions = dict(self.initial_positions)
+        self.total_time = 0.0
+
+    def __repr__(self):
+        return "Motion model: positions={}, total_time={:.0f}s".format(self.positions, self.total_time)
+
+
+def load_motion_model(path):
+    """
+    Load a motion model from an instrument profile json file, in the same format as DEFAULT_PROFILE
+    Args:
+        path: path to the profile
+    Returns: motion model
+    """
+    with open(path) as profile_file:
+        return MotionModel.from_profile(json.load(profile_file))
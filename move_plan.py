@@ -0,0 +1,131 @@
+"""
+Collect the axis setpoints for an action and move them together
+"""
+import time
+from collections import OrderedDict
+
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+from bulk_read import read_concurrently
+from setpoint_cache import setpoint_cache
+
+
+class MovePlan(object):
+    """
+    Target setpoints for an action. Targets are collected with add, sent in one batch with dispatch and then only the
+    axes that were written are waited on. Axes are held by their upper case block names.
+    """
+    def __init__(self):
+        self._targets = OrderedDict()
+        self.moved = []
+        self.completed = OrderedDict()
+        self._full_wait = False
+        self._dispatched_at = None
+
+    def add(self, axis, value):
+        """
+        Add a target setpoint; a later target for the same axis, in any case, replaces the earlier one.
+        Args:
+            axis: axis block name
+            value: setpoint
+        """
+        self._targets[axis.upper()] = value
+
+    @property
+    def targets(self):
+        """
+        Returns: the targets that have not yet been dispatched
+        """
+        return OrderedDict(self._targets)
+
+    def require_full_wait(self):
+        """
+        Wait for all axes rather than just those written, e.g. after a mode change which can move other axes.
+        """
+        self._full_wait = True
+
+    def dispatch(self):
+        """
+        Write all targets that differ from their last commanded setpoint in one cset. Cached targets not confirmed by
+        a read back in the last setpoint_cache.readback_interval seconds are read back first, so an axis moved by
+        something else since it was last set is written again.
+        Returns: axes that were written
+        Raises: KeyError if the targets could not be set, e.g. a block does not exist
+        """
+        if setpoint_cache.enabled:
+            _check_readbacks(setpoint_cache.unconfirmed(self._targets))
+        to_write = OrderedDict((axis, value) for axis, value in self._targets.items()
+                               if not setpoint_cache.is_unchanged(axis, value))
+        self._targets.clear()
+        if to_write:
+            print("Moving: {}".format(dict(to_write)))
+            try:
+                _cset_many(to_write)
+            except Exception as e:
+                setpoint_cache.invalidate()
+                raise KeyError("Blocks {} could not be set: {}".format(list(to_write.keys()), e))
+            for axis, value in to_write.items():
+                setpoint_cache.record(axis, value)
+        self.moved.extend(axis for axis in to_write if axis not in self.moved)
+        self._dispatched_at = time.monotonic()
+        return list(to_write.keys())
+
+    def wait(self):
+        """
+        Dispatch any outstanding targets then wait for the moved axes to finish together, recording the time from
+        dispatch until they had finished in completed.
+        """
+        self.dispatch()
+        try:
+            if self._full_wait:
+                g.waitfor_move()
+            elif self.moved:
+                g.waitfor_move(*self.moved)
+            for axis in self.moved:
+                self.completed[axis] = time.monotonic() - self._dispatched_at
+            # waitfor_move returns without an error when it times out, so check the axes got there
+            _check_readbacks(self.moved)
+        except BaseException:
+            # axes may not have reached their setpoints
+            setpoint_cache.invalidate()
+            raise
+        finally:
+            self.moved = []
+            self._full_wait = False
+
+    def __repr__(self):
+        return "Move plan: targets={}, moved={}, completed={}".format(dict(self._targets), self.moved,
+                                                                       dict(self.completed))
+
+
+def _check_readbacks(axes):
+    """
+    Read back axes together and forget the cached setpoint of any which are not at it
+    Args:
+        axes: axis block names
+    """
+    for axis, block in read_concurrently(g.cget, axes).items():
+        if block is None:
+            setpoint_cache.invalidate(axis)
+        else:
+            setpoint_cache.check_readback(axis, block["value"])
+
+
+def _cset_many(setpoints):
+    """
+    Set several blocks with one cset; falls back to one cset per block if this genie does not support it.
+    Args:
+        setpoints: dictionary of block to value
+    """
+    if len(setpoints) == 1:
+        g.cset(*next(iter(setpoints.items())))
+        return
+    try:
+        g.cset(**setpoints)
+    except TypeError:
+        for axis, value in setpoints.items():
+            g.cset(axis, value)
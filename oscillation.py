@@ -0,0 +1,108 @@
+"""
+Oscillate a block, e.g. a slit centre, while counting until the requested uamps, seconds or frames are reached
+"""
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+
+def progress_getter(count_uamps=None, count_seconds=None, count_frames=None):
+    """
+    Choose how to measure the progress of a run; the first of uamps, seconds, frames that is not None is used.
+    Args:
+        count_uamps: number of uamps to count for
+        count_seconds: number of seconds to count for
+        count_frames: frame number to count to
+    Returns: name of the count, function returning the current count, count to reach
+    Raises: ValueError if no count is given
+    """
+    if count_uamps is not None:
+        return "uamps", g.get_uamps, count_uamps
+    if count_seconds is not None:
+        return "seconds", lambda: g.get_time_since_begin(False), count_seconds
+    if count_frames is not None:
+        return "frames", g.get_frames, count_frames
+    raise ValueError("One of count_uamps, count_seconds or count_frames must be given")
+
+
+class BlockOscillator(object):
+    """
+    Moves a block between two positions while a run counts. Progress is checked while the block is moving, not just
+    at the ends of each stroke, so the run ends as soon as the count is reached.
+    """
+    def __init__(self, block, low, high, progress, target, dwell=1.0, continuous=False, poll=0.5, tolerance=0.05,
+                 maxwait=40):
+        """
+        Initialiser.
+        Args:
+            block: block to oscillate
+            low: position at one end of the stroke
+            high: position at the other end of the stroke
+            progress: function returning the current count
+            target: count to reach
+            dwell: seconds to wait at each end of the stroke
+            continuous: True to turn round as soon as the block is within tolerance of the end of the stroke, ignoring
+                dwell; False to dwell at each end
+            poll: seconds between checks of the progress and block position
+            tolerance: distance from the end of the stroke at which the block is at the end
+            maxwait: maximum seconds for a stroke, in case the end is close to a limit
+        """
+        self.block = block
+        self.low = low
+        self.high = high
+        self.progress = progress
+        self.target = target
+        self.dwell = 0.0 if continuous else dwell
+        self.continuous = continuous
+        self.poll = poll
+        self.tolerance = tolerance
+        self.maxwait = maxwait
+        self.strokes = 0
+
+    def done(self):
+        """
+        Returns: True if the count has been reached
+        """
+        return self.progress() >= self.target
+
+    def run(self):
+        """
+        Oscillate until the count is reached. Does not begin or end the run.
+        """
+        while not self.done():
+            for position in (self.low, self.high):
+                g.cset(self.block, position)
+                if not self._stroke_to(position) or not self._wait(self.dwell):
+                    return
+                self.strokes += 1
+            print("Continuing run, counts at {}".format(self.progress()))
+
+    def _stroke_to(self, position):
+        """
+        Wait for the block to reach position.
+        Returns: False if the count was reached first; True otherwise
+        """
+        waited = 0.0
+        while waited < self.maxwait:
+            if self.done():
+                return False
+            if abs(g.cget(self.block)["value"] - position) <= self.tolerance:
+                return True
+            g.waitfor_time(seconds=self.poll)
+            waited += self.poll
+        return True
+
+    def _wait(self, seconds):
+        """
+        Wait at an end of the stroke.
+        Returns: False if the count was reached first; True otherwise
+        """
+        remaining = seconds
+        while remaining > 0:
+            if self.done():
+                return False
+            g.waitfor_time(seconds=min(self.poll, remaining))
+            remaining -= self.poll
+        return not self.done()
@@ -1,6 +1,14 @@
 """
 Sample classes for reflectometry
 """
+import csv
+
+import numpy as np
+
+# columns of a sample table besides its horizontal gaps, in the order of the Sample initialiser
+SAMPLE_FIELDS = ("title", "subtitle", "translation", "height2_offset", "phi_offset", "psi_offset", "height_offset",
+                 "resolution", "footprint", "sample_length", "valve")
+DEFAULT_GAPS = ("S1HG", "S2HG", "S3HG")
 
 
 class SampleGenerator:
@@ -124,3 +132,254 @@ class Sample:
         
     def __repr__(self):
         return "Sample: {}".format(self.__dict__)
+
+
+def _table_dtype(gaps):
+    """
+    Returns: structured dtype of a sample table with columns for the given horizontal gaps
+    """
+    return np.dtype([("title", "O"), ("subtitle", "O")] +
+                    [(field, "f8") for field in SAMPLE_FIELDS[2:-1]] + [("valve", "i4")] +
+                    [(gap, "f8") for gap in gaps])
+
+
+def _row_attribute(field):
+    """
+    Returns: property of a sample row reading and writing a column of its table
+    """
+    def get_value(row):
+        value = row._table.array[field][row._index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def set_value(row, value):
+        row._table.array[field][row._index] = value
+
+    return property(get_value, set_value, doc="{} of the sample".format(field))
+
+
+class SampleRow(object):
+    """
+    A sample stored as a row of a SampleTable. It has no attributes of its own, only the table and row number, and can
+    be used wherever a Sample is (see is_sample); setting an attribute, e.g. the subtitle, changes the table. Copying
+    it, e.g. when an action is recorded, gives a Sample with the current values.
+    """
+    __slots__ = ("_table", "_index")
+
+    title = _row_attribute("title")
+    subtitle = _row_attribute("subtitle")
+    translation = _row_attribute("translation")
+    height2_offset = _row_attribute("height2_offset")
+    phi_offset = _row_attribute("phi_offset")
+    psi_offset = _row_attribute("psi_offset")
+    height_offset = _row_attribute("height_offset")
+    resolution = _row_attribute("resolution")
+    footprint = _row_attribute("footprint")
+    sample_length = _row_attribute("sample_length")
+    valve = _row_attribute("valve")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def hgaps(self):
+        """
+        Returns: dictionary of the horizontal gaps set for the sample
+        """
+        row = self._table.array[self._index]
+        return {gap: float(row[gap]) for gap in self._table.gaps if not np.isnan(row[gap])}
+
+    @hgaps.setter
+    def hgaps(self, hgaps):
+        hgaps = {gap.upper(): value for gap, value in hgaps.items()}
+        unknown = set(hgaps) - set(self._table.gaps)
+        if unknown:
+            raise KeyError("Sample table has no column for gaps {}".format(sorted(unknown)))
+        for gap in self._table.gaps:
+            self._table.array[gap][self._index] = hgaps.get(gap, np.nan)
+
+    def as_dict(self):
+        """
+        Returns: dictionary of the sample's values, as the attributes of a Sample
+        """
+        values = {field: getattr(self, field) for field in SAMPLE_FIELDS}
+        values["hgaps"] = self.hgaps
+        return values
+
+    def to_sample(self):
+        """
+        Returns: Sample with the current values of the row
+        """
+        return Sample(**self.as_dict())
+
+    def __deepcopy__(self, memo):
+        return self.to_sample()
+
+    def __reduce__(self):
+        return self.to_sample().__reduce__()
+
+    def __repr__(self):
+        return "Sample: {}".format(self.as_dict())
+
+
+def is_sample(value):
+    """
+    Returns: True if the value is a Sample or a row of a SampleTable
+    """
+    return isinstance(value, (Sample, SampleRow))
+
+
+def _table_column(field):
+    """
+    Returns: property of a sample table giving one of its columns as an array, which can be written to
+    """
+    return property(lambda table: table.array[field], doc="{} of every sample".format(field))
+
+
+class SampleTable(object):
+    """
+    Samples held as the rows of a structured array, e.g. the cells of a sample changer. Indexing gives a SampleRow
+    which can be passed to the script actions; the numeric columns, e.g. table.footprint, can be passed to the slit
+    and motion calculations to work out every sample at once:
+        >>> calculate_slit_gaps(0.7, table.footprint, table.resolution, constants)
+        >>> _Movement(True).sample_setpoints(table, 0.7, constants, "SOLID")
+    Horizontal gaps which are not set for a sample are nan.
+    """
+    translation = _table_column("translation")
+    height2_offset = _table_column("height2_offset")
+    phi_offset = _table_column("phi_offset")
+    psi_offset = _table_column("psi_offset")
+    height_offset = _table_column("height_offset")
+    resolution = _table_column("resolution")
+    footprint = _table_column("footprint")
+    sample_length = _table_column("sample_length")
+    valve = _table_column("valve")
+
+    def __init__(self, size=0, gaps=DEFAULT_GAPS, array=None):
+        """
+        Initialiser.
+        Args:
+            size: number of samples
+            gaps: names of the horizontal gaps with a column in the table
+            array: structured array of the samples, as SampleTable.array; None for size empty samples
+        """
+        self.gaps = tuple(gap.upper() for gap in gaps)
+        if array is None:
+            array = np.zeros(size, dtype=_table_dtype(self.gaps))
+            array["title"] = ""
+            array["subtitle"] = ""
+            for gap in self.gaps:
+                array[gap] = np.nan
+        self.array = array
+
+    @classmethod
+    def from_samples(cls, samples, gaps=None):
+        """
+        Create a table from samples
+        Args:
+            samples: samples or sample generators to copy
+            gaps: names of the horizontal gaps; None for all the gaps set in the samples
+        Returns: sample table
+        """
+        samples = list(samples)
+        if gaps is None:
+            gaps = sorted({gap.upper() for sample in samples for gap in sample.hgaps})
+        table = cls(len(samples), gaps)
+        for index, sample in enumerate(samples):
+            table[index] = sample
+        return table
+
+    @classmethod
+    def load_csv(cls, path, defaults=None, gaps=None):
+        """
+        Load samples from a csv file with a header row naming its columns, e.g. title,translation,valve,S1HG. Columns
+        may be any of the Sample attributes and horizontal gaps; empty cells and missing columns take their values
+        from the defaults.
+        Args:
+            path: path of the csv file
+            defaults: SampleGenerator giving the values not in the file; None for 0 and no gaps
+            gaps: names of the horizontal gaps; None for the gaps in the file and the defaults
+        Returns: sample table
+        """
+        with open(path, newline="") as csv_file:
+            reader = csv.DictReader(line for line in csv_file if not line.startswith("#"))
+            columns = [name.strip() for name in reader.fieldnames]
+            # short rows have None for their missing cells
+            rows = [[(row[name] or "").strip() for name in reader.fieldnames] for row in reader]
+        default_gaps = {} if defaults is None else {gap.upper(): value for gap, value in defaults.hgaps.items()}
+        file_gaps = [name.upper() for name in columns if name not in SAMPLE_FIELDS]
+        if gaps is None:
+            gaps = list(dict.fromkeys(file_gaps + list(default_gaps)))
+        unknown = set(file_gaps) - set(gaps)
+        if unknown:
+            raise ValueError("Sample file {} has unknown columns {}".format(path, sorted(unknown)))
+        table = cls(len(rows), gaps)
+        for field in SAMPLE_FIELDS:
+            if defaults is not None:
+                table.array[field] = getattr(defaults, field)
+        for gap, value in default_gaps.items():
+            if gap in table.gaps:
+                table.array[gap] = value
+        for name, cells in zip(columns, zip(*rows)):
+            field = name if name in SAMPLE_FIELDS else name.upper()
+            filled = np.array([cell != "" for cell in cells])
+            values = np.array(cells, dtype=object)[filled]
+            table.array[field][filled] = values if field in ("title", "subtitle") else values.astype(
+                table.array.dtype[field])
+        return table
+
+    @property
+    def titles(self):
+        """
+        Returns: array of the sample titles
+        """
+        return self.array["title"]
+
+    @property
+    def subtitles(self):
+        """
+        Returns: array of the sample subtitles
+        """
+        return self.array["subtitle"]
+
+    def gap(self, name):
+        """
+        Returns: column of a horizontal gap; nan where it is not set
+        """
+        return self.array[name.upper()]
+
+    def with_subtitles(self, subtitles):
+        """
+        Returns: a new table with every sample repeated once for each subtitle, e.g. for the contrasts or time slices
+            of a kinetics run
+        """
+        array = np.repeat(self.array, len(subtitles))
+        array["subtitle"] = np.tile(np.array(subtitles, dtype=object), len(self.array))
+        return SampleTable(gaps=self.gaps, array=array)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        """
+        Returns: SampleRow for an integer index, which changes this table when it is changed; a new table of copies of
+            the selected samples for a slice, mask or list of indices, which does not
+        """
+        if isinstance(index, (int, np.integer)):
+            return SampleRow(self, range(len(self.array))[index])
+        return SampleTable(gaps=self.gaps, array=self.array[index].copy())
+
+    def __setitem__(self, index, sample):
+        """
+        Set the values of a sample in the table from a Sample or SampleGenerator
+        """
+        row = self[index]
+        for field in SAMPLE_FIELDS:
+            setattr(row, field, getattr(sample, field))
+        row.hgaps = sample.hgaps
+
+    def __iter__(self):
+        return (SampleRow(self, index) for index in range(len(self.array)))
+
+    def __repr__(self):
+        return "Sample table: {} samples, gaps {}".format(len(self.array), self.gaps)
@@ -0,0 +1,404 @@
+"""
+Reorder the actions of a compiled plan to reduce the time spent moving between samples and angles, and to measure
+other samples while a cell is being pumped
+"""
+from itertools import combinations
+
+from action_plan import CALL, MEASURE, PUMP_ACTIONS, estimate_plan
+from script_actions import count_minutes
+from motion_model import MotionModel, DEFAULT_PROFILE
+
+# Above this many actions the order is found by nearest neighbour and 2-opt rather than exactly
+EXACT_LIMIT = 12
+
+
+class OrderProposal(object):
+    """
+    A new order for the actions of a plan and the estimated time it saves. Nothing is changed until it is applied.
+    """
+    def __init__(self, order, original_seconds, optimised_seconds):
+        """
+        Initialiser.
+        Args:
+            order: indices of the actions of the plan in their new order
+            original_seconds: estimated motion time of the plan in its original order
+            optimised_seconds: estimated motion time in the new order
+        """
+        self.order = tuple(order)
+        self.original_seconds = original_seconds
+        self.optimised_seconds = optimised_seconds
+
+    @property
+    def saved_seconds(self):
+        """
+        Returns: estimated motion time saved by the new order in seconds
+        """
+        return self.original_seconds - self.optimised_seconds
+
+    def apply(self, plan):
+        """
+        Args:
+            plan: the plan or compiled plan the order was proposed for
+        Returns: the plan with its actions in the new order
+        """
+        return plan._replace(actions=tuple(plan.actions[index] for index in self.order))
+
+    def report(self):
+        """
+        Print the estimated time saved
+        """
+        print("Motion time {:.1f} min in script order, {:.1f} min reordered: saves {:.1f} min".format(
+            self.original_seconds / 60, self.optimised_seconds / 60, self.saved_seconds / 60))
+
+    def __repr__(self):
+        return "Order proposal: order={}, saved={:.0f}s".format(self.order, self.saved_seconds)
+
+
+def propose_order(compiled_plan, motion_model=None, constraints=(), exact_limit=EXACT_LIMIT, max_passes=10):
+    """
+    Find an order of the actions in a compiled plan which reduces the total motion time. Measurements on a sample are
+    kept on the same side of any contrast change on its valve; actions that are not measurements or contrast changes,
+    and actions that change mode, keep their place relative to everything else.
+    Args:
+        compiled_plan: compiled plan to reorder
+        motion_model: model of the axis motion starting from the current positions; None for the default profile
+        constraints: extra (before, after) pairs of action indices which must stay in that order
+        exact_limit: find the best order exactly if the plan has at most this many actions
+        max_passes: maximum number of 2-opt improvement passes over the order
+    Returns: OrderProposal, the plan is not changed
+    """
+    if motion_model is None:
+        motion_model = MotionModel.from_profile(DEFAULT_PROFILE)
+    actions = compiled_plan.actions
+    predecessors = precedence(compiled_plan, constraints)
+    costs = _Costs(actions, motion_model)
+
+    if len(actions) <= exact_limit:
+        order = _exact_order(predecessors, costs)
+    else:
+        order = _two_opt(_nearest_neighbour_order(predecessors, costs), predecessors, costs, max_passes)
+
+    original = plan_motion_seconds(compiled_plan, motion_model)
+    optimised = plan_motion_seconds(compiled_plan._replace(actions=tuple(actions[i] for i in order)), motion_model)
+    if optimised >= original:
+        order, optimised = list(range(len(actions))), original
+    return OrderProposal(order, original, optimised)
+
+
+def plan_motion_seconds(compiled_plan, motion_model):
+    """
+    Returns: estimated motion time of a compiled plan in seconds, starting from the positions of the model
+    """
+    return sum(motion for _, motion in estimate_plan(compiled_plan, motion_model.copy())) * 60
+
+
+def precedence(compiled_plan, constraints=()):
+    """
+    Work out which actions must come before which.
+    Args:
+        compiled_plan: compiled plan
+        constraints: extra (before, after) pairs of action indices
+    Returns: list, for each action, of the set of actions that must come before it
+    """
+    actions = compiled_plan.actions
+    predecessors = [set() for _ in actions]
+    for before, after in combinations(range(len(actions)), 2):
+        if _must_keep_order(actions[before], actions[after]):
+            predecessors[after].add(before)
+    for before, after in constraints:
+        predecessors[after].add(before)
+    return predecessors
+
+
+def _must_keep_order(first, second):
+    """
+    Returns: True if the first action must stay before the second
+    """
+    if _is_barrier(first) or _is_barrier(second):
+        return True
+    first_is_valve_action = first.action.name in PUMP_ACTIONS
+    second_is_valve_action = second.action.name in PUMP_ACTIONS
+    if first_is_valve_action and second_is_valve_action:
+        # the pump does one contrast change at a time
+        return True
+    if first_is_valve_action or second_is_valve_action:
+        return _valve(first) == _valve(second)
+    return False
+
+
+def _is_barrier(compiled):
+    """
+    Returns: True if the action must keep its place relative to all others
+    """
+    if compiled.kind == CALL:
+        return compiled.action.name not in PUMP_ACTIONS
+    return compiled.action.get("mode") is not None
+
+
+def _valve(compiled):
+    sample = compiled.action.sample
+    return getattr(sample, "valve", None)
+
+
+class _Costs(object):
+    """
+    Motion time between the actions of a plan. Actions which do not move are passed through, so the cost of moving to
+    a measurement is from the state after the last measurement before it.
+    """
+    START = -1
+
+    def __init__(self, actions, motion_model):
+        self.moves = [action.kind == MEASURE for action in actions]
+        self._model = motion_model
+        self._setpoints = [dict(action.setpoints) for action in actions]
+        self._after = []
+        for action, setpoints in zip(actions, self._setpoints):
+            state = dict(setpoints)
+            state.update(action.reset or ())
+            self._after.append(state)
+        self._cache = {}
+
+    def cost(self, previous, action):
+        """
+        Args:
+            previous: index of the last measurement; START for the start of the plan
+            action: index of the next action
+        Returns: time to move to the action in seconds
+        """
+        if not self.moves[action]:
+            return 0.0
+        key = (previous, action)
+        if key not in self._cache:
+            start = self._model.positions if previous == self.START else self._after[previous]
+            self._cache[key] = self._model.transition_time(start, self._setpoints[action])
+        return self._cache[key]
+
+    def last(self, previous, action):
+        """
+        Returns: index of the last measurement after doing action
+        """
+        return action if self.moves[action] else previous
+
+
+def _nearest_neighbour_order(predecessors, costs):
+    """
+    Build an order by always doing the action that is quickest to move to next of those whose predecessors are done
+    """
+    remaining = set(range(len(predecessors)))
+    done = set()
+    order = []
+    last = _Costs.START
+    while remaining:
+        available = [action for action in remaining if predecessors[action] <= done]
+        action = min(available, key=lambda candidate: (costs.cost(last, candidate), candidate))
+        order.append(action)
+        done.add(action)
+        remaining.remove(action)
+        last = costs.last(last, action)
+    return order
+
+
+def _two_opt(order, predecessors, costs, max_passes):
+    """
+    Improve an order by reversing sections of it, keeping only reversals that respect the precedence and reduce the
+    motion time. The change in time of a reversal is found incrementally as the section is extended.
+    """
+    size = len(order)
+    for _ in range(max_passes):
+        improved = False
+        for start in range(size - 1):
+            before, after = _last_measurements_before(order, costs), _next_measurements_after(order, costs)
+            previous = before[start]
+            section = set()
+            first = last = None
+            forward = backward = 0.0
+            best = (0.0, None)
+            for end in range(start, size):
+                action = order[end]
+                if predecessors[action] & section:
+                    break
+                section.add(action)
+                if costs.moves[action]:
+                    if last is not None:
+                        forward += costs.cost(last, action)
+                        backward += costs.cost(action, last)
+                    first = action if first is None else first
+                    last = action
+                if first is None or first == last:
+                    continue
+                following = after[end]
+                old = costs.cost(previous, first) + forward
+                new = costs.cost(previous, last) + backward
+                if following is not None:
+                    old += costs.cost(last, following)
+                    new += costs.cost(first, following)
+                if new - old < best[0] - 1e-9:
+                    best = (new - old, end)
+            if best[1] is not None:
+                order[start:best[1] + 1] = reversed(order[start:best[1] + 1])
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def _last_measurements_before(order, costs):
+    """
+    Returns: for each position in the order, the last measurement before it; START if none
+    """
+    before = []
+    last = _Costs.START
+    for action in order:
+        before.append(last)
+        last = costs.last(last, action)
+    return before
+
+
+def _next_measurements_after(order, costs):
+    """
+    Returns: for each position in the order, the next measurement after it; None if none
+    """
+    after = [None] * len(order)
+    following = None
+    for position in range(len(order) - 1, -1, -1):
+        after[position] = following
+        if costs.moves[order[position]]:
+            following = order[position]
+    return after
+
+
+def _exact_order(predecessors, costs):
+    """
+    Find the order with the least motion time by dynamic programming over the sets of actions done
+    """
+    size = len(predecessors)
+    predecessor_masks = [sum(1 << before for before in predecessors[action]) for action in range(size)]
+    # (done mask, last measurement) -> (time, order)
+    states = {(0, _Costs.START): (0.0, [])}
+    for _ in range(size):
+        next_states = {}
+        for (done, last), (time, order) in states.items():
+            for action in range(size):
+                if done & (1 << action) or predecessor_masks[action] & ~done:
+                    continue
+                key = (done | (1 << action), costs.last(last, action))
+                candidate = time + costs.cost(last, action)
+                if key not in next_states or candidate < next_states[key][0]:
+                    next_states[key] = (candidate, order + [action])
+        states = next_states
+    return min(states.values(), key=lambda state: state[0])[1]
+
+
+class ResourceSchedule(object):
+    """
+    Order of a plan's actions with the beamline, the HPLC pump and the cell on each valve treated as separate
+    resources, so that pumping one cell overlaps with measuring the others.
+    """
+    def __init__(self, order, timeline, serial_seconds):
+        """
+        Initialiser.
+        Args:
+            order: indices of the actions in the order to run them
+            timeline: list of (action index, resource, start seconds, end seconds) in order
+            serial_seconds: estimated time if every contrast change is waited for before moving on
+        """
+        self.order = tuple(order)
+        self.timeline = timeline
+        self.serial_seconds = serial_seconds
+
+    @property
+    def total_seconds(self):
+        """
+        Returns: estimated time until the last action, including pumping, has finished
+        """
+        return max((end for _, _, _, end in self.timeline), default=0.0)
+
+    def apply(self, plan):
+        """
+        Args:
+            plan: the plan or compiled plan the schedule was made for
+        Returns: the plan with its actions in the scheduled order; run it with PlanExecutor(overlap_pumps=True)
+        """
+        return plan._replace(actions=tuple(plan.actions[index] for index in self.order))
+
+    def report(self):
+        """
+        Print the estimated time with and without overlapping the pumping
+        """
+        print("Estimated time {:.1f} min waiting for each pump, {:.1f} min overlapping pumping with "
+              "measurements".format(self.serial_seconds / 60, self.total_seconds / 60))
+
+    def __repr__(self):
+        return "Resource schedule: order={}, total={:.0f}s".format(self.order, self.total_seconds)
+
+
+def schedule_resources(compiled_plan, motion_model=None, constraints=()):
+    """
+    Order a compiled plan so that the beamline is kept busy while cells are pumped. Each step runs the action that can
+    start soonest: a measurement waits for the cell on its valve to finish being pumped, a contrast change waits for
+    the pump and anything else waits for everything. Ties are broken by the least motion.
+    Args:
+        compiled_plan: compiled plan to schedule
+        motion_model: model of the axis motion starting from the current positions; None for the default profile
+        constraints: extra (before, after) pairs of action indices which must stay in that order
+    Returns: ResourceSchedule, the plan is not changed
+    """
+    if motion_model is None:
+        motion_model = MotionModel.from_profile(DEFAULT_PROFILE)
+    actions = compiled_plan.actions
+    predecessors = precedence(compiled_plan, constraints)
+    costs = _Costs(actions, motion_model)
+
+    beamline = pump = 0.0
+    cells = {}
+    remaining, done = set(range(len(actions))), set()
+    order, timeline = [], []
+    last = _Costs.START
+    serial = 0.0
+    while remaining:
+        def _start(candidate):
+            compiled = actions[candidate]
+            if compiled.kind == MEASURE:
+                return max(beamline, cells.get(_valve(compiled), 0.0))
+            if compiled.action.name in PUMP_ACTIONS:
+                return max(beamline, pump)
+            return max([beamline, pump] + list(cells.values()))
+
+        available = [action for action in remaining if predecessors[action] <= done]
+        action = min(available, key=lambda candidate: (_start(candidate), costs.cost(last, candidate), candidate))
+        compiled = actions[action]
+        start = _start(action)
+        if compiled.kind == MEASURE:
+            duration = costs.cost(last, action) + count_minutes(*compiled.count) * 60
+            beamline = start + duration
+            timeline.append((action, "beamline", start, beamline))
+            serial += duration
+        elif compiled.action.name in PUMP_ACTIONS:
+            duration = _pump_seconds(compiled)
+            pump = start + duration
+            if compiled.action.get("wait"):
+                cells[_valve(compiled)] = pump
+                serial += duration
+            beamline = start
+            timeline.append((action, "pump", start, pump))
+        else:
+            duration = (compiled.action.func(**dict(compiled.action.params), dry_run=True) or 0) * 60
+            beamline = pump = start + duration
+            cells = {}
+            timeline.append((action, "beamline", start, beamline))
+            serial += duration
+        order.append(action)
+        done.add(action)
+        remaining.remove(action)
+        last = costs.last(last, action)
+    return ResourceSchedule(order, timeline, serial)
+
+
+def _pump_seconds(compiled):
+    """
+    Returns: time a contrast change runs the pump for in seconds
+    """
+    params = dict(compiled.action.params)
+    if params.get("volume") is not None:
+        return params["volume"] / params.get("flow", 1) * 60
+    return params.get("seconds") or 0.0
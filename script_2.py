@@ -3,9 +3,11 @@
 # ## Enjoy and use at your own risk.
 
 from datetime import datetime
-from script_actions import ScriptActions, DryRun
+from script_actions import ScriptActions
+from dry_run_session import DryRunSession
 from sample import SampleGenerator
 from contrast_change import *
+from setpoint_cache import setpoint_cache
 
 import sys
 import os
@@ -26,8 +28,20 @@ transmission = ScriptActions.transmission
 
 
 def runscript(dry_run=False):
+    """
+    Run the script, or with dry_run estimate it in a session of its own so each call starts a new estimate
+    Returns: the dry run session
+    """
+    with DryRunSession(dry_run=dry_run) as session:
+        _run(session)
+    return session
+
+
+def _run(session):
     now = datetime.now()
-    DryRun.dry_run = dry_run
+    dry_run = session.dry_run
+    setpoint_cache.invalidate()
+    setpoint_cache.reset_counts()
 
     sample_generator = SampleGenerator(
         translation=400.0,
@@ -100,7 +114,18 @@ def runscript(dry_run=False):
     transmission(sample_3, "Si3-unmarked", at_angle=0.7, count_uamps=20, hgaps={'S1HG': 10, 'S2HG': 6})
     transmission(sample_3, "Si3-unmarked", at_angle=0.7, count_uamps=20, hgaps={'S1HG': 50, 'S2HG': 30})
 
-    print("=== Total time: ", str(int(DryRun.run_time / 60)) + "h " + str(int(DryRun.run_time % 60)) + "min ===")
+    if dry_run:
+        session.report.flush()
+        print(session.report.gantt())
+    print("=== Total time: ", str(int(session.run_time / 60)) + "h " + str(int(session.run_time % 60)) + "min ===")
+    if dry_run:
+        print("=== of which motion: ", str(int(session.motion_time / 60)) + "h " + str(int(session.motion_time % 60)) +
+              "min ===")
+        p90_time = session.run_time + session.p90_margin
+        print("=== P90 total time: ", str(int(p90_time / 60)) + "h " + str(int(p90_time % 60)) + "min (" +
+              repr(session.beam_model) + ") ===")
+    if not dry_run:
+        setpoint_cache.report()
 
 
 # runscript()
@@ -2,7 +2,7 @@ from contextlib2 import contextmanager
 
 from future.moves import itertools
 from math import tan, radians, sin
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from six.moves import input
 
@@ -13,45 +13,43 @@ except ImportError:
     from mocks import g
 
 # import general.utilities.io
-from sample import Sample
+from sample import is_sample
 from NR_motion import _Movement
 from instrument_constants import get_instrument_constants
+from slit_calc import FIXED
+from beam_current import P90
+from dry_run_session import current_session
 
+# Axes whose value before a transmission is put back afterwards, see reset_hgaps_and_sample_height_new
+TRANSMISSION_RESTORE_AXES = ("S1HC", "S2HC", "S3HC", "S1HG", "S2HG", "S3HG")
+
+# Seconds the DAE takes to set the number of periods, begin and end a run, added to the dry run of every action which
+# counts, and to move to the next period of a kinetics run
+RUN_OVERHEAD_SECONDS = 15.0
+PERIOD_CHANGE_SECONDS = 0.5
 
-class DryRun:
-    dry_run = False
-    counter = 0
-    run_time = 0
 
+class DryRun:
     def __init__(self, f):
         self.f = f
 
     def __call__(self, *args, **kwargs):
-        if self.__class__.dry_run:
-            DryRun.counter += 1
-
-            DryRun.run_time += self.f(*args, **kwargs, dry_run=True)
-            hours = str(int(DryRun.run_time / 60)).zfill(2)
-            minutes = str(int(DryRun.run_time % 60)).zfill(2)
-            tit = args[0].title if isinstance(args[0], Sample) else ""
-            if self.counter <=1:
-                columns = ["No", "Action", "Title", "Parameters", "Duration"]
-                print(f"{columns[0]:^11}|{columns[1]:^17}|{columns[2]:^52}|{columns[3]:^19}|{columns[4]:^16}")
-                now = datetime.now()
-            if tit != "":
-                # print(f'{DryRun.counter:02}', "Dry run: ",
-                #       self.f.__name__, tit, args[1:], "-->|", hours + ":" + minutes, " hh:mm")
-                arg = str(args[1:])
-                print(f"{DryRun.counter:02} Dry run: {str(self.f.__name__)[:15]:17} "
-                      f"{tit[:50]:52} {arg[:15]:17} -->| {hours:2}:{minutes:2}  hh:mm")
-            else:
-                # print(f'{DryRun.counter:02}', "Dry run: ",
-                #       self.f.__name__, kwargs, "-->|", hours + ":" + minutes, "hh:mm")
-                print(f"{DryRun.counter:02} Dry run: {self.f.__name__} {kwargs[50]:52} "
-                      f"-->| {hours:2}:{minutes:2} hh:mm")
+        session = current_session()
+        if session.recorder is not None:
+            session.recorder.record(self.f, args, kwargs)
+        elif session.dry_run:
+            session.counter += 1
+
+            minutes = self.f(*args, **kwargs, dry_run=True)
+            session.run_time += minutes
+            sample = args[0] if args and is_sample(args[0]) else None
+            parameters = args[1:] if sample is not None else args
+            parameters = ", ".join([str(arg) for arg in parameters] +
+                                   ["{}={}".format(key, value) for key, value in kwargs.items()])
+            session.report.add(self.f.__name__, sample.title if sample is not None else "", parameters, minutes)
         else:
             print("Running for real...")
-            self.f(*args, **kwargs)
+            return self.f(*args, **kwargs)
 
 
 class ScriptActions:
@@ -59,7 +57,8 @@ class ScriptActions:
     def run_angle(sample, angle: float, count_uamps: float = None, count_seconds: float = None,
                   count_frames: float = None, vgaps: dict = None, hgaps: dict = None, mode: str = None,
                   dry_run: bool = False, include_gaps_in_title: bool = False, osc_slit: bool = False,
-                  osc_block: str = 'S2HG', osc_gap: float = None):
+                  osc_block: str = 'S2HG', osc_gap: float = None, gap_mode: str = FIXED, count_target=None,
+                  reduction=None):
         """
         Move to a given theta and smangle with slits set. If a current, time or frame count are given then take a
         measurement.
@@ -79,6 +78,11 @@ class ScriptActions:
             osc_slit: whether slit oscillates during measurement; only osc if osc_gap < total gap extent setting.
             osc_block: block to oscillate
             osc_gap: gap of slit during oscillation. If None then takes defaults (see osc_slit_setup)
+            gap_mode: how vertical gaps not in vgaps are calculated; "fixed" to fill the footprint and resolution
+                exactly, "flux" for the gaps within them which give the most flux
+            count_target: statistics_count.StatisticsTarget to count to instead of uamps, seconds or frames; the
+                statistics reached are added to the title
+            reduction: live_reduction.LiveReduction to update with the reflectivity while counting; None for none
         TODO: this set of examples needs updating.
         Examples:
             The simplest scan is:
@@ -95,18 +99,22 @@ class ScriptActions:
             back to 0. No count was specified so in this case the beamline is moved to the position and left there; no
             data is captured.
 
+            >>> run_angle(my_sample, 0.7, count_uamps=20, gap_mode="flux")
+            Here slits 1 and 2 are opened as far as the resolution and footprint of my_sample allow, for the most flux.
+
+            >>> run_angle(my_sample, 2.3, count_target=StatisticsTarget(relative_error=0.01, window=(0.05, 0.2),
+            ...                                                              units="q", max_seconds=7200))
+            This counts until the detector counts between Q of 0.05 and 0.2 have a relative error of 1%, or for two
+            hours.
+
             >>> run_angle(my_sample, 0.0, dry_run=True)
             In this run, dry_run is set to True so nothing will actually happen, it will only print the settings that would
             be used for the run to the screen.
         """
 
         if dry_run:
-            if count_uamps:
-                return count_uamps / 40 * 60  # value for TS2, needs instrument check
-            elif count_seconds:
-                return count_seconds / 60
-            elif count_frames:
-                return count_frames / 36000
+            return _dry_run_count_minutes(count_uamps, count_seconds, count_frames, count_target) + \
+                _motion_minutes(sample, angle, mode, vgaps, hgaps, gap_mode=gap_mode)
         else:
             print("** Run angle {} **".format(sample.title))
 
@@ -118,19 +126,20 @@ class ScriptActions:
             if hgaps is None:
                 hgaps = sample.hgaps
             movement.set_axis_dict(hgaps)
-            movement.set_slit_vgaps(angle, constants, vgaps, sample)
+            movement.set_slit_vgaps(angle, constants, vgaps, sample, gap_mode)
             movement.wait_for_move()
             movement.update_title(sample.title, sample.subtitle, angle, add_current_gaps=include_gaps_in_title)
 
             movement.start_measurement(count_uamps, count_seconds, count_frames, osc_slit, osc_block, osc_gap, vgaps,
-                                       hgaps)
+                                       hgaps, count_target=count_target, reduction=reduction)
 
     @DryRun
     def run_angle_SM(sample, angle, count_uamps=None, count_seconds=None, count_frames=None, vgaps: dict = None,
                      hgaps: dict = None, smangle=0.0, mode=None, do_auto_height=False, laser_offset_block="b.KEYENCE",
                      fine_height_block="HEIGHT", auto_height_target=0.0, continue_on_error=False, dry_run=False,
                      include_gaps_in_title=False,
-                     smblock='SM2', osc_slit: bool = False, osc_block: str = 'S2HG', osc_gap: float = None):
+                     smblock='SM2', osc_slit: bool = False, osc_block: str = 'S2HG', osc_gap: float = None,
+                     count_target=None, reduction=None):
         """
         Move to a given theta and smangle with slits set. If a current, time or frame count are given then take a
         measurement.
@@ -160,6 +169,8 @@ class ScriptActions:
             osc_slit: whether slit oscillates during measurement; only osc if osc_gap < total gap extent setting.
             osc_block: block to oscillate
             osc_gap: gap of slit during oscillation. If None then takes defaults (see osc_slit_setup)
+            count_target: statistics_count.StatisticsTarget to count to instead of uamps, seconds or frames
+            reduction: live_reduction.LiveReduction to update with the reflectivity while counting; None for none
         Examples:
             The simplest scan is:
             >>> my_sample = Sample("My title", "my subtitle", 0, 0, 0, 0, 0, 0.6, 3.0)
@@ -180,6 +191,9 @@ class ScriptActions:
             In this run, dry_run is set to True so nothing will actually happen, it will only print the settings that would
             be used for the run to the screen.
         """
+        if dry_run:
+            return _dry_run_count_minutes(count_uamps, count_seconds, count_frames, count_target) + \
+                _motion_minutes(sample, angle, mode, vgaps, hgaps, smangle=smangle, smblock=smblock)
 
         print("** Run angle {} **".format(sample.title))
 
@@ -202,7 +216,57 @@ class ScriptActions:
         movement.update_title(sample.title, sample.subtitle, angle, smang_out, smblock_out,
                               add_current_gaps=include_gaps_in_title)
 
-        movement.start_measurement(count_uamps, count_seconds, count_frames, osc_slit, osc_block, osc_gap, vgaps, hgaps)
+        movement.start_measurement(count_uamps, count_seconds, count_frames, osc_slit, osc_block, osc_gap, vgaps, hgaps,
+                                   count_target=count_target, reduction=reduction)
+
+    @DryRun
+    def run_kinetics(sample, angle: float, slice_seconds: float, slices: int, vgaps: dict = None, hgaps: dict = None,
+                     smangle: float = 0.0, smblock: str = 'SM2', mode: str = None, on_start=None, advance_when=None,
+                     poll: float = 0.5, log_path: str = None, dry_run: bool = False):
+        """
+        Move to a given theta and smangle with slits set, then count a single run split into software periods of
+        slice_seconds each, for fast kinetics without the begin/end overhead of a run per slice.
+
+        Args:
+            sample (techniques.reflectometry.sample.Sample): The sample to measure
+            angle: The angle to measure at, theta and in liquid mode also the sm angle
+            slice_seconds: time to count in each period
+            slices: number of periods
+            vgaps: vertical gaps to be set; Where not defined uses sample footprint and resolution
+            hgaps: horizontal gaps to be set; Where not defined gap is unchanged
+            smangle: super mirror angle, place in the beam, if set to 0 remove from the beam; None don't move super mirror
+            smblock: prefix of supermirror block to be used
+            mode: mode to run in; None don't change modes
+            on_start: function called once the run has begun, e.g. to start an injection
+            advance_when: function returning True to move to the next period before slice_seconds are up, e.g. when
+                an injection finishes; only a change from False to True advances
+            poll: seconds between checks of the time and advance_when
+            log_path: csv file to append the period log (period, seconds since begin, uamps) to
+            dry_run: If True just print what would happen; If False, run the experiment
+        Examples:
+            >>> run_kinetics(my_sample, 0.7, 5, 120, on_start=lambda: inject(my_sample, "SYRINGE_1", volume=2))
+            Measures at 0.7 in one run of 120 periods of 5 seconds, starting the injection once the run has begun.
+        """
+        if dry_run:
+            return _dry_run_count_minutes(None, slices * slice_seconds, None, periods=slices) + \
+                _motion_minutes(sample, angle, mode, vgaps, hgaps, smangle=smangle, smblock=smblock)
+
+        print("** Kinetics {} **".format(sample.title))
+
+        movement = _Movement(dry_run)
+
+        constants, mode_out = movement.setup_measurement(mode, periods=slices)
+        smblock_out, smang_out = movement.sample_setup(sample, angle, constants, mode_out, smang=smangle,
+                                                       smblock=smblock)
+        if hgaps is None:
+            hgaps = sample.hgaps
+        movement.set_axis_dict(hgaps)
+        movement.set_slit_vgaps(angle, constants, vgaps, sample)
+        movement.wait_for_move()
+
+        subtitle = "{} kinetics {}x{}s".format(sample.subtitle, slices, slice_seconds)
+        movement.update_title(sample.title, subtitle, angle, smang_out, smblock_out)
+        return movement.count_periods(slice_seconds, slices, on_start, advance_when, poll, log_path)
 
     # TODO: Do we want to change the order of the arguments here?
     @DryRun
@@ -242,19 +306,16 @@ class ScriptActions:
             The system will be record at least 1 frame of data.
         """
         if dry_run:
-            if count_uamps:
-                return count_uamps / 40 * 60  # value for TS2, needs instrument check
-            elif count_seconds:
-                return count_seconds / 60
-            elif count_frames:
-                return count_frames / 36000
+            return _dry_run_count_minutes(count_uamps, count_seconds, count_frames) + \
+                _motion_minutes(sample, 0.0, mode, vgaps, hgaps, trans_offset=height_offset, slit_angle=at_angle,
+                                transmission=True)
         else:
             print("** Transmission {} **".format(title))
 
             movement = _Movement(dry_run)
             constants, mode_out = movement.setup_measurement(mode)
 
-            with _Movement.reset_hgaps_and_sample_height_new(movement, sample, constants):
+            with ScriptActions.reset_hgaps_and_sample_height_new(movement, sample, constants):
                 movement.sample_setup(sample, 0.0, constants, mode_out, height_offset)
 
                 if vgaps is None:
@@ -329,13 +390,17 @@ class ScriptActions:
             would be all set to 20. The super mirror would be moved into the beam and set to the angle 0.1. The mode will
             be changed to PNR. The system will be record at least 1 frame of data.
         """
+        if dry_run:
+            return _dry_run_count_minutes(count_uamps, count_seconds, count_frames) + \
+                _motion_minutes(sample, 0.0, mode, vgaps, hgaps, trans_offset=height_offset, smangle=smangle,
+                                smblock=smblock, slit_angle=at_angle, transmission=True)
 
         print("** Transmission {} **".format(title))
 
         movement = _Movement(dry_run)
         constants, mode_out = movement.setup_measurement(mode)
 
-        with _Movement.reset_hgaps_and_sample_height_new(movement, sample, constants):
+        with ScriptActions.reset_hgaps_and_sample_height_new(movement, sample, constants):
 
             smblock_out, smang_out = movement.sample_setup(sample, 0.0, constants, mode_out, height_offset, smangle,
                                                            smblock)
@@ -418,3 +483,73 @@ class ScriptActions:
             movement.wait_for_seconds(5)
             print("\n\n PRESS ctl + c to get the prompt back \n\n")  # This is because there is a bug in pydev
             raise  # reraise the exception so that any running script will be aborted
+
+
+def count_minutes(count_uamps, count_seconds, count_frames, count_target=None):
+    """
+    Estimated time to count for in a dry run
+    Returns: minutes to count for, the longest it can take when counting to a statistics target; 0 if not counting
+    """
+    if count_target is not None:
+        return count_target.max_seconds / 60
+    elif count_uamps:
+        return current_session().beam_model.minutes(count_uamps)
+    elif count_seconds:
+        return count_seconds / 60
+    elif count_frames:
+        return count_frames / 36000
+    return 0
+
+
+def _dry_run_count_minutes(count_uamps, count_seconds, count_frames, count_target=None, periods=1):
+    """
+    Estimated time to count for in a dry run, adding the extra time the count takes at the P90 current to
+    the session's p90_margin. Counts in uamps include scheduled beam off periods, taking the dry run to start now.
+    Args:
+        periods: number of periods the run counts, each after the first taking PERIOD_CHANGE_SECONDS to move to
+    Returns: minutes to count for, with the RUN_OVERHEAD_SECONDS of the run; 0 if not counting
+    """
+    if count_target is not None or not count_uamps:
+        minutes = count_minutes(count_uamps, count_seconds, count_frames, count_target)
+    else:
+        session = current_session()
+        start = datetime.now() + timedelta(minutes=session.run_time)
+        minutes = session.beam_model.minutes(count_uamps, start=start)
+        session.p90_margin += session.beam_model.minutes(count_uamps, P90, start) - minutes
+    if minutes == 0:
+        return 0
+    return minutes + (RUN_OVERHEAD_SECONDS + (periods - 1) * PERIOD_CHANGE_SECONDS) / 60
+
+
+def _motion_minutes(sample, angle, mode, vgaps, hgaps, trans_offset=0.0, smangle=0.0, smblock='SM2', slit_angle=None,
+                    transmission=False, gap_mode=FIXED):
+    """
+    Move the dry run motion model to the setpoints an action would set, see _Movement.action_setpoints for Args.
+    Args:
+        transmission: True to open slit 3 if not given and then move the horizontal gaps and heights back afterwards,
+            as done by reset_hgaps_and_sample_height_new
+    Returns: minutes taken by the moves; 0 if the setpoints can not be calculated
+    """
+    movement = _Movement(True)
+    session = current_session()
+    model = session.motion_model
+    try:
+        constants = get_instrument_constants()
+        mode = movement._get_block_value("MODE") if mode is None else mode
+        if transmission and "s3vg" not in {key.casefold() for key in (vgaps or {})}:
+            vgaps = dict(vgaps or {}, S3VG=constants.s3max)
+        setpoints = movement.action_setpoints(sample, angle, constants, mode, vgaps, hgaps, trans_offset, smangle,
+                                              smblock, slit_angle, gap_mode)
+    except (KeyError, ValueError) as e:
+        print("Warning: motion time not estimated: {}".format(e))
+        return 0
+    reset = {}
+    if transmission:
+        # axes the model has no position for have not been simulated, so putting them back is not a move
+        reset = {axis: model.positions[axis] for axis in TRANSMISSION_RESTORE_AXES if axis in model.positions}
+        reset["HEIGHT"] = sample.height_offset
+        if "HEIGHT2" in setpoints:
+            reset["HEIGHT2"] = sample.height2_offset
+    seconds = model.move(setpoints) + model.move(reset)
+    session.motion_time += seconds / 60
+    return seconds / 60
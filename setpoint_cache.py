@@ -0,0 +1,161 @@
+"""
+Cache of the last commanded setpoints so that axes already at their setpoint are not set again
+"""
+import threading
+import time
+
+# Change in setpoint below which a write is skipped, per axis. Axes not listed use the default tolerance.
+DEFAULT_TOLERANCES = {"THETA": 1e-4, "PHI": 1e-4, "PSI": 1e-4, "SM1ANGLE": 1e-4, "SM2ANGLE": 1e-4, "SMANGLE": 1e-4,
+                      "TRANS": 1e-3, "HEIGHT": 1e-4, "HEIGHT2": 1e-4}
+# slit gaps and centres in mm; their read backs settle a few hundredths of a mm from the setpoint
+DEFAULT_TOLERANCES.update(("S{}{}".format(slit, axis), 5e-3)
+                          for slit in ("1", "1A", "2", "3", "4") for axis in ("VG", "HG", "VC", "HC"))
+
+# Multiple of the axis tolerance a read back value may differ from the cached setpoint by, for the motor deadband
+READBACK_FACTOR = 10
+
+# Seconds after a read back agreed with the cached setpoint in which the axis is not read back again before a write
+READBACK_INTERVAL = 30.0
+
+
+class SetpointCache(object):
+    """
+    Last commanded setpoint per axis. A write is only needed if the new value differs from the cached one by more
+    than the axis tolerance. The cache must be invalidated whenever an axis may have been moved by something else,
+    e.g. a failed move, a mode change or a manual move between scripts.
+    """
+    def __init__(self, tolerances=None, default_tolerance=1e-6, readback_factor=READBACK_FACTOR,
+                 readback_interval=READBACK_INTERVAL):
+        """
+        Initialiser.
+        Args:
+            tolerances: dictionary of axis to the tolerance below which a new setpoint is a no-op
+            default_tolerance: tolerance for axes not in tolerances
+            readback_factor: multiple of the axis tolerance by which a read back value can differ from the cached
+                setpoint before the axis is assumed to have been moved externally, or to have stalled short of it
+            readback_interval: seconds after a read back agreed with the setpoint before the axis needs reading again
+        """
+        self.tolerances = dict(DEFAULT_TOLERANCES if tolerances is None else tolerances)
+        self.default_tolerance = default_tolerance
+        self.readback_factor = readback_factor
+        self.readback_interval = readback_interval
+        self.enabled = True
+        self.writes = 0
+        self.saved_writes = 0
+        self._setpoints = {}
+        self._confirmed = {}
+        self._lock = threading.Lock()
+
+    def tolerance(self, axis):
+        """
+        Returns: tolerance for the axis
+        """
+        return self.tolerances.get(axis.upper(), self.default_tolerance)
+
+    def is_unchanged(self, axis, value):
+        """
+        Check whether setting the axis to value is a no-op and count it as a saved write if it is.
+        Args:
+            axis: axis block name
+            value: new setpoint
+        Returns: True if the axis was last set to this value (within tolerance); False if a write is needed
+        """
+        with self._lock:
+            unchanged = self.enabled and self._matches(axis.upper(), value, self.tolerance(axis))
+            if unchanged:
+                self.saved_writes += 1
+            return unchanged
+
+    def record(self, axis, value):
+        """
+        Record that the axis has been set to value
+        """
+        with self._lock:
+            self.writes += 1
+            self._setpoints[axis.upper()] = value
+            self._confirmed.pop(axis.upper(), None)
+
+    def readback_tolerance(self, axis):
+        """
+        Returns: difference between the read back value and the cached setpoint of the axis above which the setpoint
+            is forgotten
+        """
+        return self.readback_factor * self.tolerance(axis)
+
+    def check_readback(self, axis, value):
+        """
+        Invalidate an axis if its read back value shows it has been moved away from the cached setpoint.
+        Args:
+            axis: axis block name
+            value: read back value
+        """
+        with self._lock:
+            axis = axis.upper()
+            if axis not in self._setpoints:
+                return
+            if self._matches(axis, value, self.readback_tolerance(axis)):
+                self._confirmed[axis] = time.monotonic()
+            else:
+                del self._setpoints[axis]
+                self._confirmed.pop(axis, None)
+
+    def cached(self, axes):
+        """
+        Returns: those of the axes which have a cached setpoint, so only their read backs need checking
+        """
+        with self._lock:
+            return [axis for axis in axes if axis.upper() in self._setpoints]
+
+    def unconfirmed(self, axes):
+        """
+        Returns: those of the axes which have a cached setpoint that no read back has agreed with in the last
+            readback_interval seconds, so need reading back before a write to them is skipped
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [axis for axis in axes if axis.upper() in self._setpoints and
+                    now - self._confirmed.get(axis.upper(), -float("inf")) > self.readback_interval]
+
+    def invalidate(self, axis=None):
+        """
+        Forget the cached setpoint so the next set is always written.
+        Args:
+            axis: axis to forget; None for all axes
+        """
+        with self._lock:
+            if axis is None:
+                self._setpoints.clear()
+                self._confirmed.clear()
+            else:
+                self._setpoints.pop(axis.upper(), None)
+                self._confirmed.pop(axis.upper(), None)
+
+    def _matches(self, axis, value, tolerance):
+        if axis not in self._setpoints:
+            return False
+        cached = self._setpoints[axis]
+        try:
+            return abs(float(value) - float(cached)) <= tolerance
+        except (TypeError, ValueError):
+            return value == cached
+
+    def reset_counts(self):
+        """
+        Reset the write counters, e.g. at the start of a script
+        """
+        with self._lock:
+            self.writes = 0
+            self.saved_writes = 0
+
+    def report(self):
+        """
+        Print the number of writes made and saved since the counts were reset
+        """
+        print("Setpoint cache: {} writes made, {} unchanged writes skipped".format(self.writes, self.saved_writes))
+
+    def __repr__(self):
+        return "Setpoint cache: writes={}, saved_writes={}, setpoints={}".format(self.writes, self.saved_writes,
+                                                                                  self._setpoints)
+
+
+setpoint_cache = SetpointCache()
@@ -0,0 +1,516 @@
+"""
+Simulated genie_python backend with a virtual clock, for fast dry runs, tests and benchmarks.
+
+Unlike the Mock in mocks, axes take time to move (using the motion model kinematics), the beam delivers current while
+the DAE is running and the HPLC pump runs for the time its volume takes. Waits move the virtual clock on instead of
+sleeping, so hours of script run in well under a second.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from motion_model import DEFAULT_PROFILE, MotionModel
+from statistics_count import tof_to_q
+
+SETUP = "SETUP"
+RUNNING = "RUNNING"
+PAUSED = "PAUSED"
+
+# run states which count
+COUNTING = (RUNNING,)
+
+# time of flight bin edges of the simulated spectra in microseconds
+TOF_EDGES = np.linspace(5000.0, 100000.0, 1001)
+TOF_CENTRES = (TOF_EDGES[:-1] + TOF_EDGES[1:]) / 2
+
+# blocks the simulation starts with besides the axes of the motion model
+DEFAULT_BLOCKS = {"MODE": "SOLID", "pump_is_on": "OFF"}
+DEFAULT_BLOCKS.update(("S{}{}".format(slit, centre), 0.0)
+                      for slit in ("1", "1A", "2", "3", "4") for centre in ("VC", "HC"))
+DEFAULT_BLOCKS.update({"S1AVG": 0.0, "S1AHG": 0.0})
+
+# what the clock was moved on for, see SimulatedGenie.events
+LATENCY = "latency"
+MOVE = "move"
+COUNT = "count"
+PUMP = "pump"
+WAIT = "wait"
+
+# HPLC pump states, as the pump_is_on block reports them
+PUMP_IDLE = "IDLE"
+PUMP_OFF = "OFF"
+
+# folder of the modules whose genie install replaces
+_PACKAGE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# (backend, genie object it replaced) of each install not yet uninstalled, innermost last
+_installed = []
+
+
+class _Move(object):
+    """
+    Axis moving from one position to another between two times on the virtual clock
+    """
+    __slots__ = ("start", "end", "start_time", "end_time")
+
+    def __init__(self, start, end, start_time, end_time):
+        self.start = start
+        self.end = end
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def position(self, now):
+        """
+        Returns: position at a time, moving linearly from start to end
+        """
+        if now >= self.end_time or self.end_time <= self.start_time:
+            return self.end
+        try:
+            return self.start + (self.end - self.start) * (now - self.start_time) / (self.end_time - self.start_time)
+        except TypeError:
+            return self.start
+
+
+class SimulatedGenie(object):
+    """
+    Stand in for genie_python. Only the calls used by the scripts are provided. Blocks without kinematics change
+    instantly; PVs are held in a dictionary. Set events to a list to record (start, end, reason) each time the clock
+    moves on, where reason is one of LATENCY, MOVE, COUNT, PUMP or WAIT.
+    """
+    __slots__ = ("clock", "blocks", "pvs", "motion", "_moves", "beam_current", "frequency", "latency", "real_latency",
+                 "runstate", "run_number", "title", "periods", "period", "_run_seconds", "_uamps", "_pump_end",
+                 "calls", "events")
+
+    def __init__(self, motion_model=None, beam_current=40.0, frequency=10.0, latency=0.0, real_latency=0.0,
+                 blocks=None, pvs=None):
+        """
+        Initialiser.
+        Args:
+            motion_model: MotionModel giving the kinematics and starting positions of the axes; None for the default
+                profile
+            beam_current: beam current in uA
+            frequency: frames per second
+            latency: virtual seconds taken by every call
+            real_latency: real seconds slept in every block and PV read, e.g. to benchmark reading PVs together
+            blocks: dictionary of other block names to value
+            pvs: dictionary of PV name to value
+        """
+        self.motion = MotionModel.from_profile(DEFAULT_PROFILE) if motion_model is None else motion_model
+        self.clock = 0.0
+        self.blocks = dict(self.motion.initial_positions)
+        self.blocks.update(DEFAULT_BLOCKS)
+        self.blocks.update(blocks or {})
+        self.pvs = dict(pvs or {})
+        self._moves = {}
+        self.beam_current = beam_current
+        self.frequency = frequency
+        self.latency = latency
+        self.real_latency = real_latency
+        self.runstate = SETUP
+        self.run_number = 1
+        self.title = ""
+        self.periods = 1
+        self.period = 1
+        self._run_seconds = 0.0
+        self._uamps = 0.0
+        self._pump_end = None
+        self.calls = 0
+        self.events = None
+
+    # clock
+
+    def _tick(self):
+        """
+        Account for a call: count it and add the latency
+        """
+        self.calls += 1
+        if self.latency:
+            self._advance(self.latency, LATENCY)
+
+    def _advance(self, seconds, reason=WAIT):
+        """
+        Move the virtual clock on, counting beam into the run if it is running
+        """
+        if seconds <= 0:
+            return
+        if self.events is not None:
+            self.events.append((self.clock, self.clock + seconds, reason))
+        if self.runstate in COUNTING:
+            self._run_seconds += seconds
+            self._uamps += self.beam_current * seconds / 3600
+        self.clock += seconds
+        if self._pump_end is not None and self.clock >= self._pump_end:
+            self.blocks["pump_is_on"] = PUMP_OFF
+            self._pump_end = None
+
+    def _advance_to(self, when, reason=WAIT):
+        self._advance(when - self.clock, reason)
+
+    # blocks
+
+    def _value(self, block):
+        move = self._moves.get(block)
+        if move is None:
+            return self.blocks[block]
+        if self.clock >= move.end_time:
+            del self._moves[block]
+            return self.blocks[block]
+        return move.position(self.clock)
+
+    def cget(self, block):
+        """
+        Returns: dictionary with the name and current value of a block; None if there is no such block
+        """
+        self._tick()
+        if self.real_latency:
+            time.sleep(self.real_latency)
+        if block not in self.blocks:
+            return None
+        return {"name": block, "value": self._value(block), "unit": "", "connected": True}
+
+    def cset(self, block=None, value=None, runcontrol=None, lowlimit=None, highlimit=None, wait=False, **kwargs):
+        """
+        Set one block, cset(block, value), or several, cset(block=value, ...). Axes in the motion model start
+        moving to the new value; everything else changes straight away.
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        setpoints = dict(kwargs)
+        if block is not None:
+            setpoints[block] = value
+        for name, setpoint in setpoints.items():
+            self._set(name, setpoint)
+        if wait:
+            self.waitfor_move(*setpoints)
+
+    def _set(self, block, value):
+        kinematics = self.motion.axes.get(block.upper())
+        if kinematics is not None and block in self.blocks:
+            start = self._value(block)
+            seconds = kinematics.move_time(start, value)
+            if seconds > 0:
+                self._moves[block] = _Move(start, value, self.clock, self.clock + seconds)
+        self.blocks[block] = value
+        if block in ("start_pump_for_volume", "start_pump_for_time") and value:
+            self._start_pump(block)
+
+    def _start_pump(self, block):
+        if block == "start_pump_for_volume":
+            seconds = self.blocks.get("pump_for_volume", 0) / self.blocks.get("hplcflow", 1) * 60
+        else:
+            seconds = self.blocks.get("pump_for_time", 0)
+        self.blocks["pump_is_on"] = PUMP_IDLE
+        self._pump_end = self.clock + seconds
+
+    def get_blocks(self):
+        """
+        Returns: names of the blocks
+        """
+        self._tick()
+        return list(self.blocks)
+
+    def waitfor_move(self, *blocks, **kwargs):
+        """
+        Wait for the given blocks, or all blocks if none are given, to stop moving
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        moves = [self._moves[block] for block in blocks if block in self._moves] if blocks else self._moves.values()
+        end = max((move.end_time for move in moves), default=self.clock)
+        self._advance_to(end, MOVE)
+        for block in [block for block, move in self._moves.items() if move.end_time <= self.clock]:
+            del self._moves[block]
+
+    def waitfor_block(self, block, value=None, lowlimit=None, highlimit=None, maxwait=None, **kwargs):
+        """
+        Wait for a block to reach a value or be within limits, or for maxwait seconds
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if block == "pump_is_on" and value == PUMP_OFF and self._pump_end is not None:
+            end = self._pump_end if maxwait is None else min(self._pump_end, self.clock + maxwait)
+            self._advance_to(end, PUMP)
+            return
+        move = self._moves.get(block)
+        if move is not None:
+            self._advance_to(move.end_time if maxwait is None else min(move.end_time, self.clock + maxwait), MOVE)
+        if not self._reached(block, value, lowlimit, highlimit):
+            if maxwait is None:
+                sys.stderr.write("Block {} will not reach {} in the simulation\n".format(block, value))
+            elif move is None:
+                self._advance(maxwait)
+
+    @staticmethod
+    def _within(value, lowlimit, highlimit):
+        try:
+            return (lowlimit is None or value >= lowlimit) and (highlimit is None or value <= highlimit)
+        except TypeError:
+            return True
+
+    def _reached(self, block, value, lowlimit, highlimit):
+        current = self.blocks.get(block)
+        return (value is None or current == value) and self._within(current, lowlimit, highlimit)
+
+    # PVs
+
+    def get_pv(self, name, is_local=False, **kwargs):
+        """
+        Returns: value of a PV; "" if it does not exist
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.real_latency:
+            time.sleep(self.real_latency)
+        return self.pvs.get(name, "")
+
+    def set_pv(self, name, value, is_local=False, **kwargs):
+        """
+        Set the value of a PV
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        self.pvs[name] = value
+
+    @staticmethod
+    def prefix_pv_name(name):
+        """
+        Returns: PV name with the simulated instrument prefix
+        """
+        return "SIM:" + name
+
+    # DAE
+
+    def begin(self, *args, **kwargs):
+        """
+        Start a run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.runstate != SETUP:
+            sys.stderr.write("Can not begin, run state is {}\n".format(self.runstate))
+            return
+        self.runstate = RUNNING
+        self._run_seconds = 0.0
+        self._uamps = 0.0
+
+    def end(self, *args, **kwargs):
+        """
+        End the run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.runstate != SETUP:
+            self.runstate = SETUP
+            self.run_number += 1
+
+    def abort(self, *args, **kwargs):
+        """
+        Abort the run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        self.runstate = SETUP
+
+    def pause(self, *args, **kwargs):
+        """
+        Pause the run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.runstate == RUNNING:
+            self.runstate = PAUSED
+
+    def resume(self, *args, **kwargs):
+        """
+        Resume a paused run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.runstate == PAUSED:
+            self.runstate = RUNNING
+
+    def get_runstate(self):
+        """
+        Returns: run state of the DAE
+        """
+        self._tick()
+        return self.runstate
+
+    def get_runnumber(self):
+        """
+        Returns: current run number as a string, as genie
+        """
+        self._tick()
+        return "{:08d}".format(self.run_number)
+
+    def change_title(self, title):
+        """
+        Set the run title
+        """
+        self._tick()
+        self.title = title
+
+    def get_title(self):
+        """
+        Returns: the run title
+        """
+        self._tick()
+        return self.title
+
+    def change_number_soft_periods(self, number, **kwargs):
+        """
+        Set the number of software periods
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        self.periods = number
+
+    def change_period(self, period):
+        """
+        Move to a period
+        """
+        self._tick()
+        if not 1 <= period <= self.periods:
+            raise ValueError("Period {} is outside 1 to {}".format(period, self.periods))
+        self.period = period
+
+    def get_period(self):
+        """
+        Returns: current period
+        """
+        self._tick()
+        return self.period
+
+    def get_uamps(self, *args, **kwargs):
+        """
+        Returns: current counted in the run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        return self._uamps
+
+    def get_frames(self, *args, **kwargs):
+        """
+        Returns: frames counted in the run
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        return int(self._run_seconds * self.frequency)
+
+    def get_time_since_begin(self, get_timedelta=False):
+        """
+        Returns: seconds the run has counted for
+        """
+        self._tick()
+        return self._run_seconds
+
+    def get_spectrum(self, spectrum, period=1, dist=False):
+        """
+        Returns: simulated counts of a spectrum. Spectrum 1 is the monitor, the others a detector seeing a
+            reflectivity falling as 1 / Q^4 from the current theta. Counts grow with the current in the run.
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        monitor = np.full(len(TOF_CENTRES), 1000.0 * self._uamps)
+        if spectrum == 1:
+            return {"time": TOF_EDGES, "signal": monitor, "sum": float(monitor.sum()), "mode": "non-distribution"}
+        q = tof_to_q(TOF_CENTRES, self.blocks.get("THETA", 0.0) or 0.0)
+        signal = monitor * np.minimum(1.0, (0.01 / np.maximum(q, 1e-6)) ** 4)
+        return {"time": TOF_EDGES, "signal": signal, "sum": float(signal.sum()), "mode": "non-distribution"}
+
+    # waits
+
+    def waitfor_time(self, seconds=None, minutes=None, hours=None, time=None, **kwargs):
+        """
+        Move the clock on by a time
+        """
+        # pylint: disable=unused-argument,redefined-outer-name
+        self._tick()
+        self._advance((seconds or 0) + 60 * (minutes or 0) + 3600 * (hours or 0),
+                      COUNT if self.runstate in COUNTING else WAIT)
+
+    def waitfor_uamps(self, uamps, **kwargs):
+        """
+        Move the clock on until the run has counted a current; returns straight away with no beam
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.runstate in COUNTING and self.beam_current > 0 and uamps > self._uamps:
+            self._advance((uamps - self._uamps) / self.beam_current * 3600, COUNT)
+
+    def waitfor_frames(self, frames, **kwargs):
+        """
+        Move the clock on until the run has counted a number of frames
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        if self.runstate in COUNTING and self.frequency > 0:
+            self._advance(frames / self.frequency - self._run_seconds, COUNT)
+
+    def check_alarms(self, *blocks):
+        """
+        Returns: lists of blocks in minor, major and invalid alarm; nothing alarms in the simulation
+        """
+        # pylint: disable=unused-argument
+        self._tick()
+        return [], [], []
+
+
+def _package_modules():
+    """
+    Returns: the modules of this package loaded so far
+    """
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path is not None and os.path.dirname(os.path.abspath(path)) == _PACKAGE_FOLDER:
+            yield module
+
+
+def install(simulated=None):
+    """
+    Use a simulated backend in place of the genie mock in the modules of this package loaded so far, e.g. before
+    running a script when genie_python is not available. Modules of other packages are left alone. Installs nest:
+    each uninstall puts back what its install replaced.
+    Args:
+        simulated: the backend to install; None for a new one
+    Returns: the simulated backend
+    """
+    import mocks
+    simulated = SimulatedGenie(pvs=mocks.PVS) if simulated is None else simulated
+    genie = mocks.g
+    for module in _package_modules():
+        if getattr(module, "g", None) is genie:
+            module.g = simulated
+    _installed.append((simulated, genie))
+    return simulated
+
+
+def uninstall():
+    """
+    Put back the genie object replaced by the last install, including in the modules of this package which have
+    imported it since
+    """
+    if not _installed:
+        return
+    simulated, genie = _installed.pop()
+    for module in _package_modules():
+        if getattr(module, "g", None) is simulated:
+            module.g = genie
+
+
+@contextmanager
+def simulated_genie(simulated=None):
+    """
+    Context manager using a simulated backend in place of the genie mock while it is entered, see install
+    Args:
+        simulated: the backend to install; None for a new one
+    Returns: the simulated backend
+    """
+    simulated = install(simulated)
+    try:
+        yield simulated
+    finally:
+        uninstall()
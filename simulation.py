@@ -0,0 +1,148 @@
+"""
+Replay a compiled plan against the simulated backend on a virtual clock, giving the timeline it would take on the
+instrument in seconds of real time
+"""
+import contextlib
+import io
+from collections import namedtuple
+
+import sim_genie
+from action_plan import PlanExecutor, estimate_plan
+from motion_model import DEFAULT_PROFILE, MotionModel
+
+
+class TimelineEntry(namedtuple("TimelineEntry", "index name label start end count move pump wait")):
+    """
+    Time taken by one action of a simulated plan; times are seconds on the virtual clock from the start of the plan
+        index: index of the action in the plan
+        name: name of the action
+        label: sample title or other description of the action
+        start: time the action started
+        end: time the action finished
+        count, move, pump, wait: seconds spent counting, waiting for axes, waiting for the pump and in other waits
+    """
+    __slots__ = ()
+
+    @property
+    def seconds(self):
+        """
+        Returns: seconds the action took
+        """
+        return self.end - self.start
+
+
+class Timeline(object):
+    """
+    Timeline of a simulated plan
+    """
+    def __init__(self, entries, events):
+        """
+        Initialiser.
+        Args:
+            entries: TimelineEntry for each action run
+            events: (start, end, reason) of every time the clock moved on, see sim_genie.SimulatedGenie.events
+        """
+        self.entries = entries
+        self.events = events
+
+    @property
+    def total_seconds(self):
+        """
+        Returns: seconds from the start of the first action to the end of the last
+        """
+        return self.entries[-1].end - self.entries[0].start if self.entries else 0.0
+
+    def compare(self, estimated_minutes):
+        """
+        Args:
+            estimated_minutes: estimated duration, e.g. the run_time of a dry run session
+        Returns: simulated minutes less the estimate; positive if the estimate is optimistic
+        """
+        return self.total_seconds / 60 - estimated_minutes
+
+    def report(self, estimates=None):
+        """
+        Returns: table of the timeline, with the estimate of each action if estimates are given
+        Args:
+            estimates: list of (count minutes, motion minutes) for each action, see action_plan.estimate_plan
+        """
+        lines = ["{:>4} {:<22} {:<20} {:>9} {:>8} {:>8} {:>7} {:>7} {:>9}".format(
+            "#", "action", "label", "start", "count/s", "move/s", "pump/s", "wait/s", "vs est/s")]
+        for entry in self.entries:
+            difference = ""
+            if estimates is not None:
+                estimate = sum(estimates[entry.index]) * 60
+                difference = "{:+9.0f}".format(entry.seconds - estimate)
+            lines.append("{:>4} {:<22} {:<20} {:>9} {:>8.0f} {:>8.1f} {:>7.0f} {:>7.0f} {:>9}".format(
+                entry.index, entry.name[:22], str(entry.label)[:20], _clock(entry.start), entry.count, entry.move,
+                entry.pump, entry.wait, difference))
+        lines.append("Total {} ({:.1f} min)".format(_clock(self.total_seconds), self.total_seconds / 60))
+        return "\n".join(lines)
+
+
+class _TimedExecutor(PlanExecutor):
+    """
+    Plan executor which records the virtual time taken by each action
+    """
+    def __init__(self, compiled_plan, simulated, **kwargs):
+        super(_TimedExecutor, self).__init__(compiled_plan, **kwargs)
+        self.simulated = simulated
+        self.entries = []
+
+    def _execute_journalled(self, index):
+        start, first_event = self.simulated.clock, len(self.simulated.events)
+        super(_TimedExecutor, self)._execute_journalled(index)
+        seconds = {sim_genie.COUNT: 0.0, sim_genie.MOVE: 0.0, sim_genie.PUMP: 0.0, sim_genie.WAIT: 0.0}
+        for event_start, event_end, reason in self.simulated.events[first_event:]:
+            seconds[reason if reason in seconds else sim_genie.WAIT] += event_end - event_start
+        compiled = self.compiled_plan.actions[index]
+        label = getattr(compiled.action.sample, "title", "")
+        self.entries.append(TimelineEntry(index, compiled.action.name, label, start, self.simulated.clock,
+                                          seconds[sim_genie.COUNT], seconds[sim_genie.MOVE],
+                                          seconds[sim_genie.PUMP], seconds[sim_genie.WAIT]))
+
+
+def simulate_plan(compiled_plan, simulated=None, overlap_pumps=False, quiet=True):
+    """
+    Run a compiled plan against the simulated backend. Axis moves, counts and pumping are timed events on the
+    virtual clock, so a night of measurements replays in seconds.
+    Args:
+        compiled_plan: plan to simulate
+        simulated: sim_genie.SimulatedGenie to run on, e.g. with a different beam current; None for a new one
+        overlap_pumps: as PlanExecutor
+        quiet: True to hide what the actions print
+    Returns: Timeline of the plan
+    """
+    with sim_genie.simulated_genie(simulated) as simulated:
+        simulated.events = []
+        executor = _TimedExecutor(compiled_plan, simulated, overlap_pumps=overlap_pumps)
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            executor.run()
+    return Timeline(executor.entries, simulated.events)
+
+
+def compare_with_estimate(compiled_plan, motion_model=None, simulated=None):
+    """
+    Simulate a plan and print its timeline against the dry run estimate of each action
+    Args:
+        compiled_plan: plan to simulate
+        motion_model: motion model for the estimate; None for the default profile
+        simulated: backend to simulate on; None for a new one
+    Returns: Timeline of the plan
+    """
+    estimates = estimate_plan(compiled_plan, MotionModel.from_profile(DEFAULT_PROFILE) if motion_model is None
+                              else motion_model.copy())
+    timeline = simulate_plan(compiled_plan, simulated)
+    print(timeline.report(estimates))
+    estimated = sum(count + motion for count, motion in estimates)
+    print("Estimated {:.1f} min, simulated {:.1f} min ({:+.1f} min)".format(
+        estimated, timeline.total_seconds / 60, timeline.compare(estimated)))
+    return timeline
+
+
+def _clock(seconds):
+    """
+    Returns: seconds as h:mm:ss
+    """
+    seconds = int(round(seconds))
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
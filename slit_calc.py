@@ -0,0 +1,202 @@
+"""
+Vectorised slit gap calculations over arrays of angles and samples
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# gap calculation modes for run_angle: FIXED fills the resolution and footprint exactly (_Movement.calculate_slit_gaps),
+# FLUX picks the gaps which transmit the most flux within them
+FIXED = "fixed"
+FLUX = "flux"
+GAP_MODES = (FIXED, FLUX)
+
+
+class SlitGaps(namedtuple("SlitGaps", "S1VG S2VG S3VG negative s2_larger")):
+    """
+    Vertical slit gaps for every combination of sample (rows) and angle (columns), with masks of the problems found:
+        negative: True where S1VG or S2VG is less than 0
+        s2_larger: True where S2VG is larger than S1VG
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """
+        Returns: mask which is True where the gaps can be used
+        """
+        return ~self.negative
+
+    def as_dicts(self):
+        """
+        Returns: the gaps as a list (per sample) of lists (per angle) of dictionaries, as _Movement.slit_setpoints
+        """
+        return [[{"S1VG": s1, "S2VG": s2, "S3VG": s3} for s1, s2, s3 in zip(row_s1, row_s2, row_s3)]
+                for row_s1, row_s2, row_s3 in zip(self.S1VG.tolist(), self.S2VG.tolist(), self.S3VG.tolist())]
+
+
+def calculate_slit_gaps(theta, footprint, resolution, constants):
+    """
+    Calculate the vertical slit gaps, as _Movement.calculate_slit_gaps and slit 3 scaled by theta / max_theta as
+    _Movement.slit_setpoints, for arrays of values. Arguments are broadcast against each other.
+    Args:
+        theta: angles
+        footprint: footprints of the samples
+        resolution: resolutions required
+        constants: instrument constants
+    Returns: SlitGaps of the broadcast shape; problems are flagged in the masks rather than raised
+    """
+    theta = np.asarray(theta, dtype=float)
+    footprint = np.asarray(footprint, dtype=float)
+    resolution = np.asarray(resolution, dtype=float)
+    s1sa = constants.s1s2 + constants.s2sa
+    footprint_at_theta = footprint * np.sin(np.radians(theta))
+    s1 = 2 * s1sa * np.tan(np.radians(resolution * theta)) - footprint_at_theta
+    s2 = (constants.s1s2 * (footprint_at_theta + s1) / s1sa) - s1
+    s3 = np.broadcast_to(constants.s3max * theta / constants.max_theta, s1.shape)
+    return SlitGaps(s1, s2, s3, (s1 < 0) | (s2 < 0), s2 > s1)
+
+
+def flux_optimal_slit_gaps(theta, footprint, resolution, constants, limits=None):
+    """
+    Calculate the vertical slit gaps which transmit the most flux while staying within the limits below. For a beam
+    filling both slits uniformly in position and angle, two slits a distance s1s2 apart pass the rays in a region of
+    (height, angle) of area S1VG * S2VG / s1s2, so the flux is proportional to S1VG * S2VG. The limits are:
+        resolution: (S1VG + S2VG) / (2 * s1s2) <= tan(resolution * theta)
+        footprint: beam height at the sample, S2VG + (S1VG + S2VG) * s2sa / s1s2 <= footprint * sin(theta)
+        slit limits: 0 <= gap <= limits[gap]
+    The fixed calculation sits on both the resolution and footprint limits; when the footprint allows it the flux is
+    larger with equal gaps at the resolution limit, or when the resolution allows it on the footprint limit alone.
+    Slit 3 is set as in the fixed calculation: the beam at the sample is never taller than the fixed one, so slit 3
+    needs no more opening than in fixed mode. Arguments are broadcast against each other.
+    Args:
+        theta: angles
+        footprint: footprints of the samples
+        resolution: resolutions required
+        constants: instrument constants
+        limits: dictionary of maximum gap for S1VG and S2VG, missing for no limit; None for the limits in the
+            constants, see slit_limits
+    Returns: SlitGaps of the broadcast shape; where no positive gaps fit, the fixed calculation is returned and marked
+        negative
+    """
+    limits = slit_limits(constants) if limits is None else limits
+    fixed = calculate_slit_gaps(theta, footprint, resolution, constants)
+    theta, footprint, resolution = np.broadcast_arrays(*(np.asarray(value, dtype=float)
+                                                         for value in (theta, footprint, resolution)))
+    divergence = 2 * constants.s1s2 * np.tan(np.radians(resolution * theta))
+    height = footprint * np.sin(np.radians(theta))
+    k = constants.s2sa / constants.s1s2
+    s1_limit = np.full_like(theta, np.inf if limits.get("S1VG") is None else limits["S1VG"])
+    s2_limit = np.full_like(theta, np.inf if limits.get("S2VG") is None else limits["S2VG"])
+
+    # the product is maximised either in the middle of a limiting line or at a corner where two lines meet
+    with np.errstate(invalid="ignore", divide="ignore"):
+        candidates = [
+            (divergence / 2, divergence / 2),
+            (height / (2 * k), height / (2 * (1 + k))),
+            (fixed.S1VG, fixed.S2VG),
+            (s1_limit, divergence - s1_limit),
+            (s1_limit, (height - k * s1_limit) / (1 + k)),
+            (divergence - s2_limit, s2_limit),
+            ((height - (1 + k) * s2_limit) / k, s2_limit),
+            (s1_limit, s2_limit),
+        ]
+        s1 = np.stack([np.broadcast_to(c[0], theta.shape) for c in candidates])
+        s2 = np.stack([np.broadcast_to(c[1], theta.shape) for c in candidates])
+        margin = 1e-9 * (1 + np.abs(divergence) + np.abs(height))
+        feasible = ((s1 >= 0) & (s2 >= 0) & (s1 <= s1_limit + margin) & (s2 <= s2_limit + margin)
+                    & (s1 + s2 <= divergence + margin) & (k * s1 + (1 + k) * s2 <= height + margin))
+        flux = np.where(feasible, s1 * s2, -1.0)
+    best = np.argmax(flux, axis=0)[np.newaxis]
+    found = np.take_along_axis(flux, best, axis=0)[0] > 0
+    s1 = np.where(found, np.take_along_axis(s1, best, axis=0)[0], fixed.S1VG)
+    s2 = np.where(found, np.take_along_axis(s2, best, axis=0)[0], fixed.S2VG)
+    return SlitGaps(s1, s2, fixed.S3VG, ~found, s2 > s1)
+
+
+def slit_limits(constants):
+    """
+    Returns: dictionary of the maximum S1VG and S2VG of the instrument, from the constants; None where not known
+    """
+    return {"S1VG": getattr(constants, "s1max", None), "S2VG": getattr(constants, "s2max", None)}
+
+
+def gap_setpoints(theta, footprint, resolution, constants, gap_mode=FIXED):
+    """
+    Vertical gaps for a single angle and sample in the given gap calculation mode.
+    Args:
+        theta: angle
+        footprint: footprint of the sample
+        resolution: resolution required
+        constants: instrument constants
+        gap_mode: FIXED or FLUX
+    Returns: dictionary of S1VG, S2VG and S3VG
+    Raises ValueError: for an unknown mode
+    """
+    if gap_mode == FIXED:
+        gaps = calculate_slit_gaps(theta, footprint, resolution, constants)
+    elif gap_mode == FLUX:
+        gaps = flux_optimal_slit_gaps(theta, footprint, resolution, constants, slit_limits(constants))
+    else:
+        raise ValueError("Unknown gap mode {}; should be one of {}".format(gap_mode, GAP_MODES))
+    return {"S1VG": float(gaps.S1VG), "S2VG": float(gaps.S2VG), "S3VG": float(gaps.S3VG)}
+
+
+def slit_table(samples, angles, constants, gap_mode=FIXED):
+    """
+    Slit gaps for each sample at each angle.
+    Args:
+        samples: samples (anything with footprint and resolution) or a table with footprint and resolution columns
+        angles: angles to calculate for
+        constants: instrument constants
+        gap_mode: FIXED or FLUX
+    Returns: SlitGaps with a row per sample and a column per angle
+    """
+    footprint, resolution = _columns(samples)
+    angles = np.asarray(angles, dtype=float)[np.newaxis, :]
+    if gap_mode == FLUX:
+        return flux_optimal_slit_gaps(angles, footprint[:, np.newaxis], resolution[:, np.newaxis], constants,
+                                      slit_limits(constants))
+    return calculate_slit_gaps(angles, footprint[:, np.newaxis], resolution[:, np.newaxis], constants)
+
+
+def plan_slit_problems(plan, constants):
+    """
+    Check the calculated slit gaps of every measurement in a plan at once.
+    Args:
+        plan: plan of actions (see action_plan)
+        constants: instrument constants
+    Returns: list of (action index, problem) for actions whose calculated gaps are negative or have s2 > s1
+    """
+    indices, thetas, samples, flux = [], [], [], []
+    for index, action in enumerate(plan.actions):
+        if action.name.startswith("run_angle"):
+            theta = action.get("angle")
+        elif action.name.startswith("transmission"):
+            theta = action.get("at_angle")
+        else:
+            continue
+        indices.append(index)
+        thetas.append(theta)
+        samples.append(action.sample)
+        flux.append(action.get("gap_mode", FIXED) == FLUX)
+    if not indices:
+        return []
+    footprint, resolution = _columns(samples)
+    gaps = calculate_slit_gaps(thetas, footprint, resolution, constants)
+    if any(flux):
+        flux_gaps = flux_optimal_slit_gaps(thetas, footprint, resolution, constants, slit_limits(constants))
+        gaps = SlitGaps(*(np.where(flux, optimal, fixed) for optimal, fixed in zip(flux_gaps, gaps)))
+    problems = [(indices[i], "negative slit gap") for i in np.flatnonzero(gaps.negative)]
+    problems += [(indices[i], "s2vg larger than s1vg") for i in np.flatnonzero(gaps.s2_larger & ~gaps.negative)]
+    return sorted(problems)
+
+
+def _columns(samples):
+    """
+    Returns: footprint and resolution arrays of the samples
+    """
+    if hasattr(samples, "footprint") and not hasattr(samples, "title"):
+        return np.asarray(samples.footprint, dtype=float), np.asarray(samples.resolution, dtype=float)
+    return (np.array([sample.footprint for sample in samples], dtype=float),
+            np.array([sample.resolution for sample in samples], dtype=float))
@@ -0,0 +1,167 @@
+"""
+On disk store of spectra, one memory mapped file per run, so they can be read back without fetching them again
+"""
+import json
+import os
+
+import numpy as np
+
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+INDEX = "index.jsonl"
+DTYPE = "float64"
+
+
+class RunSpectra(object):
+    """
+    Spectra of one run held in a file of channels x periods x bins. Reads return views of the file, so only the
+    parts used are paged into memory.
+    """
+    def __init__(self, entry, directory, mode="r"):
+        """
+        Initialiser.
+        Args:
+            entry: index entry of the run
+            directory: directory of the archive
+            mode: numpy.memmap mode; "r" to read, "r+" to update, "w+" to create
+        """
+        self.entry = entry
+        self.spectra = entry["spectra"]
+        shape = (len(self.spectra), entry["periods"], entry["bins"])
+        self.data = np.memmap(os.path.join(directory, entry["file"]), dtype=entry["dtype"], mode=mode, shape=shape)
+        self._channels = {spectrum: channel for channel, spectrum in enumerate(self.spectra)}
+        time_path = os.path.join(directory, entry["file"] + ".tof.npy")
+        self.time = np.load(time_path, mmap_mode="r") if os.path.exists(time_path) else None
+        self._time_path = time_path
+
+    def read(self, spectrum, period=1):
+        """
+        Returns: counts of a spectrum in a period (1 based, as genie), as a view of the file
+        """
+        return self.data[self._channels[spectrum], period - 1]
+
+    def write(self, spectrum, period, signal, time=None):
+        """
+        Store the counts of a spectrum in a period
+        Args:
+            spectrum: spectrum number
+            period: period number, from 1
+            signal: counts in each bin
+            time: time of flight bin edges or centres; stored once per run
+        """
+        self.data[self._channels[spectrum], period - 1] = signal
+        if time is not None and self.time is None:
+            np.save(self._time_path, np.asarray(time, dtype=float))
+            self.time = np.load(self._time_path, mmap_mode="r")
+
+    def capture(self, periods=None):
+        """
+        Store the current spectra of the run from the instrument
+        Args:
+            periods: period numbers to capture; None for all of them
+        """
+        for period in range(1, self.entry["periods"] + 1) if periods is None else periods:
+            for spectrum in self.spectra:
+                data = g.get_spectrum(spectrum, period, dist=False)
+                self.write(spectrum, period, data["signal"], data.get("time"))
+        self.flush()
+
+    def get_spectrum(self, spectrum, period=1, dist=False):
+        """
+        Read a spectrum in the form returned by g.get_spectrum with dist=False, so stored runs can be replayed
+        """
+        # pylint: disable=unused-argument
+        spectrum = {"signal": self.read(spectrum, period)}
+        if self.time is not None:
+            spectrum["time"] = self.time
+        return spectrum
+
+    def flush(self):
+        """
+        Write changes to disk
+        """
+        if self.data.mode != "r":
+            self.data.flush()
+
+
+class SpectrumArchive(object):
+    """
+    Directory of run files with an append only index of run number, sample, theta and title
+    """
+    def __init__(self, directory):
+        """
+        Initialiser.
+        Args:
+            directory: directory of the archive; created if it does not exist
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        Returns: dictionary of run number to index entry; the latest entry for a run number is used
+        """
+        if self._index is None:
+            self._index = {}
+            path = os.path.join(self.directory, INDEX)
+            if os.path.exists(path):
+                with open(path) as index_file:
+                    for line in index_file:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._index[entry["run"]] = entry
+        return self._index
+
+    def create(self, run, spectra, periods, bins, sample=None, theta=None, title=None, dtype=DTYPE):
+        """
+        Create the file for a run and add it to the index
+        Args:
+            run: run number
+            spectra: spectrum numbers to store
+            periods: number of periods
+            bins: number of time of flight bins
+            sample: sample the run is on (its title and subtitle are indexed)
+            theta: angle of the run
+            title: title of the run
+            dtype: type of the stored counts
+        Returns: RunSpectra to write to
+        """
+        entry = {"run": run, "file": "run_{:08d}.spec".format(run), "spectra": list(spectra), "periods": periods,
+                 "bins": bins, "dtype": dtype, "theta": theta, "title": title,
+                 "sample": None if sample is None else "{} {}".format(sample.title, sample.subtitle).strip()}
+        run_spectra = RunSpectra(entry, self.directory, mode="w+")
+        with open(os.path.join(self.directory, INDEX), "a") as index_file:
+            index_file.write(json.dumps(entry) + "\n")
+        self.index[run] = entry
+        return run_spectra
+
+    def capture(self, spectra, periods=1, sample=None, theta=None, title=None):
+        """
+        Store the spectra of the current run from the instrument, see create for Args
+        Returns: RunSpectra of the run
+        """
+        bins = len(g.get_spectrum(spectra[0], 1, dist=False)["signal"])
+        run_spectra = self.create(int(g.get_runnumber()), spectra, periods, bins, sample, theta, title)
+        run_spectra.capture()
+        return run_spectra
+
+    def open(self, run, mode="r"):
+        """
+        Returns: RunSpectra of a stored run
+        Raises KeyError: if the run is not in the archive
+        """
+        return RunSpectra(self.index[run], self.directory, mode)
+
+    def runs(self, **match):
+        """
+        Find runs in the index, e.g. runs(sample="S1 D2O", theta=0.7)
+        Returns: run numbers of the runs whose entries have all the given values
+        """
+        return sorted(run for run, entry in self.index.items()
+                      if all(entry.get(key) == value for key, value in match.items()))
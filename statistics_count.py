@@ -0,0 +1,184 @@
+"""
+Count until a target number of detector counts, or relative error, is reached in a Q or time of flight window
+"""
+from collections import namedtuple
+from math import pi, radians, sin, sqrt
+
+import numpy as np
+
+try:
+    # pylint: disable=import-error
+    from genie_python import genie as g
+except ImportError:
+    from mocks import g
+
+# h / m_n in angstrom metres per second, to convert time of flight to wavelength
+H_OVER_MN = 3956.034
+# moderator to detector distance in m, needs instrument check
+FLIGHT_PATH = 10.0
+TOF = "tof"
+Q = "q"
+
+
+class StatisticsTarget(namedtuple("StatisticsTarget",
+                                  "counts relative_error window units spectrum period max_seconds min_poll max_poll")):
+    """
+    Statistics to count to. Counting stops when either counts or relative_error is reached, or after max_seconds.
+        counts: integrated detector counts to reach in the window; None for use relative_error
+        relative_error: relative (Poisson) error of the integrated counts to reach; None for use counts
+        window: (low, high) of the window to integrate; None for the whole spectrum
+        units: TOF for a window in microseconds or Q for a window in inverse angstroms
+        spectrum: detector spectrum number
+        period: period to read the spectrum from
+        max_seconds: most seconds to count for
+        min_poll: shortest seconds between reads of the spectrum
+        max_poll: longest seconds between reads of the spectrum
+    """
+    __slots__ = ()
+
+    def __new__(cls, counts=None, relative_error=None, window=None, units=TOF, spectrum=3, period=1,
+                max_seconds=3600.0, min_poll=2.0, max_poll=60.0):
+        if counts is None and relative_error is None:
+            raise ValueError("One of counts or relative_error must be given")
+        if units not in (TOF, Q):
+            raise ValueError("Window units should be {} or {}".format(TOF, Q))
+        return super(StatisticsTarget, cls).__new__(cls, counts, relative_error, window, units, spectrum, period,
+                                                    max_seconds, min_poll, max_poll)
+
+    @property
+    def target_counts(self):
+        """
+        Returns: counts needed to meet both the counts and relative error targets
+        """
+        from_error = 0 if self.relative_error is None else 1 / self.relative_error ** 2
+        return max(self.counts or 0, from_error)
+
+
+class CountStatistics(namedtuple("CountStatistics", "counts relative_error seconds polls reached")):
+    """
+    Statistics achieved by a count
+        counts: integrated counts in the window
+        relative_error: relative Poisson error of counts; None if there were no counts
+        seconds: seconds counted for
+        polls: number of times the spectrum was read
+        reached: True if the target was reached; False if counting stopped at max_seconds
+    """
+    __slots__ = ()
+
+    def summary(self):
+        """
+        Returns: short description of the statistics, e.g. for a title
+        """
+        error = "-" if self.relative_error is None else "{:.2%}".format(self.relative_error)
+        return "N={:.0f} err={}".format(self.counts, error)
+
+
+def tof_to_wavelength(tof, flight_path=FLIGHT_PATH):
+    """
+    Convert time of flight to wavelength
+    Args:
+        tof: times of flight in microseconds
+        flight_path: moderator to detector (or monitor) distance in m
+    Returns: wavelength in angstroms
+    """
+    return H_OVER_MN * np.asarray(tof, dtype=float) * 1e-6 / flight_path
+
+
+def tof_to_q(tof, theta, flight_path=FLIGHT_PATH):
+    """
+    Convert time of flight to Q
+    Args:
+        tof: times of flight in microseconds
+        theta: angle of reflection in degrees
+        flight_path: moderator to detector distance in m
+    Returns: Q in inverse angstroms; inf at zero time of flight
+    """
+    wavelength = tof_to_wavelength(tof, flight_path)
+    with np.errstate(divide="ignore"):
+        return 4 * pi * sin(radians(theta)) / wavelength
+
+
+def window_counts(spectrum, window=None, units=TOF, theta=None, flight_path=FLIGHT_PATH):
+    """
+    Integrate a spectrum over a window
+    Args:
+        spectrum: spectrum as returned by g.get_spectrum, with counts in "signal" and bin edges or centres in "time";
+            bin number is used for time if there is no "time"
+        window: (low, high) to integrate over; None for all of the spectrum
+        units: TOF or Q; the units of window
+        theta: angle of reflection for a Q window
+        flight_path: moderator to detector distance in m for a Q window
+    Returns: integrated counts
+    """
+    signal = np.asarray(spectrum["signal"], dtype=float)
+    if window is None:
+        return float(np.nansum(signal))
+    time = np.asarray(spectrum.get("time", np.arange(len(signal))), dtype=float)
+    if len(time) == len(signal) + 1:
+        time = (time[:-1] + time[1:]) / 2
+    x = tof_to_q(time, theta, flight_path) if units == Q else time
+    low, high = window
+    return float(np.nansum(signal[(x >= low) & (x <= high)]))
+
+
+class StatisticsCounter(object):
+    """
+    Waits in an open run until a statistics target is reached. The spectrum is read more often as the target gets
+    close, so the run ends soon after it is reached without reading it continually.
+    """
+    def __init__(self, target, theta=None, flight_path=FLIGHT_PATH):
+        """
+        Initialiser.
+        Args:
+            target: StatisticsTarget to reach
+            theta: angle of reflection, needed for a Q window
+            flight_path: moderator to detector distance in m
+        """
+        if target.units == Q and target.window is not None and theta is None:
+            raise ValueError("theta is needed for a window in Q")
+        self.target = target
+        self.theta = theta
+        self.flight_path = flight_path
+
+    def counts(self):
+        """
+        Returns: current integrated counts in the window
+        """
+        spectrum = g.get_spectrum(self.target.spectrum, self.target.period, dist=False)
+        return window_counts(spectrum, self.target.window, self.target.units, self.theta, self.flight_path)
+
+    def next_poll(self, counts, elapsed, interval):
+        """
+        Seconds to wait before the next read: half the estimated time left at the current rate, or double the last
+        interval when there are no counts yet, kept within the polling limits and the time left.
+        Args:
+            counts: current counts
+            elapsed: seconds counted for
+            interval: last interval waited
+        """
+        target = self.target
+        if counts > 0 and elapsed > 0:
+            interval = (target.target_counts - counts) / (counts / elapsed) / 2
+        else:
+            interval = interval * 2
+        interval = min(max(interval, target.min_poll), target.max_poll)
+        return max(min(interval, target.max_seconds - elapsed), 0)
+
+    def run(self):
+        """
+        Wait until the target is reached or for max_seconds. The run should already have begun.
+        Returns: CountStatistics achieved
+        """
+        polls, interval = 0, self.target.min_poll / 2
+        while True:
+            counts = self.counts()
+            # the time the DAE has counted for, which leaves out any pauses and the time taken to read
+            elapsed = float(g.get_time_since_begin(False))
+            polls += 1
+            reached = counts >= self.target.target_counts
+            if reached or elapsed >= self.target.max_seconds:
+                break
+            interval = self.next_poll(counts, elapsed, interval)
+            g.waitfor_time(seconds=interval)
+        error = 1 / sqrt(counts) if counts > 0 else None
+        return CountStatistics(counts, error, elapsed, polls, reached)
@@ -0,0 +1,133 @@
+"""
+Stitch the reflectivity measured at several angles into one curve per sample
+"""
+import numpy as np
+
+# Q range and dQ/Q of the default shared grid
+Q_MIN = 0.005
+Q_MAX = 0.5
+DQ_OVER_Q = 0.02
+
+
+def log_q_grid(q_min=Q_MIN, q_max=Q_MAX, dq_over_q=DQ_OVER_Q):
+    """
+    Returns: edges of Q bins with a constant dQ/Q from q_min to at least q_max
+    """
+    bins = int(np.ceil(np.log(q_max / q_min) / np.log1p(dq_over_q)))
+    return q_min * (1 + dq_over_q) ** np.arange(bins + 1)
+
+
+class StitchedCurve(object):
+    """
+    Reflectivity of one sample on a shared Q grid. Each curve added is rebinned onto the grid, scaled to match the
+    curve so far where they overlap and merged as an error weighted mean. Only the weighted sums are kept, so adding
+    an angle does not recalculate the earlier ones.
+    """
+    def __init__(self, q_bins):
+        """
+        Initialiser.
+        Args:
+            q_bins: edges of the Q bins to stitch onto
+        """
+        self.q_bins = np.asarray(q_bins, dtype=float)
+        self.q = (self.q_bins[:-1] + self.q_bins[1:]) / 2
+        self._weights = np.zeros(len(self.q))
+        self._weighted = np.zeros(len(self.q))
+        self.angles = []
+        self.scales = []
+
+    def _rebin(self, q, reflectivity, error):
+        """
+        Returns: weights and weighted reflectivity of a curve summed into the Q bins
+        """
+        q, reflectivity, error = (np.asarray(value, dtype=float) for value in (q, reflectivity, error))
+        index = np.digitize(q, self.q_bins) - 1
+        use = (index >= 0) & (index < len(self.q)) & (error > 0) & np.isfinite(reflectivity)
+        weights = 1 / error[use] ** 2
+        size = len(self.q)
+        return np.bincount(index[use], weights, size), np.bincount(index[use], weights * reflectivity[use], size)
+
+    def add(self, q, reflectivity, error, angle=None):
+        """
+        Add a curve measured at an angle. The first curve sets the scale; later curves are scaled to the curve so far
+        over the Q bins they share.
+        Args:
+            q: Q of the points
+            reflectivity: reflectivity of the points
+            error: uncertainty of the reflectivity; points with no uncertainty are ignored
+            angle: angle the curve was measured at, for reference
+        Returns: scale factor applied to the curve
+        """
+        weights, weighted = self._rebin(q, reflectivity, error)
+        overlap = (weights > 0) & (self._weights > 0)
+        scale = 1.0
+        if overlap.any():
+            current = self._weighted[overlap] / self._weights[overlap]
+            new = weighted[overlap] / weights[overlap]
+            if np.sum(weights[overlap] * new) > 0:
+                scale = float(np.sum(weights[overlap] * current) / np.sum(weights[overlap] * new))
+        # scaling a point by s scales its variance by s^2, so its weight by 1 / s^2 and weighted value by 1 / s
+        self._weights += weights / scale ** 2
+        self._weighted += weighted / scale
+        self.angles.append(angle)
+        self.scales.append(scale)
+        return scale
+
+    def curve(self):
+        """
+        Returns: q, reflectivity and uncertainty of the bins with data
+        """
+        has_data = self._weights > 0
+        weights = self._weights[has_data]
+        return self.q[has_data], self._weighted[has_data] / weights, 1 / np.sqrt(weights)
+
+
+class Stitcher(object):
+    """
+    Stitched curves for each sample, keyed by sample title and subtitle
+    """
+    def __init__(self, q_bins=None):
+        """
+        Initialiser.
+        Args:
+            q_bins: edges of the shared Q bins; None for log_q_grid()
+        """
+        self.q_bins = log_q_grid() if q_bins is None else np.asarray(q_bins, dtype=float)
+        self.curves = {}
+
+    @staticmethod
+    def key(sample):
+        """
+        Returns: key of the stitched curve for a sample
+        """
+        return sample.title, sample.subtitle
+
+    def add(self, sample, q, reflectivity, error, angle=None):
+        """
+        Add a curve measured on a sample, see StitchedCurve.add
+        Returns: stitched curve of the sample
+        """
+        key = self.key(sample)
+        if key not in self.curves:
+            self.curves[key] = StitchedCurve(self.q_bins)
+        stitched = self.curves[key]
+        scale = stitched.add(q, reflectivity, error, angle)
+        q, _, _ = stitched.curve()
+        if len(q):
+            print("Stitched {} {} at {} (scale {:.3f}): {} angles, Q {:.4f} to {:.4f}".format(
+                key[0], key[1], angle, scale, len(stitched.angles), q[0], q[-1]))
+        return stitched
+
+    def add_reduction(self, sample, reduction):
+        """
+        Add the current curve of a live_reduction.LiveReduction
+        Returns: stitched curve of the sample
+        """
+        return self.add(sample, *reduction.curve(), angle=reduction.theta)
+
+    def curve(self, sample):
+        """
+        Returns: q, reflectivity and uncertainty stitched so far for a sample
+        Raises KeyError: if nothing has been measured on the sample
+        """
+        return self.curves[self.key(sample)].curve()
@@ -0,0 +1,42 @@
+"""
+Tests of plans of script actions
+"""
+import unittest
+
+from action_plan import CALL, Action, CompiledAction, CompiledPlan, estimate_plan, record_plan
+from dry_run_session import DryRunSession
+from sample import Sample
+from script_actions import DryRun
+
+
+@DryRun
+def _inner(sample, dry_run=False):
+    return 3
+
+
+def _outer(sample, dry_run=False):
+    _inner(sample)
+    return 5
+
+
+def _call_plan():
+    sample = Sample("S1", "D2O", 10.0, 0.0, 0.0, 0.0, 0.0, 0.03, 60.0, 80.0, 1, {})
+    action = Action("_outer", _outer, (("sample", sample),))
+    return CompiledPlan((CompiledAction(action, CALL, "SOLID", (), None, None, (None, None, None, None),
+                                        (False, None, None), ()),), None)
+
+
+class TestEstimatePlan(unittest.TestCase):
+    def test_called_actions_are_not_added_to_the_session(self):
+        with DryRunSession(dry_run=True) as session:
+            self.assertEqual(estimate_plan(_call_plan()), [(5, 0)])
+        self.assertEqual((session.counter, session.report.size), (0, 0))
+
+    def test_called_actions_are_estimated_while_recording(self):
+        estimates = []
+        plan = record_plan(lambda: estimates.extend(estimate_plan(_call_plan())))
+        self.assertEqual((estimates, plan.actions), ([(5, 0)], ()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Tests of fitting a plan into the beamtime left
+"""
+import unittest
+
+from action_plan import CALL, MEASURE, Action, CompiledAction, CompiledPlan
+from budget import MIN_FRACTION, fit_to_budget
+
+
+def _plan(kinds):
+    """
+    Returns: compiled plan of counts in uamps and calls, of the kinds given
+    """
+    actions = []
+    for index, kind in enumerate(kinds):
+        if kind == CALL:
+            actions.append(CompiledAction(Action("wait", None, (("seconds", 60),)), CALL, "SOLID", (), None, None,
+                                          (None, None, None, None), (False, None, None), ()))
+        else:
+            action = Action("run_angle", None, (("angle", 0.5 + index), ("count_uamps", 20)))
+            actions.append(CompiledAction(action, MEASURE, "SOLID", (("THETA", 0.5 + index),), None,
+                                          ("S{}".format(index), 0.5 + index), (20, None, None, None),
+                                          (False, None, None), ()))
+    return CompiledPlan(tuple(actions), None)
+
+
+class TestFitToBudget(unittest.TestCase):
+    def setUp(self):
+        self.plan = _plan((MEASURE, MEASURE, MEASURE, CALL))
+        self.estimates = [(60.0, 2.0), (60.0, 2.0), (60.0, 2.0), (5.0, 0.0)]
+        self.priorities = {0: 2, 1: 1, 2: 3}
+
+    def fit(self, minutes, **kwargs):
+        return fit_to_budget(self.plan, minutes, estimates=self.estimates, **kwargs)
+
+    def test_plan_which_fits_is_unchanged(self):
+        proposal = self.fit(200, priorities=self.priorities)
+        self.assertTrue(proposal.fits)
+        self.assertEqual(proposal.dropped, ())
+        self.assertEqual(proposal.scales, {0: 1.0, 1: 1.0, 2: 1.0})
+        self.assertAlmostEqual(proposal.minutes, 191)
+
+    def test_lowest_priority_is_shortened_first(self):
+        proposal = self.fit(171, priorities=self.priorities)
+        self.assertEqual(proposal.dropped, ())
+        self.assertAlmostEqual(proposal.scales[1], 1 - 20 / 60.0)
+        self.assertEqual(proposal.scales[0], 1.0)
+        self.assertEqual(proposal.scales[2], 1.0)
+        self.assertAlmostEqual(proposal.minutes, 171)
+
+    def test_each_priority_goes_down_to_its_minimum_before_the_next(self):
+        proposal = self.fit(131, priorities=self.priorities)
+        self.assertAlmostEqual(proposal.scales[1], MIN_FRACTION)
+        self.assertAlmostEqual(proposal.scales[0], 1 - 30 / 60.0)
+        self.assertEqual(proposal.scales[2], 1.0)
+
+    def test_minimum_limits_shortening(self):
+        proposal = self.fit(171, priorities=self.priorities, minimums={1: 0.9})
+        self.assertAlmostEqual(proposal.scales[1], 0.9)
+        self.assertAlmostEqual(proposal.scales[0], 1 - 14 / 60.0)
+        self.assertAlmostEqual(proposal.minutes, 171)
+
+    def test_lowest_priority_dropped_and_time_given_to_highest(self):
+        proposal = self.fit(85, priorities=self.priorities)
+        self.assertEqual(proposal.dropped, (1,))
+        self.assertAlmostEqual(proposal.scales[0], MIN_FRACTION)
+        self.assertAlmostEqual(proposal.scales[2], MIN_FRACTION + 16 / 60.0)
+        self.assertTrue(proposal.fits)
+        self.assertAlmostEqual(proposal.minutes, 85)
+
+    def test_longest_dropped_first_at_equal_priority(self):
+        self.estimates = [(20.0, 1.0), (80.0, 1.0), (40.0, 1.0), (5.0, 0.0)]
+        proposal = self.fit(55)
+        self.assertEqual(proposal.dropped, (1,))
+        self.assertTrue(proposal.fits)
+
+    def test_calls_are_never_shortened_or_dropped(self):
+        proposal = self.fit(1, priorities=self.priorities)
+        self.assertEqual(proposal.dropped, (0, 1, 2))
+        self.assertNotIn(3, proposal.scales)
+        self.assertFalse(proposal.fits)
+        self.assertAlmostEqual(proposal.minutes, 5)
+        self.assertEqual(len(proposal.apply(self.plan).actions), 1)
+
+    def test_apply_scales_counts(self):
+        applied = self.fit(171, priorities=self.priorities).apply(self.plan)
+        self.assertAlmostEqual(applied.actions[1].count[0], 20 * (1 - 20 / 60.0))
+        self.assertEqual(applied.actions[0].count[0], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
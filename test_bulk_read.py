@@ -0,0 +1,57 @@
+"""
+Tests of reading PVs and blocks together
+"""
+import threading
+import time
+import unittest
+
+import bulk_read
+from bulk_read import read_concurrently
+
+
+class _InFlight(object):
+    """
+    Read which records the most reads made at once
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.now = 0
+        self.most = 0
+
+    def __call__(self, name):
+        with self.lock:
+            self.now += 1
+            self.most = max(self.most, self.now)
+        time.sleep(0.02)
+        with self.lock:
+            self.now -= 1
+        return name.lower()
+
+
+class TestReadConcurrently(unittest.TestCase):
+    def tearDown(self):
+        bulk_read.set_concurrent(True)
+
+    def test_reads_together_and_keeps_order(self):
+        read = _InFlight()
+        names = ["S{}VG".format(slit) for slit in range(1, 5)]
+        self.assertEqual(list(read_concurrently(read, names).items()), [(name, name.lower()) for name in names])
+        self.assertGreater(read.most, 1)
+
+    def test_switch_serialises_reads(self):
+        bulk_read.set_concurrent(False)
+        read = _InFlight()
+        values = read_concurrently(read, ["S1VG", "S2VG", "S3VG"])
+        self.assertEqual(read.most, 1)
+        self.assertEqual(values, {"S1VG": "s1vg", "S2VG": "s2vg", "S3VG": "s3vg"})
+
+    def test_first_error_is_raised(self):
+        def read(name):
+            raise IOError("PV {} does not exist".format(name))
+
+        with self.assertRaises(IOError):
+            read_concurrently(read, ["A", "B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
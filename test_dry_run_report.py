@@ -0,0 +1,59 @@
+"""
+Tests of the dry run report
+"""
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dry_run_report import ROW, DryRunReport
+
+LONG_TITLE = "Sample with a title much longer than the width of its column in the printed table, " * 2
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.report = DryRunReport(capacity=2, chunk=None)
+        self.report.add("run_angle", LONG_TITLE, "angle=0.7, count_uamps=20", 30.0)
+        self.report.add("contrast_change", "", "concentrations=[100, 0, 0, 0], flow=1.0", 15.5)
+        self.report.add("run_angle", "S2", "angle=2.3, count_uamps=50", 75.25)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check_rows(self, rows):
+        self.assertEqual([row["number"] for row in rows], [1, 2, 3])
+        self.assertEqual(rows[0]["title"], LONG_TITLE)
+        self.assertEqual(rows[1]["parameters"], "concentrations=[100, 0, 0, 0], flow=1.0")
+        self.assertEqual([row["minutes"] for row in rows], [30.0, 15.5, 75.25])
+        self.assertEqual([row["cumulative"] for row in rows], [30.0, 45.5, 120.75])
+
+    def test_csv_keeps_every_row_whole(self):
+        path = os.path.join(self.folder, "report.csv")
+        self.report.to_csv(path)
+        with open(path, newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(list(rows[0]), list(ROW.names))
+        for row in rows:
+            row.update(number=int(row["number"]), minutes=float(row["minutes"]),
+                       cumulative=float(row["cumulative"]))
+        self.check_rows(rows)
+
+    def test_json_keeps_every_row_whole(self):
+        path = os.path.join(self.folder, "report.json")
+        self.report.to_json(path)
+        with open(path) as json_file:
+            self.check_rows(json.load(json_file))
+
+    def test_printed_table_elides_long_title(self):
+        table = self.report.render()
+        self.assertNotIn(LONG_TITLE.strip(), table)
+        self.assertIn("\u2026", table)
+        self.assertEqual(self.report.total_minutes, 120.75)
+
+
+if __name__ == "__main__":
+    unittest.main()
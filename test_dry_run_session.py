@@ -0,0 +1,54 @@
+"""
+Tests of dry run sessions
+"""
+import io
+import threading
+import unittest
+from contextlib import redirect_stdout
+
+from dry_run_session import DryRunSession, current_session
+from script_actions import DryRun
+
+with redirect_stdout(io.StringIO()):
+    # script_2 dry runs its script when it is loaded
+    import script_2
+
+
+@DryRun
+def _action(minutes, dry_run=False):
+    return minutes if dry_run else "ran {}".format(minutes)
+
+
+class TestDryRunSession(unittest.TestCase):
+    def test_dry_run_adds_to_the_current_session_only(self):
+        before = current_session().run_time
+        with redirect_stdout(io.StringIO()), DryRunSession(dry_run=True) as session:
+            _action(5)
+            _action(7)
+        self.assertEqual((session.counter, session.run_time, session.report.size), (2, 12, 2))
+        self.assertEqual(current_session().run_time, before)
+
+    def test_real_run_returns_the_result_of_the_action(self):
+        with redirect_stdout(io.StringIO()), DryRunSession(dry_run=False):
+            self.assertEqual(_action(5), "ran 5")
+
+    def test_concurrent_scripts_have_separate_totals(self):
+        with redirect_stdout(io.StringIO()):
+            alone = script_2.runscript(dry_run=True)
+            sessions = [None, None]
+
+            def run(index):
+                sessions[index] = script_2.runscript(dry_run=True)
+
+            threads = [threading.Thread(target=run, args=(index,)) for index in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        for session in sessions:
+            self.assertEqual(session.counter, alone.counter)
+            self.assertAlmostEqual(session.run_time, alone.run_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Tests of the instrument constants cache
+"""
+import io
+import sys
+import threading
+import types
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+import instrument_constants
+from instrument_constants import CONSTANT_NAMES, OPTIONAL_CONSTANT_NAMES, InstrumentConstantsCache
+
+
+class _CaChannelWrapper(object):
+    """
+    Stand in for genie_python's channel access wrapper which, like a channel access client, calls each new monitor
+    with the current value from a thread of its own
+    """
+    monitored = []
+
+    @classmethod
+    def add_monitor(cls, name, callback):
+        cls.monitored.append(name)
+        thread = threading.Thread(target=callback, args=(1.0, None, None))
+        thread.start()
+        thread.join(timeout=2)
+        if thread.is_alive():
+            raise RuntimeError("monitor callback blocked")
+
+
+def _genie_modules():
+    """
+    Returns: genie_python modules providing the stand in wrapper, to patch into sys.modules
+    """
+    wrapper = types.ModuleType("genie_python.genie_cachannel_wrapper")
+    wrapper.CaChannelWrapper = _CaChannelWrapper
+    return {"genie_python": types.ModuleType("genie_python"), "genie_python.genie_cachannel_wrapper": wrapper}
+
+
+class TestInstrumentConstantsCache(unittest.TestCase):
+    def test_monitor_failure_printed_once(self):
+        cache = InstrumentConstantsCache(ttl=0)
+        output = io.StringIO()
+        with redirect_stdout(output), patch.dict(sys.modules, {"genie_python": None}):
+            for _ in range(3):
+                cache.get()
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(output.getvalue().count("Can not monitor"), 1)
+
+    def test_monitors_attached_outside_the_lock_for_every_constant(self):
+        _CaChannelWrapper.monitored = []
+        cache = InstrumentConstantsCache()
+        with patch.dict(sys.modules, _genie_modules()), \
+                patch.object(instrument_constants.g, "prefix_pv_name", side_effect=lambda name: name), \
+                redirect_stdout(io.StringIO()):
+            cache.get()
+        self.assertTrue(cache.watch())
+        self.assertEqual(_CaChannelWrapper.monitored, ["REFL_01:CONST:{}".format(name)
+                                                       for name in CONSTANT_NAMES + OPTIONAL_CONSTANT_NAMES])
+
+    def test_changed_constant_invalidates(self):
+        cache = InstrumentConstantsCache()
+        with redirect_stdout(io.StringIO()), patch.dict(sys.modules, {"genie_python": None}):
+            cache.get()
+            cache.constant_changed("S2_Z", 2596)
+            cache.get()
+            self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+            cache.constant_changed("S2_Z", 2600.0)
+            cache.get()
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2})
+
+    def test_optional_constant_added_invalidates(self):
+        cache = InstrumentConstantsCache()
+        with redirect_stdout(io.StringIO()), patch.dict(sys.modules, {"genie_python": None}):
+            self.assertIsNone(cache.get().flight_path)
+            cache.constant_changed("S1_MAX", 20.0)
+            cache.constant_changed("FLIGHT_PATH", "")
+            self.assertEqual(cache.stats(), {"hits": 0, "misses": 1})
+            cache.get()
+            self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+            cache.constant_changed("FLIGHT_PATH", 10.0)
+            cache.get()
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
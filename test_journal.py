@@ -0,0 +1,73 @@
+"""
+Tests of the run journal
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+from action_plan import CALL, MEASURE, Action, CompiledAction, CompiledPlan
+from journal import plan_key
+from live_reduction import LiveReduction
+from sample import Sample
+
+
+def _advance_when():
+    return False
+
+
+def _plan(reduction=None):
+    """
+    Returns: compiled plan whose actions hold a live reduction, a callable and a sample, made afresh on every call
+    """
+    sample = Sample("S1", "D2O", 10.0, 0.0, 0.0, 0.0, 0.0, 0.03, 60.0, 80.0, 1, {"S1HG": 30.0})
+    run_angle = Action("run_angle", None, (("sample", sample), ("angle", 0.7), ("count_uamps", 20),
+                                           ("reduction", reduction or LiveReduction())))
+    kinetics = Action("run_kinetics", None, (("sample", sample), ("angle", 0.5), ("slice_seconds", 60.0),
+                                             ("advance_when", _advance_when)))
+    call = Action("wait", _advance_when, (("seconds", 5),))
+    return CompiledPlan((
+        CompiledAction(run_angle, MEASURE, "SOLID", (("THETA", 0.7), ("S1VG", 0.5)), None, (sample.title, 0.7),
+                       (20, None, None, None), (False, None, None), ()),
+        CompiledAction(kinetics, MEASURE, "SOLID", (("THETA", 0.5),), None, (sample.title, 0.5),
+                       (None, 60.0, None, None), (False, None, None), ()),
+        CompiledAction(call, CALL, "SOLID", (), None, None, (None, None, None, None), (False, None, None), ()),
+    ), None)
+
+
+def key():
+    """
+    Returns: key of the test plan
+    """
+    return plan_key(_plan())
+
+
+class TestPlanKey(unittest.TestCase):
+    def test_same_plan_made_twice_has_same_key(self):
+        self.assertEqual(key(), key())
+
+    def test_same_plan_in_another_interpreter_has_same_key(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        other = subprocess.run([sys.executable, "-c", "import test_journal; print(test_journal.key())"], cwd=here,
+                               stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout.strip()
+        self.assertEqual(other, key())
+
+    def test_changed_setpoint_changes_key(self):
+        plan = _plan()
+        changed = plan.actions[0]._replace(setpoints=(("THETA", 0.8), ("S1VG", 0.5)))
+        self.assertNotEqual(plan_key(plan._replace(actions=(changed,) + plan.actions[1:])), plan_key(plan))
+
+    def test_different_reductions_change_key(self):
+        self.assertNotEqual(plan_key(_plan(LiveReduction(q_bins=[0.01, 0.02, 0.04]))),
+                            plan_key(_plan(LiveReduction(q_bins=[0.01, 0.03, 0.05]))))
+
+    def test_argument_without_settings_is_refused(self):
+        plan = _plan()
+        action = plan.actions[2].action._replace(params=(("seconds", object()),))
+        plan = plan._replace(actions=plan.actions[:2] + (plan.actions[2]._replace(action=action),))
+        with self.assertRaises(TypeError):
+            plan_key(plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
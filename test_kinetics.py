@@ -0,0 +1,38 @@
+"""
+Tests of counting kinetics in periods
+"""
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from NR_motion import _Movement
+from dry_run_session import DryRunSession
+from sample import Sample
+from script_actions import PERIOD_CHANGE_SECONDS, ScriptActions
+
+
+def _sample():
+    return Sample("S1", "D2O", 10.0, 0.0, 0.0, 0.0, 0.0, 0.03, 60.0, 80.0, 1, {"S1HG": 30.0})
+
+
+class TestKinetics(unittest.TestCase):
+    def test_dry_run_gives_period_schedule(self):
+        with redirect_stdout(io.StringIO()), DryRunSession(dry_run=True) as session:
+            log = _Movement(True).count_periods(5.0, 4)
+        current = session.beam_model.current()
+        self.assertEqual([period for period, _, _ in log], [1, 2, 3, 4])
+        self.assertEqual([seconds for _, seconds, _ in log], [0.0, 5.0, 10.0, 15.0])
+        for _, seconds, uamps in log:
+            self.assertAlmostEqual(uamps, current * seconds / 3600)
+
+    def test_dry_run_estimate_counts_run_overhead_as_a_single_run(self):
+        with redirect_stdout(io.StringIO()):
+            with DryRunSession(dry_run=True) as kinetics:
+                ScriptActions.run_kinetics(_sample(), 0.7, 5.0, 120)
+            with DryRunSession(dry_run=True) as single_run:
+                ScriptActions.run_angle_SM(_sample(), 0.7, count_seconds=600.0)
+        self.assertAlmostEqual(kinetics.run_time - single_run.run_time, 119 * PERIOD_CHANGE_SECONDS / 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
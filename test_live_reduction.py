@@ -0,0 +1,66 @@
+"""
+Tests of the live reduction of spectra to reflectivity
+"""
+import unittest
+
+import numpy as np
+
+from live_reduction import LiveReduction
+from statistics_count import tof_to_q, tof_to_wavelength
+
+DETECTOR_PATH = 10.0
+MONITOR_PATH = 8.0
+REFLECTIVITY = 0.25
+# counts per angstrom of wavelength reaching the monitor
+DENSITY = 1000.0
+
+
+def _spectra(detector_tof, monitor_tof):
+    """
+    Returns: function giving spectra of a beam uniform in wavelength, the detector seeing REFLECTIVITY of it
+    """
+    detector_width = np.diff(tof_to_wavelength(detector_tof, DETECTOR_PATH))
+    monitor_width = np.diff(tof_to_wavelength(monitor_tof, MONITOR_PATH))
+
+    def get_spectrum(spectrum, period=1, dist=False):
+        if spectrum == 1:
+            return {"time": monitor_tof, "signal": DENSITY * monitor_width}
+        return {"time": detector_tof, "signal": REFLECTIVITY * DENSITY * detector_width}
+    return get_spectrum
+
+
+class TestLiveReduction(unittest.TestCase):
+    def setUp(self):
+        # the monitor covers more than the wavelengths of the detector, in bins of a different width
+        self.detector_tof = np.linspace(10000.0, 80000.0, 351)
+        self.monitor_tof = np.linspace(5000.0, 70000.0, 131)
+        self.source = _spectra(self.detector_tof, self.monitor_tof)
+
+    def _reduction(self, q_bins=None):
+        reduction = LiveReduction(q_bins=q_bins, flight_path=DETECTOR_PATH, monitor_flight_path=MONITOR_PATH,
+                                  source=self.source)
+        reduction.start(0.7)
+        return reduction
+
+    def test_monitor_is_rebinned_by_wavelength(self):
+        q, reflectivity, error = self._reduction().update()
+        centres = (self.detector_tof[:-1] + self.detector_tof[1:]) / 2
+        np.testing.assert_allclose(q, tof_to_q(centres, 0.7, DETECTOR_PATH))
+        np.testing.assert_allclose(reflectivity, REFLECTIVITY)
+        self.assertTrue(np.all(error > 0))
+
+    def test_q_grid_keeps_the_reflectivity(self):
+        q_bins = np.linspace(0.006, 0.036, 9)
+        q, reflectivity, _ = self._reduction(q_bins).update()
+        np.testing.assert_allclose(q, (q_bins[:-1] + q_bins[1:]) / 2)
+        np.testing.assert_allclose(reflectivity, REFLECTIVITY)
+
+    def test_buffers_are_reused_between_updates(self):
+        reduction = self._reduction()
+        first = reduction.update()
+        second = reduction.update()
+        self.assertTrue(all(a is b for a, b in zip(first, second)))
+
+
+if __name__ == "__main__":
+    unittest.main()
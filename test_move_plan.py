@@ -0,0 +1,56 @@
+"""
+Tests of moving axes together
+"""
+import unittest
+from unittest.mock import patch
+
+import move_plan
+from move_plan import MovePlan
+from setpoint_cache import setpoint_cache
+
+
+class _WaitRecordingGenie(object):
+    """
+    Genie whose blocks reach their setpoints as soon as they are set, recording the blocks waited on
+    """
+    def __init__(self):
+        self.blocks = {}
+        self.waits = []
+
+    def cset(self, *args, **kwargs):
+        self.blocks.update(dict([args]) if args else kwargs)
+
+    def cget(self, name):
+        return {"name": name, "value": self.blocks[name]} if name in self.blocks else None
+
+    def waitfor_move(self, *blocks, **kwargs):
+        # pylint: disable=unused-argument
+        self.waits.append(blocks)
+
+
+class TestMovePlan(unittest.TestCase):
+    def setUp(self):
+        setpoint_cache.invalidate()
+        self.genie = _WaitRecordingGenie()
+        patcher = patch.object(move_plan, "g", self.genie)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setpoint_cache.invalidate)
+
+    def test_axis_names_in_any_case_are_one_target(self):
+        plan = MovePlan()
+        plan.add("s1hg", 10.0)
+        plan.add("S1HG", 12.0)
+        self.assertEqual(plan.targets, {"S1HG": 12.0})
+
+    def test_moved_axes_are_waited_on_together(self):
+        plan = MovePlan()
+        plan.add("theta", 0.7)
+        plan.add("TRANS", 20.0)
+        plan.wait()
+        self.assertEqual(self.genie.waits, [("THETA", "TRANS")])
+        self.assertEqual(list(plan.completed), ["THETA", "TRANS"])
+
+
+if __name__ == "__main__":
+    unittest.main()
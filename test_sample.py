@@ -0,0 +1,68 @@
+"""
+Tests of the sample table
+"""
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from sample import SampleGenerator, SampleTable
+
+SAMPLES_CSV = """# cells of the sample changer
+title,translation, valve ,S1HG
+A,10,1,30
+B,20
+C,,2,
+"""
+
+
+class TestLoadCsv(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "samples.csv")
+        with open(self.path, "w") as csv_file:
+            csv_file.write(SAMPLES_CSV)
+        self.defaults = SampleGenerator(translation=5.0, height2_offset=0.0, phi_offset=0.1, psi_offset=0.0,
+                                        height_offset=0.0, resolution=0.03, footprint=60.0, sample_length=80.0,
+                                        valve=3, hgaps={"s2hg": 40.0})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_short_row_takes_defaults_for_missing_cells(self):
+        sample = SampleTable.load_csv(self.path, self.defaults)[1]
+        self.assertEqual(sample.title, "B")
+        self.assertEqual(sample.translation, 20.0)
+        self.assertEqual(sample.valve, 3)
+        self.assertEqual(sample.hgaps, {"S2HG": 40.0})
+
+    def test_empty_cells_take_defaults(self):
+        sample = SampleTable.load_csv(self.path, self.defaults)[2]
+        self.assertEqual(sample.translation, 5.0)
+        self.assertEqual(sample.valve, 2)
+        self.assertEqual(sample.hgaps, {"S2HG": 40.0})
+
+    def test_full_row_and_missing_columns(self):
+        table = SampleTable.load_csv(self.path, self.defaults)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.gaps, ("S1HG", "S2HG"))
+        self.assertEqual(table[0].as_dict(), {
+            "title": "A", "subtitle": "", "translation": 10.0, "height2_offset": 0.0, "phi_offset": 0.1,
+            "psi_offset": 0.0, "height_offset": 0.0, "resolution": 0.03, "footprint": 60.0, "sample_length": 80.0,
+            "valve": 1, "hgaps": {"S1HG": 30.0, "S2HG": 40.0}})
+
+    def test_no_defaults(self):
+        table = SampleTable.load_csv(self.path)
+        self.assertEqual(table.gaps, ("S1HG",))
+        self.assertEqual(table[1].valve, 0)
+        self.assertEqual(table[2].translation, 0.0)
+        self.assertTrue(math.isnan(table.gap("S1HG")[1]))
+
+    def test_unknown_gap_column(self):
+        with self.assertRaises(ValueError):
+            SampleTable.load_csv(self.path, gaps=("S2HG",))
+
+
+if __name__ == "__main__":
+    unittest.main()
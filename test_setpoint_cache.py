@@ -0,0 +1,44 @@
+"""
+Tests of the setpoint cache
+"""
+import unittest
+
+from setpoint_cache import SetpointCache
+
+
+class TestReadback(unittest.TestCase):
+    def setUp(self):
+        self.cache = SetpointCache()
+        self.cache.record("THETA", 0.7)
+
+    def test_axis_within_deadband_keeps_setpoint(self):
+        self.cache.check_readback("THETA", 0.7005)
+        self.assertTrue(self.cache.is_unchanged("THETA", 0.7))
+
+    def test_stalled_axis_is_set_again(self):
+        self.cache.check_readback("THETA", 0.66)
+        self.assertFalse(self.cache.is_unchanged("THETA", 0.7))
+
+    def test_gap_within_deadband_keeps_setpoint(self):
+        self.cache.record("S1VG", 2.5)
+        self.cache.check_readback("S1VG", 2.52)
+        self.assertTrue(self.cache.is_unchanged("s1vg", 2.5))
+
+    def test_stalled_gap_is_set_again(self):
+        self.cache.record("S1VG", 2.5)
+        self.cache.check_readback("S1VG", 2.3)
+        self.assertFalse(self.cache.is_unchanged("S1VG", 2.5))
+
+    def test_confirmed_axis_is_not_read_back_again(self):
+        self.assertEqual(self.cache.unconfirmed(["THETA"]), ["THETA"])
+        self.cache.check_readback("THETA", 0.7)
+        self.assertEqual(self.cache.unconfirmed(["THETA"]), [])
+        self.cache.record("THETA", 0.8)
+        self.assertEqual(self.cache.unconfirmed(["THETA"]), ["THETA"])
+
+    def test_readback_tolerance_follows_axis_tolerance(self):
+        self.assertLess(self.cache.readback_tolerance("THETA"), self.cache.readback_tolerance("TRANS"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests of installing the simulated genie backend
+"""
+import os
+import sys
+import types
+import unittest
+
+import action_plan
+import mocks
+import sim_genie
+
+
+def _module(name, folder):
+    """
+    Returns: module using the genie mock, as if it were loaded from a file in the folder
+    """
+    module = types.ModuleType(name)
+    module.__file__ = os.path.join(folder, name + ".py")
+    module.g = mocks.g
+    sys.modules[name] = module
+    return module
+
+
+class TestInstall(unittest.TestCase):
+    def setUp(self):
+        self.genie = mocks.g
+        self.other = _module("other_package_module", os.path.join(os.sep, "elsewhere"))
+
+    def tearDown(self):
+        del sys.modules["other_package_module"]
+        sys.modules.pop("loaded_while_simulated", None)
+        self.assertIs(mocks.g, self.genie)
+
+    def test_only_modules_of_this_package_are_patched_and_restored(self):
+        with sim_genie.simulated_genie() as simulated:
+            self.assertIs(action_plan.g, simulated)
+            self.assertIs(mocks.g, simulated)
+            self.assertIs(self.other.g, self.genie)
+        self.assertIs(action_plan.g, self.genie)
+        self.assertIs(self.other.g, self.genie)
+
+    def test_installs_nest(self):
+        with sim_genie.simulated_genie() as outer:
+            with sim_genie.simulated_genie() as inner:
+                self.assertIs(action_plan.g, inner)
+            self.assertIs(action_plan.g, outer)
+        self.assertIs(action_plan.g, self.genie)
+
+    def test_module_loaded_while_simulated_is_restored(self):
+        with sim_genie.simulated_genie() as simulated:
+            module = _module("loaded_while_simulated", os.path.dirname(os.path.abspath(sim_genie.__file__)))
+            self.assertIs(module.g, simulated)
+        self.assertIs(module.g, self.genie)
+
+    def test_restored_after_error(self):
+        with self.assertRaises(RuntimeError):
+            with sim_genie.simulated_genie():
+                raise RuntimeError("script failed")
+        self.assertIs(action_plan.g, self.genie)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests of the vectorised slit gap calculations
+"""
+import unittest
+
+import numpy as np
+
+from NR_motion import _Movement
+from instrument_constants import InstrumentConstant
+from sample import SampleTable
+from slit_calc import calculate_slit_gaps, flux_optimal_slit_gaps, slit_table
+
+CONSTANTS = InstrumentConstant(s1s2=2596.0, s2sa=512.0, max_theta=2.3, s4max=10.0, sm_sa=99.0,
+                               incoming_beam_angle=2.3, s3max=10.0, s1max=20.0, s2max=10.0)
+THETA = np.array([0.3, 0.7, 1.5, 2.3])
+FOOTPRINT = 60.0
+RESOLUTION = 0.03
+
+
+class TestCalculateSlitGaps(unittest.TestCase):
+    def test_gaps_match_the_calculation_for_one_sample(self):
+        movement = _Movement(True)
+        gaps = calculate_slit_gaps(THETA, FOOTPRINT, RESOLUTION, CONSTANTS)
+        for index, theta in enumerate(THETA):
+            expected = movement.calculate_slit_gaps(theta, FOOTPRINT, RESOLUTION, CONSTANTS)
+            self.assertAlmostEqual(gaps.S1VG[index], expected["S1VG"])
+            self.assertAlmostEqual(gaps.S2VG[index], expected["S2VG"])
+            self.assertAlmostEqual(gaps.S3VG[index], CONSTANTS.s3max * theta / CONSTANTS.max_theta)
+
+    def test_table_has_a_row_per_sample_and_a_column_per_angle(self):
+        table = SampleTable(3)
+        table.footprint[:] = [30.0, 60.0, 90.0]
+        table.resolution[:] = RESOLUTION
+        gaps = slit_table(table, THETA, CONSTANTS)
+        self.assertEqual(gaps.S1VG.shape, (3, 4))
+        np.testing.assert_allclose(gaps.S1VG[1], calculate_slit_gaps(THETA, 60.0, RESOLUTION, CONSTANTS).S1VG)
+
+    def test_problems_are_flagged(self):
+        gaps = calculate_slit_gaps([0.7, 0.7], [60.0, 1000.0], RESOLUTION, CONSTANTS)
+        np.testing.assert_array_equal(gaps.negative, [False, True])
+
+
+def _check_feasible(test, gaps, theta, limits):
+    k = CONSTANTS.s2sa / CONSTANTS.s1s2
+    divergence = 2 * CONSTANTS.s1s2 * np.tan(np.radians(RESOLUTION * theta))
+    height = FOOTPRINT * np.sin(np.radians(theta))
+    tolerance = 1e-9
+    test.assertTrue(np.all(gaps.S1VG >= -tolerance) and np.all(gaps.S2VG >= -tolerance))
+    test.assertTrue(np.all(gaps.S1VG + gaps.S2VG <= divergence + tolerance))
+    test.assertTrue(np.all(k * gaps.S1VG + (1 + k) * gaps.S2VG <= height + tolerance))
+    test.assertTrue(np.all(gaps.S1VG <= limits["S1VG"] + tolerance))
+    test.assertTrue(np.all(gaps.S2VG <= limits["S2VG"] + tolerance))
+
+
+class TestFluxOptimalSlitGaps(unittest.TestCase):
+    def test_fixed_gaps_are_on_the_resolution_and_footprint_limits(self):
+        gaps = calculate_slit_gaps(0.7, FOOTPRINT, RESOLUTION, CONSTANTS)
+        k = CONSTANTS.s2sa / CONSTANTS.s1s2
+        self.assertAlmostEqual(float(gaps.S1VG + gaps.S2VG),
+                               2 * CONSTANTS.s1s2 * np.tan(np.radians(RESOLUTION * 0.7)), places=9)
+        self.assertAlmostEqual(float(gaps.S2VG + (gaps.S1VG + gaps.S2VG) * k),
+                               FOOTPRINT * np.sin(np.radians(0.7)), places=9)
+        self.assertAlmostEqual(float(gaps.S3VG), CONSTANTS.s3max * 0.7 / CONSTANTS.max_theta)
+
+    def test_gaps_are_feasible_and_at_least_the_fixed_flux(self):
+        limits = {"S1VG": 20.0, "S2VG": 10.0}
+        gaps = flux_optimal_slit_gaps(THETA, FOOTPRINT, RESOLUTION, CONSTANTS, limits)
+        fixed = calculate_slit_gaps(THETA, FOOTPRINT, RESOLUTION, CONSTANTS)
+        _check_feasible(self, gaps, THETA, limits)
+        self.assertTrue(np.all(gaps.S1VG * gaps.S2VG >= fixed.S1VG * fixed.S2VG - 1e-9))
+        np.testing.assert_array_equal(gaps.S3VG, fixed.S3VG)
+
+    def test_gaps_match_a_search_of_every_feasible_pair(self):
+        limits = {"S1VG": 2.0, "S2VG": 1.0}
+        gaps = flux_optimal_slit_gaps(THETA, FOOTPRINT, RESOLUTION, CONSTANTS, limits)
+        s1, s2 = np.meshgrid(np.linspace(0, 2.0, 401), np.linspace(0, 1.0, 401))
+        k = CONSTANTS.s2sa / CONSTANTS.s1s2
+        for theta, s1_best, s2_best in zip(THETA, gaps.S1VG, gaps.S2VG):
+            divergence = 2 * CONSTANTS.s1s2 * np.tan(np.radians(RESOLUTION * theta))
+            height = FOOTPRINT * np.sin(np.radians(theta))
+            feasible = (s1 + s2 <= divergence) & (k * s1 + (1 + k) * s2 <= height)
+            self.assertGreaterEqual(s1_best * s2_best, np.max(np.where(feasible, s1 * s2, 0)) - 1e-12)
+
+    def test_slit_limit_of_zero_leaves_no_flux(self):
+        limits = {"S1VG": 20.0, "S2VG": 0.0}
+        gaps = flux_optimal_slit_gaps(THETA, FOOTPRINT, RESOLUTION, CONSTANTS, limits)
+        self.assertTrue(np.all(gaps.negative))
+
+    def test_missing_limit_is_no_limit(self):
+        gaps = flux_optimal_slit_gaps(THETA, FOOTPRINT, RESOLUTION, CONSTANTS, {"S1VG": None, "S2VG": None})
+        _check_feasible(self, gaps, THETA, {"S1VG": np.inf, "S2VG": np.inf})
+        self.assertFalse(np.any(gaps.negative))
+
+
+if __name__ == "__main__":
+    unittest.main()
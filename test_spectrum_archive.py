@@ -0,0 +1,52 @@
+"""
+Tests of the spectrum archive
+"""
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import spectrum_archive
+from sample import Sample
+from sim_genie import TOF_EDGES, SimulatedGenie
+from spectrum_archive import SpectrumArchive
+
+
+class TestSpectrumArchive(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_written_spectra_read_back_from_a_new_archive(self):
+        archive = SpectrumArchive(self.directory)
+        sample = Sample("S1", "D2O", 0, 0, 0, 0, 0, 0.03, 60, 80, 1, {})
+        run = archive.create(101, [1, 3], periods=2, bins=4, sample=sample, theta=0.7, title="S1 D2O th=0.7")
+        run.write(3, 2, [1.0, 2.0, 3.0, 4.0], time=[0.0, 1.0, 2.0, 3.0, 4.0])
+        run.write(1, 1, [5.0, 6.0, 7.0, 8.0])
+        run.flush()
+
+        reopened = SpectrumArchive(self.directory)
+        self.assertEqual(reopened.runs(sample="S1 D2O", theta=0.7), [101])
+        stored = reopened.open(101)
+        np.testing.assert_array_equal(stored.read(3, 2), [1.0, 2.0, 3.0, 4.0])
+        np.testing.assert_array_equal(stored.read(1), [5.0, 6.0, 7.0, 8.0])
+        np.testing.assert_array_equal(stored.read(3, 1), np.zeros(4))
+        spectrum = stored.get_spectrum(3, 2)
+        np.testing.assert_array_equal(spectrum["time"], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_captured_run_replays_the_instrument_spectra(self):
+        genie = SimulatedGenie(blocks={"THETA": 0.7})
+        genie.begin()
+        genie.waitfor_time(seconds=600)
+        with patch.object(spectrum_archive, "g", genie):
+            stored = SpectrumArchive(self.directory).capture([1, 3], theta=0.7)
+        for spectrum in (1, 3):
+            replayed = stored.get_spectrum(spectrum)
+            np.testing.assert_array_equal(replayed["signal"], genie.get_spectrum(spectrum)["signal"])
+            np.testing.assert_array_equal(replayed["time"], TOF_EDGES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Tests of counting to a statistics target
+"""
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import statistics_count
+from sim_genie import TOF_EDGES, SimulatedGenie
+from statistics_count import Q, StatisticsCounter, StatisticsTarget, window_counts
+
+
+class TestStatisticsCounter(unittest.TestCase):
+    def setUp(self):
+        self.genie = SimulatedGenie(blocks={"THETA": 0.7})
+        patcher = patch.object(statistics_count, "g", self.genie)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.genie.begin()
+
+    def test_relative_error_target_needs_inverse_square_counts(self):
+        self.assertAlmostEqual(StatisticsTarget(relative_error=0.01).target_counts, 10000)
+        self.assertEqual(StatisticsTarget(counts=20000, relative_error=0.01).target_counts, 20000)
+
+    def test_count_stops_once_the_poisson_target_is_reached(self):
+        statistics = StatisticsCounter(StatisticsTarget(relative_error=0.002)).run()
+        self.assertTrue(statistics.reached)
+        self.assertLessEqual(statistics.relative_error, 0.002)
+        self.assertAlmostEqual(statistics.relative_error, 1 / np.sqrt(statistics.counts))
+        # the last wait is at most half the time left, so the count does not run on past twice the target
+        self.assertLess(statistics.counts, 2 * StatisticsTarget(relative_error=0.002).target_counts)
+
+    def test_count_stops_at_max_seconds(self):
+        statistics = StatisticsCounter(StatisticsTarget(counts=1e12, max_seconds=120.0)).run()
+        self.assertFalse(statistics.reached)
+        self.assertAlmostEqual(statistics.seconds, 120.0)
+
+    def test_window_in_q_integrates_the_bins_inside_it(self):
+        centres = (TOF_EDGES[:-1] + TOF_EDGES[1:]) / 2
+        spectrum = {"time": TOF_EDGES, "signal": np.ones(len(centres))}
+        q = statistics_count.tof_to_q(centres, 0.7)
+        self.assertEqual(window_counts(spectrum, (0.01, 0.02), Q, 0.7), np.sum((q >= 0.01) & (q <= 0.02)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests of stitching the reflectivity of several angles
+"""
+import unittest
+
+import numpy as np
+
+from sample import Sample
+from stitching import StitchedCurve, Stitcher, log_q_grid
+
+
+def _curve(q_low, q_high, scale=1.0):
+    q = np.linspace(q_low, q_high, 200)
+    reflectivity = scale * 1e-3 / q ** 2
+    return q, reflectivity, 0.01 * reflectivity
+
+
+class TestStitching(unittest.TestCase):
+    def test_grid_has_constant_dq_over_q(self):
+        q_bins = log_q_grid(0.01, 0.1, 0.05)
+        np.testing.assert_allclose(q_bins[1:] / q_bins[:-1], 1.05)
+        self.assertGreaterEqual(q_bins[-1], 0.1)
+
+    def test_overlap_scales_later_angle_to_the_first(self):
+        stitched = StitchedCurve(log_q_grid(0.005, 0.2, 0.02))
+        self.assertEqual(stitched.add(*_curve(0.01, 0.05), angle=0.7), 1.0)
+        scale = stitched.add(*_curve(0.03, 0.15, scale=2.0), angle=2.3)
+        self.assertAlmostEqual(scale, 0.5, places=2)
+        q, reflectivity, _ = stitched.curve()
+        # the stitched curve follows the first angle across both ranges
+        np.testing.assert_allclose(reflectivity, 1e-3 / q ** 2, rtol=0.05)
+        self.assertEqual(stitched.angles, [0.7, 2.3])
+
+    def test_curves_without_overlap_are_not_scaled(self):
+        stitched = StitchedCurve(log_q_grid(0.005, 0.2, 0.02))
+        stitched.add(*_curve(0.01, 0.02))
+        self.assertEqual(stitched.add(*_curve(0.05, 0.1, scale=3.0)), 1.0)
+
+    def test_samples_are_stitched_separately(self):
+        stitcher = Stitcher(log_q_grid(0.005, 0.2, 0.02))
+        first = Sample("S1", "D2O", 0, 0, 0, 0, 0, 0.03, 60, 80, 1, {})
+        second = Sample("S1", "H2O", 0, 0, 0, 0, 0, 0.03, 60, 80, 1, {})
+        stitcher.add(first, *_curve(0.01, 0.05))
+        stitcher.add(second, *_curve(0.01, 0.05, scale=2.0))
+        self.assertEqual(len(stitcher.curves), 2)
+        np.testing.assert_allclose(stitcher.curve(second)[1], 2 * stitcher.curve(first)[1])
+
+
+if __name__ == "__main__":
+    unittest.main()